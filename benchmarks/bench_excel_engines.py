@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Benchmark des moteurs de génération Excel de generate_excel.py
+#
+# Compare le moteur "standard" (classeur openpyxl en mémoire) au moteur
+# "streaming" (feuilles write-only) sur des parcs synthétiques : durée et
+# pic de mémoire résidente (RSS) du processus de génération.
+#
+# Usage: python3 benchmarks/bench_excel_engines.py [--sizes 1000 10000 50000] [--json resultats.json]
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_fleet import write_fleet
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '..', 'roles', 'cmdb_report', 'files', 'generate_excel.py')
+ENGINES = ['standard', 'streaming']
+
+
+def run_engine(engine, data_dir, work_dir):
+    config_path = os.path.join(work_dir, f'report_config_{engine}.json')
+    output_file = os.path.join(work_dir, f'report_{engine}.xlsx')
+    with open(config_path, 'w') as f:
+        json.dump({'data_dir': data_dir, 'output_file': output_file, 'engine': engine}, f)
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SCRIPT, config_path],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4() renvoie les ressources consommées par ce seul processus fils
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"Échec du moteur {engine}: {process.stderr.read().decode()}")
+
+    return {
+        'engine': engine,
+        'wall_seconds': round(elapsed, 2),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'output_mb': round(os.path.getsize(output_file) / 1048576, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les moteurs standard et streaming de generate_excel.py")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--engines', nargs='+', default=ENGINES, choices=ENGINES)
+    parser.add_argument('--certificates', type=int, default=40)
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'cmdb_bench_{size}_')
+        try:
+            data_dir = write_fleet(os.path.join(work_dir, 'json'), size, certificates=args.certificates)
+            for engine in args.engines:
+                result = dict(run_engine(engine, data_dir, work_dir), hosts=size)
+                results.append(result)
+                print(f"{size:>7} serveurs  {engine:<10} {result['wall_seconds']:>8.2f} s"
+                      f"  {result['peak_rss_mb']:>9.1f} Mo RSS  {result['output_mb']:>7.1f} Mo xlsx")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
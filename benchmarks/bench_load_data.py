@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Benchmark du chargement des rapports JSON par generate_excel.py
+#
+# Mesure load_report() selon le nombre de processus et le décodeur JSON, avec
+# le cache de pages du noyau froid (pages des fichiers évincées avec
+# posix_fadvise(DONTNEED)) puis chaud (fichiers relus immédiatement).
+#
+# Usage: python3 benchmarks/bench_load_data.py [--sizes 1000 10000] [--workers 1 4 8] [--json resultats.json]
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from synthetic_fleet import write_fleet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'roles', 'cmdb_report', 'files'))
+import generate_excel  # noqa: E402
+
+
+def drop_page_cache(data_dir):
+    # Les pages sales ne peuvent pas être évincées : écrire d'abord sur disque
+    os.sync()
+    for filename in os.listdir(data_dir):
+        fd = os.open(os.path.join(data_dir, filename), os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def run_load(data_dir, workers, decoder, cache):
+    config = {'data_dir': data_dir, 'load_workers': workers, 'json_decoder': decoder}
+    if cache == 'cold':
+        drop_page_cache(data_dir)
+    else:
+        # Lecture préalable pour garantir un cache chaud
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_excel.load_report(config)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = generate_excel.load_report(config)
+    return time.perf_counter() - start, report['hosts']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure le chargement parallèle des rapports JSON")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--decoders', nargs='+', default=['json', 'auto'], choices=['json', 'auto'])
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'cmdb_bench_load_{size}_')
+        try:
+            data_dir = write_fleet(os.path.join(work_dir, 'json'), size)
+            for decoder in args.decoders:
+                decoder_name = generate_excel.json_decoder({'json_decoder': decoder})[0]
+                for workers in args.workers:
+                    for cache in ('cold', 'warm'):
+                        elapsed, hosts = run_load(data_dir, workers, decoder, cache)
+                        results.append({'hosts': size, 'loaded': hosts, 'decoder': decoder_name,
+                                        'workers': workers, 'cache': cache,
+                                        'wall_seconds': round(elapsed, 3)})
+                        print(f"{size:>7} fichiers  {decoder_name:<7} {workers:>3} processus"
+                              f"  cache {cache:<5} {elapsed:>8.3f} s")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
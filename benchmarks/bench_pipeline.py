@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# Benchmark de bout en bout de la chaîne de rapport (rôle cmdb_report)
+#
+# Génère des parcs synthétiques (synthetic_fleet.py) de tailles et de profils
+# configurables, puis chronomètre chaque étape de la chaîne sur ces rapports :
+#   aggregate      : agrégation du module cmdb_reports_aggregate (collect_data.yml)
+#   load_data      : chargement et extraction des rapports par generate_excel.py
+#   <feuille>      : chaque fonction create_*_sheet de generate_excel.py
+#   save           : écriture du classeur (wb.save)
+#   stats          : statistiques du parc (write_stats)
+#   email_body     : rendu du template email_body.j2 (HTML et texte)
+#
+# Chaque scénario (taille, moteur) s'exécute dans un processus séparé : la durée
+# totale, le pic de mémoire résidente (RSS) du scénario et, pour chaque étape, la
+# durée et le pic RSS atteint à la fin de l'étape sont écrits au format JSON pour
+# comparer les versions entre elles. Fonctionne hors ligne ; l'étape aggregate
+# nécessite ansible-core (import du module), email_body nécessite jinja2 : une étape
+# dont la dépendance est absente est marquée "skipped".
+#
+# Usage: python3 benchmarks/bench_pipeline.py [--sizes 1000 10000 50000] [--corrupt 0.01] [--json resultats.json]
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from synthetic_fleet import write_fleet
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROLE_DIR = os.path.join(BENCH_DIR, '..', 'roles', 'cmdb_report')
+ENGINES = ['standard', 'streaming']
+SHEETS = ['summary', 'servers', 'hardware', 'software', 'network', 'security',
+          'organizational', 'certificates', 'updates']
+REPORT_PATTERNS = ['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst']
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Stages:
+    def __init__(self):
+        self.results = {}
+
+    @contextlib.contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        # Les messages de generate_excel.py ne sont pas mêlés aux résultats
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        self.results[name] = {'seconds': round(time.perf_counter() - start, 3),
+                              'peak_rss_mb': peak_rss_mb()}
+
+    def skip(self, name, reason):
+        self.results[name] = {'skipped': reason}
+
+
+def aggregate(data_dir):
+    # Même traitement que main() du module cmdb_reports_aggregate (parse: true)
+    import ansible.module_utils
+    # Fonctions communes des modules (module_utils du rôle), fournies par ansible à l'exécution
+    ansible.module_utils.__path__.append(os.path.join(ROLE_DIR, 'module_utils'))
+    import cmdb_reports_aggregate as module
+    now = datetime.utcnow().strftime(module.ISO_DATE_FORMAT)
+    stats = module.new_stats()
+    data = []
+    errors = 0
+    for path in module.list_reports(data_dir, REPORT_PATTERNS, 0):
+        try:
+            doc = module.load_json(path)
+        except Exception:
+            errors += 1
+            continue
+        if not isinstance(doc, dict):
+            errors += 1
+            continue
+        module.add_stats(stats, doc, now)
+        data.append(module.summarize(doc, path))
+    return data, stats, errors
+
+
+def render_email(stats, hosts, work_dir):
+    from jinja2 import Environment, FileSystemLoader
+    env = Environment(loader=FileSystemLoader(os.path.join(ROLE_DIR, 'templates')))
+    template = env.get_template('email_body.j2')
+    now = datetime.now()
+    variables = {
+        'cmdb_stats': stats,
+        'cmdb_data': [None] * hosts,
+        'cmdb_report': {'sheets': dict.fromkeys(SHEETS, True)},
+        'ansible_date_time': {'date': now.strftime('%Y-%m-%d'), 'time': now.strftime('%H:%M:%S')},
+        'inventory_hostname': 'localhost',
+    }
+    for body_type in ('html', 'plain'):
+        body = template.render(dict(variables, cmdb_email={'body_type': body_type}))
+        with open(os.path.join(work_dir, f'email_body.{body_type}'), 'w') as f:
+            f.write(body)
+
+
+def run_scenario(args):
+    # Exécuté dans le processus fils : une seule configuration, étapes dans l'ordre du rôle
+    sys.path.insert(0, os.path.join(ROLE_DIR, 'files'))
+    sys.path.insert(0, os.path.join(ROLE_DIR, 'library'))
+    import generate_excel
+
+    stages = Stages()
+    start = time.perf_counter()
+    try:
+        with stages.time('aggregate'):
+            _, _, aggregate_errors = aggregate(args.data_dir)
+    except ImportError as e:
+        stages.skip('aggregate', str(e))
+        aggregate_errors = None
+
+    config = {
+        'data_dir': args.data_dir,
+        'file_pattern': REPORT_PATTERNS,
+        'engine': args.engine,
+        'load_workers': args.workers,
+        'output_file': os.path.join(args.work_dir, f'report_{args.engine}.xlsx'),
+        'stats_file': os.path.join(args.work_dir, 'report_stats.json'),
+        'sheets': dict.fromkeys(SHEETS, True),
+    }
+    with stages.time('load_data'):
+        report = generate_excel.load_report(config)
+    with stages.time('create_workbook'):
+        wb = generate_excel.create_workbook(config)
+    for sheet in SHEETS:
+        with stages.time(sheet):
+            getattr(generate_excel, f'create_{sheet}_sheet')(wb, report, config)
+    with stages.time('save'):
+        wb.save(config['output_file'])
+    with stages.time('stats'):
+        generate_excel.write_stats(report, config)
+    with open(config['stats_file']) as f:
+        stats = json.load(f)
+    try:
+        with stages.time('email_body'):
+            render_email(stats, report['hosts'], args.work_dir)
+    except ImportError as e:
+        stages.skip('email_body', str(e))
+
+    result = {
+        'wall_seconds': round(time.perf_counter() - start, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'loaded': report['hosts'],
+        'aggregate_errors': aggregate_errors,
+        'output_mb': round(os.path.getsize(config['output_file']) / 1048576, 1),
+        'stages': stages.results,
+    }
+    with open(args.result, 'w') as f:
+        json.dump(result, f)
+
+
+def launch_scenario(engine, data_dir, work_dir, workers):
+    result_file = os.path.join(work_dir, f'result_{engine}.json')
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--scenario', '--engine', engine,
+         '--data-dir', data_dir, '--work-dir', work_dir, '--workers', str(workers),
+         '--result', result_file],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4() renvoie les ressources consommées par ce seul processus fils, processus
+    # de chargement compris lorsqu'ils sont terminés avant lui
+    _, status, usage = os.wait4(process.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"Échec du scénario {engine}: {process.stderr.read().decode()}")
+    with open(result_file) as f:
+        result = json.load(f)
+    result['children_peak_rss_mb'] = round(usage.ru_maxrss / 1024, 1)
+    return result
+
+
+def environment():
+    try:
+        import openpyxl
+        openpyxl_version = openpyxl.__version__
+    except ImportError:
+        openpyxl_version = None
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'openpyxl': openpyxl_version,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout de la chaîne de rapport CMDB")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--engines', nargs='+', default=ENGINES, choices=ENGINES)
+    parser.add_argument('--workers', type=int, default=0, help="Processus de chargement (0 = nombre de CPU)")
+    parser.add_argument('--certificates', type=int, default=40)
+    parser.add_argument('--interfaces', type=int, default=3)
+    parser.add_argument('--disks', type=int, default=2)
+    parser.add_argument('--packages', type=int, nargs=2, default=[400, 2500], metavar=('MIN', 'MAX'))
+    parser.add_argument('--corrupt', type=float, default=0.0, help="Part des fichiers corrompus (0 à 1)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    # Options internes du processus fils
+    parser.add_argument('--scenario', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--engine', help=argparse.SUPPRESS)
+    parser.add_argument('--data-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        run_scenario(args)
+        return
+
+    profile = {'certificates': args.certificates, 'interfaces': args.interfaces,
+               'disks': args.disks, 'packages': tuple(args.packages)}
+    results = []
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'cmdb_bench_pipeline_{size}_')
+        try:
+            start = time.perf_counter()
+            data_dir = write_fleet(os.path.join(work_dir, 'json'), size, seed=args.seed,
+                                   corrupt=args.corrupt, **profile)
+            generation_seconds = time.perf_counter() - start
+            data_bytes = sum(os.path.getsize(os.path.join(data_dir, name)) for name in os.listdir(data_dir))
+            for engine in args.engines:
+                result = launch_scenario(engine, data_dir, work_dir, args.workers)
+                result.update(hosts=size, engine=engine, corrupt_share=args.corrupt,
+                              profile=dict(profile, packages=args.packages),
+                              generation_seconds=round(generation_seconds, 3),
+                              data_mb=round(data_bytes / 1048576, 1))
+                results.append(result)
+                print(f"{size:>7} serveurs  {engine:<10} {result['wall_seconds']:>8.2f} s"
+                      f"  {result['peak_rss_mb']:>9.1f} Mo RSS  {result['loaded']:>7} chargés")
+                for name, stage in result['stages'].items():
+                    if 'skipped' in stage:
+                        print(f"{'':>19}{name:<16} ignorée ({stage['skipped']})")
+                    else:
+                        print(f"{'':>19}{name:<16} {stage['seconds']:>8.3f} s"
+                              f"  {stage['peak_rss_mb']:>9.1f} Mo RSS")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Benchmark de l'outil de requête indexée cmdb_query.py (rôle cmdb_report)
+#
+# Sur un parc synthétique : construction complète de l'index, mise à jour après
+# modification d'une part des rapports, puis durée de requêtes de filtre courantes,
+# comparée à un parcours complet des fichiers JSON.
+#
+# Usage: python3 benchmarks/bench_query.py [--sizes 1000 10000] [--changed 0.01] [--null-sections 0.01] [--json resultats.json]
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from synthetic_fleet import write_fleet
+
+ROLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'roles')
+sys.path.insert(0, os.path.join(ROLES_DIR, 'cmdb_report', 'files'))
+import cmdb_query  # noqa: E402
+
+QUERIES = {
+    'environment': ['--env', 'Production'],
+    'env_datacenter': ['--env', 'Production', '--datacenter', 'DC-LYON-01'],
+    'kernel_glob': ['--kernel', '5.14.0-12*'],
+    'ipv4_network': ['--ip', '10.1.0.0/16'],
+    'cert_expired': ['--cert-expired'],
+}
+
+
+def touch_reports(reports_dir, ratio):
+    names = sorted(os.listdir(reports_dir))
+    step = max(1, int(1 / ratio)) if ratio > 0 else len(names) + 1
+    changed = names[::step]
+    for name in changed:
+        path = os.path.join(reports_dir, name)
+        with open(path) as f:
+            host = json.load(f)
+        host['organizational'] = dict(host['organizational'] or {}, environment='Production')
+        # Dépôt par renommage, comme cmdb_repository_ingest
+        with open(path + '.tmp', 'w') as f:
+            json.dump(host, f)
+        os.rename(path + '.tmp', path)
+    return len(changed)
+
+
+def full_scan(reports_dir):
+    # Référence : lecture de tous les rapports pour un filtre sur l'environnement
+    matches = 0
+    for name in os.listdir(reports_dir):
+        with open(os.path.join(reports_dir, name), 'rb') as f:
+            host = json.loads(f.read())
+        matches += (host.get('organizational') or {}).get('environment') == 'Production'
+    return matches
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure l'index et les requêtes de cmdb_query.py")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--changed', type=float, default=0.01, help="Part des rapports modifiés (0 à 1)")
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--null-sections', type=float, default=0.01,
+                        help="Part des serveurs ayant une section à null (0 à 1)")
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'cmdb_bench_query_{size}_')
+        try:
+            reports_dir = write_fleet(os.path.join(work_dir, 'reports'), size,
+                                      null_sections=args.null_sections)
+            db = cmdb_query.open_index(os.path.join(work_dir, 'cache', 'query_index.sqlite'))
+            build, _ = timed(cmdb_query.refresh_index, db, reports_dir, args.workers)
+            unchanged, _ = timed(cmdb_query.refresh_index, db, reports_dir, args.workers)
+            changed = touch_reports(reports_dir, args.changed)
+            update, _ = timed(cmdb_query.refresh_index, db, reports_dir, args.workers)
+            scan, _ = timed(full_scan, reports_dir)
+            result = {'hosts': size, 'build_seconds': round(build, 3),
+                      'unchanged_refresh_seconds': round(unchanged, 4),
+                      'changed_reports': changed, 'update_seconds': round(update, 3),
+                      'full_scan_seconds': round(scan, 3), 'queries': {}}
+            print(f"{size:>7} serveurs  index {build:.3f} s, inchangé {unchanged * 1000:.2f} ms, "
+                  f"{changed} modifiés {update:.3f} s, parcours complet {scan:.3f} s")
+            for name, options in QUERIES.items():
+                sql, params, _ = cmdb_query.build_query(cmdb_query.parse_args(options))
+                elapsed, rows = timed(lambda: db.execute(sql, params).fetchall())
+                result['queries'][name] = {'milliseconds': round(elapsed * 1000, 3), 'hosts': len(rows)}
+                print(f"{size:>7} serveurs  {name:<15} {elapsed * 1000:>8.2f} ms  {len(rows):>7} serveurs")
+            db.close()
+            results.append(result)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# Benchmark des filtres de construction des sections (filter_plugins/cmdb_sections.py)
+#
+# Compare, sur des faits synthétiques (par défaut 500 interfaces et 200 disques), la
+# construction des listes par les filtres cmdb_disks/cmdb_interfaces à l'ancienne boucle
+# « set_fact: x: "{{ x + [item] }}" », émulée par un rendu Jinja par élément suivi de la
+# conversion du texte rendu en liste (comme le fait Ansible). Le coût propre à chaque tâche
+# de la boucle (exécuteur, callbacks, résultat par élément) n'est pas compté : le gain réel
+# est supérieur. Nécessite jinja2 (dépendance d'ansible-core).
+#
+# Usage: python3 benchmarks/bench_section_filters.py [--interfaces 500] [--disks 200] [--json resultats.json]
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+
+from jinja2 import Environment
+
+ROLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'roles')
+sys.path.insert(0, os.path.join(ROLES_DIR, 'cmdb_inventory', 'filter_plugins'))
+import cmdb_sections  # noqa: E402
+
+# Corps des anciennes boucles de tasks/network/interfaces.yml et tasks/hardware/disks.yml
+INTERFACE_LOOP = """{{ network_interfaces + [
+  {
+    'name': interface_item,
+    'mac': hostvars['ansible_' + interface_item].macaddress | default('N/A'),
+    'ipv4': hostvars['ansible_' + interface_item].ipv4 | default({}),
+    'ipv6': hostvars['ansible_' + interface_item].ipv6 | default([]),
+    'active': hostvars['ansible_' + interface_item].active | default(false),
+    'mtu': hostvars['ansible_' + interface_item].mtu | default('N/A'),
+    'speed': hostvars['ansible_' + interface_item].speed | default('N/A'),
+    'type': hostvars['ansible_' + interface_item].type | default('N/A')
+  }
+] }}"""
+
+DISK_LOOP = """{{ hardware_disks + [{
+  'name': disk_item.key,
+  'size': disk_item.value.size | default('unknown'),
+  'sectors': disk_item.value.sectors | default('unknown'),
+  'sectorsize': disk_item.value.sectorsize | default('unknown'),
+  'model': disk_item.value.model | default('unknown'),
+  'vendor': disk_item.value.vendor | default('unknown'),
+  'removable': disk_item.value.removable | default(false),
+  'rotational': disk_item.value.rotational | default(true),
+  'scheduler_mode': disk_item.value.scheduler_mode | default('unknown'),
+  'partitions': disk_item.value.partitions | default({})
+}] }}"""
+
+INTERFACE_FILTER = "{{ ansible_facts | cmdb_interfaces(ansible_interfaces, exclude=['lo']) }}"
+DISK_FILTER = "{{ ansible_devices | cmdb_disks }}"
+
+
+def make_facts(interfaces, disks):
+    names = ['lo'] + ['eth%d' % i for i in range(min(interfaces, 4))]
+    names += ['veth%04x' % i for i in range(len(names) - 1, interfaces)]
+    facts = {'interfaces': names}
+    for index, name in enumerate(names):
+        facts[name] = {
+            'device': name, 'macaddress': '52:54:00:%02x:%02x:%02x' % (index >> 16, (index >> 8) & 255, index & 255),
+            'mtu': 1500, 'active': True, 'type': 'ether', 'speed': 10000,
+            'ipv4': {'address': '10.%d.%d.1' % (index >> 8, index & 255), 'netmask': '255.255.255.0'},
+            'ipv6': [{'address': 'fe80::%x' % index, 'prefix': '64', 'scope': 'link'}],
+        }
+    devices = {}
+    for index in range(disks):
+        devices['sd%s' % index] = {
+            'size': '100.00 GB', 'sectors': '209715200', 'sectorsize': '512', 'model': 'Virtual disk',
+            'vendor': 'VMware', 'removable': '0', 'rotational': '1', 'scheduler_mode': 'mq-deadline',
+            'partitions': {'sd%s%d' % (index, p): {'size': '50.00 GB', 'start': '2048'} for p in (1, 2)},
+        }
+    devices.update({'loop0': {'size': '0.00 Bytes'}, 'sr0': {'size': '1.00 GB'}})
+    return facts, devices
+
+
+def render(env, source, variables):
+    # Ansible convertit le texte rendu en structure Python lorsqu'il ressemble à une liste
+    return ast.literal_eval(env.from_string(source).render(variables))
+
+
+def run_loop(env, facts, devices):
+    hostvars = dict(('ansible_' + name, value) for name, value in facts.items())
+    start = time.perf_counter()
+    network_interfaces = []
+    for name in facts['interfaces']:
+        if name != 'lo' and 'ansible_' + name in hostvars:
+            network_interfaces = render(env, INTERFACE_LOOP, {
+                'network_interfaces': network_interfaces, 'interface_item': name, 'hostvars': hostvars})
+    interfaces_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hardware_disks = []
+    for key, value in devices.items():
+        if not key.startswith(('loop', 'ram', 'sr')):
+            hardware_disks = render(env, DISK_LOOP, {
+                'hardware_disks': hardware_disks, 'disk_item': {'key': key, 'value': value}})
+    disks_seconds = time.perf_counter() - start
+    return interfaces_seconds, disks_seconds, network_interfaces, hardware_disks
+
+
+def run_filters(env, facts, devices):
+    start = time.perf_counter()
+    network_interfaces = render(env, INTERFACE_FILTER, {
+        'ansible_facts': facts, 'ansible_interfaces': facts['interfaces']})
+    interfaces_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hardware_disks = render(env, DISK_FILTER, {'ansible_devices': devices})
+    disks_seconds = time.perf_counter() - start
+    return interfaces_seconds, disks_seconds, network_interfaces, hardware_disks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les filtres de sections aux boucles set_fact")
+    parser.add_argument('--interfaces', type=int, default=500)
+    parser.add_argument('--disks', type=int, default=200)
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    args = parser.parse_args()
+
+    env = Environment()
+    env.filters.update(cmdb_sections.FilterModule().filters())
+    facts, devices = make_facts(args.interfaces, args.disks)
+
+    loop = run_loop(env, facts, devices)
+    filters = run_filters(env, facts, devices)
+    if loop[2] != filters[2] or sorted(loop[3], key=lambda d: d['name']) != sorted(filters[3], key=lambda d: d['name']):
+        sys.exit("Les filtres ne produisent pas les mêmes sections que les boucles")
+
+    results = []
+    for index, (section, count) in enumerate((('interfaces', args.interfaces), ('disks', args.disks))):
+        results.append({'section': section, 'items': count,
+                        'loop_seconds': round(loop[index], 4),
+                        'filter_seconds': round(filters[index], 4),
+                        'speedup': round(loop[index] / filters[index], 1) if filters[index] else None})
+        print(f"{section:<10} {count:>5} éléments  boucle {loop[index]:>8.3f} s"
+              f"  filtre {filters[index]:>8.4f} s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Benchmark de la génération du rapport découpé en classeurs (generate_excel.py, shard_by)
+#
+# Compare le classeur unique au rapport découpé en lots de serveurs (shard_by: hash)
+# selon le nombre de processus de génération : durée totale de génération, chargement
+# des rapports compris, sur des parcs synthétiques.
+#
+# Usage: python3 benchmarks/bench_shards.py [--sizes 10000 50000] [--workers 1 2 4 8] [--null-sections 0.01] [--json resultats.json]
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_fleet import write_fleet
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '..', 'roles', 'cmdb_report', 'files', 'generate_excel.py')
+
+
+def run_report(name, data_dir, work_dir, settings):
+    config_path = os.path.join(work_dir, f'report_config_{name}.json')
+    output_dir = os.path.join(work_dir, name)
+    os.makedirs(output_dir)
+    with open(config_path, 'w') as f:
+        json.dump(dict(settings, data_dir=data_dir, engine='streaming',
+                       output_file=os.path.join(output_dir, 'report.xlsx')), f)
+
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, SCRIPT, config_path],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"Échec de la génération {name}: {process.stderr.decode()}")
+    return round(elapsed, 2), len(os.listdir(output_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure la génération du rapport découpé en classeurs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--buckets', type=int, default=0, help="Nombre de lots (0 = nombre de processus)")
+    parser.add_argument('--certificates', type=int, default=10)
+    parser.add_argument('--null-sections', type=float, default=0.01,
+                        help="Part des serveurs ayant une section à null (0 à 1)")
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'cmdb_bench_shards_{size}_')
+        try:
+            data_dir = write_fleet(os.path.join(work_dir, 'json'), size, certificates=args.certificates,
+                                   null_sections=args.null_sections)
+            single, _ = run_report('single', data_dir, work_dir, {})
+            result = {'hosts': size, 'single_seconds': single, 'sharded': []}
+            print(f"{size:>7} serveurs  classeur unique          {single:>8.2f} s")
+            for workers in args.workers:
+                buckets = args.buckets or workers
+                elapsed, files = run_report(f'hash_{workers}', data_dir, work_dir,
+                                            {'shard_by': 'hash', 'shard_buckets': buckets,
+                                             'shard_workers': workers})
+                result['sharded'].append({'workers': workers, 'buckets': buckets,
+                                          'seconds': elapsed, 'speedup': round(single / elapsed, 2)})
+                print(f"{size:>7} serveurs  {buckets:>2} lots, {workers:>2} processus  {elapsed:>8.2f} s"
+                      f"  x{single / elapsed:.2f}  ({files - 1} classeurs + index)")
+            results.append(result)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
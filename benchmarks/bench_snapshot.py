@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Benchmark de l'instantané columnaire du parc (module cmdb_fleet_snapshot)
+#
+# Compare load_report() de generate_excel.py sur les N fichiers JSON et sur
+# l'instantané unique construit à partir de ces fichiers, cache de pages froid
+# puis chaud. Nécessite ansible-core (import du module cmdb_fleet_snapshot).
+#
+# Usage: python3 benchmarks/bench_snapshot.py [--sizes 1000 10000] [--json resultats.json]
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_load_data import drop_page_cache
+from synthetic_fleet import write_fleet
+
+ROLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'roles')
+sys.path.insert(0, os.path.join(ROLES_DIR, 'cmdb_report', 'files'))
+sys.path.insert(0, os.path.join(ROLES_DIR, 'cmdb_inventory', 'library'))
+import ansible.module_utils  # noqa: E402
+# Fonctions communes des modules (module_utils du rôle), fournies par ansible à l'exécution
+ansible.module_utils.__path__.append(os.path.join(ROLES_DIR, 'cmdb_inventory', 'module_utils'))
+import generate_excel  # noqa: E402
+import cmdb_fleet_snapshot  # noqa: E402
+
+
+def build_snapshot(data_dir, dest):
+    files = sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir))
+    start = time.perf_counter()
+    gc.disable()
+    try:
+        tables = cmdb_fleet_snapshot.build_tables(files, [])
+    finally:
+        gc.enable()
+    cmdb_fleet_snapshot.write_snapshot(dest, tables, [os.path.basename(f) for f in files], 6)
+    return time.perf_counter() - start
+
+
+def run_load(config, paths, cache):
+    if cache == 'cold':
+        for path in paths:
+            drop_page_cache(path)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_excel.load_report(config)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = generate_excel.load_report(config)
+    return time.perf_counter() - start, report['hosts']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare le chargement des fichiers JSON et de l'instantané")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--json', help="Fichier de sortie des résultats au format JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'cmdb_bench_snapshot_{size}_')
+        try:
+            data_dir = write_fleet(os.path.join(work_dir, 'json'), size)
+            snapshot_dir = os.path.join(work_dir, 'snapshot')
+            os.makedirs(snapshot_dir)
+            snapshot_file = os.path.join(snapshot_dir, 'fleet.cmdbsnap')
+            build_seconds = build_snapshot(data_dir, snapshot_file)
+            print(f"{size:>7} serveurs  instantané construit en {build_seconds:.3f} s"
+                  f" ({os.path.getsize(snapshot_file) / 1048576:.1f} Mo)")
+
+            sources = {
+                'files': ({'data_dir': data_dir, 'load_workers': args.workers}, [data_dir]),
+                'snapshot': ({'data_dir': data_dir, 'snapshot_file': snapshot_file},
+                             [snapshot_dir]),
+            }
+            for source, (config, paths) in sources.items():
+                for cache in ('cold', 'warm'):
+                    elapsed, hosts = run_load(config, paths, cache)
+                    results.append({'hosts': size, 'loaded': hosts, 'source': source,
+                                    'cache': cache, 'wall_seconds': round(elapsed, 3),
+                                    'snapshot_build_seconds': round(build_seconds, 3),
+                                    'snapshot_bytes': os.path.getsize(snapshot_file)})
+                    print(f"{size:>7} serveurs  {source:<8}  cache {cache:<5} {elapsed:>8.3f} s")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# Générateur de parc synthétique pour les benchmarks du rôle cmdb_report
+#
+# Produit des fichiers <hostname>_cmdb_inventory.json ayant la même structure
+# que ceux rendus par roles/cmdb_inventory/templates/cmdb_inventory_report.j2
+#
+# Une part des fichiers peut être corrompue (JSON tronqué, fichier vide, document non
+# objet) pour mesurer le coût des rapports illisibles, et une part des serveurs peut
+# avoir une section à null (section désactivée ou non reprise par cmdb_report_merge).
+#
+# Usage: python3 benchmarks/synthetic_fleet.py <répertoire> <nombre_de_serveurs> [--seed N] [--corrupt 0.01] [--null-sections 0.01]
+import argparse
+import json
+import os
+import random
+
+DISTRIBUTIONS = [
+    ("RedHat", "RedHat", "8.9", "Ootpa", "dnf"),
+    ("RedHat", "RedHat", "9.3", "Plow", "dnf"),
+    ("RedHat", "CentOS", "7.9", "Core", "yum"),
+    ("Debian", "Debian", "12", "bookworm", "apt"),
+    ("Debian", "Debian", "11", "bullseye", "apt"),
+    ("Debian", "Ubuntu", "22.04", "jammy", "apt"),
+    ("Suse", "SLES", "15.5", "N/A", "zypper"),
+]
+ENVIRONMENTS = ["Production", "Recette", "Développement", "Pré-production"]
+CRITICALITIES = ["Critique", "Haute", "Moyenne", "Basse"]
+VIRTUALIZATION = [("VMware", "guest"), ("kvm", "guest"), ("NA", "NA"), ("docker", "guest")]
+DATACENTERS = ["DC-PARIS-01", "DC-PARIS-02", "DC-LYON-01", "DC-MARSEILLE-01"]
+SERVICES = ["sshd", "crond", "rsyslog", "chronyd", "auditd", "nginx", "httpd",
+            "postgresql", "mysqld", "docker", "kubelet", "node_exporter"]
+APPLICATIONS = ["ERP", "CRM", "Intranet", "Paie", "GED", "Supervision", "Sauvegarde"]
+SECTIONS = ["hardware", "software", "network", "security", "organizational"]
+
+
+def make_certificate(rng, index, year):
+    name = f"cert{index:03d}"
+    # Même forme qu'un enregistrement du module cmdb_cert_scanner
+    return {
+        "subject": f"CN = {name}.example.com, O = Example, C = FR",
+        "issuer": f"CN = Example Root CA {index % 7}, O = Example, C = FR",
+        "not_before": f"{year - 3}-01-{rng.randint(1, 28):02d}T00:00:00Z",
+        "not_after": f"{year}-12-{rng.randint(1, 28):02d}T23:59:59Z",
+        "days_to_expiry": rng.randint(-400, 800),
+        "path": f"/etc/ssl/certs/{name}.pem",
+        "fingerprint": f"{rng.getrandbits(256):064x}",
+    }
+
+
+def make_interface(rng, index, host_index):
+    name = f"eth{index}" if index < 4 else f"veth{index:04d}"
+    address = f"10.{(host_index >> 8) & 255}.{host_index & 255}.{10 + index}"
+    return {
+        "name": name,
+        "mac": ":".join(f"{rng.randint(0, 255):02x}" for _ in range(6)),
+        "ipv4": {"address": address, "netmask": "255.255.255.0",
+                 "network": address.rsplit('.', 1)[0] + ".0"},
+        "ipv6": [],
+        "active": True,
+        "mtu": 1500,
+        "speed": 10000,
+        "type": "ether",
+    }
+
+
+def make_disk(rng, index):
+    name = f"sd{chr(ord('a') + index % 26)}" if index < 26 else f"dm-{index}"
+    size_gb = rng.choice([20, 50, 100, 250, 500, 1000])
+    return {
+        "name": name,
+        "size": f"{size_gb}.00 GB",
+        "sectors": str(size_gb * 2097152),
+        "sectorsize": "512",
+        "model": "Virtual disk",
+        "vendor": "VMware",
+        "removable": "0",
+        "rotational": "0",
+        "scheduler_mode": "mq-deadline",
+        "partitions": {f"{name}1": {"size": f"{size_gb - 1}.00 GB", "start": "2048"}},
+    }
+
+
+def make_host(index, rng, certificates=40, interfaces=3, disks=2, packages=(400, 2500), year=2024):
+    family, distribution, version, release, pkg_mgr = rng.choice(DISTRIBUTIONS)
+    virt_type, virt_role = rng.choice(VIRTUALIZATION)
+    hostname = f"srv{index:06d}"
+    interface_list = [make_interface(rng, i, index) for i in range(interfaces)]
+    cert_list = [make_certificate(rng, i, year if i % 10 == 0 else year + 2) for i in range(certificates)]
+
+    return {
+        "inventory_id": f"{hostname}_1735689600",
+        "hostname": hostname,
+        "collection_date": "2025-01-01T02:00:00Z",
+        "hardware": {
+            "system": {
+                "architecture": "x86_64",
+                "machine_id": f"{index:032x}",
+                "virtualization_role": virt_role,
+                "virtualization_type": virt_type,
+                "manufacturer": "VMware, Inc.",
+                "model": "VMware Virtual Platform",
+                "serial": f"VMware-{index:016x}",
+            },
+            "processor": {
+                "count": rng.choice([1, 2, 4]),
+                "cores": rng.choice([2, 4, 8, 16]),
+                "threads_per_core": rng.choice([1, 2]),
+                "vcpus": rng.choice([2, 4, 8, 16, 32]),
+                "model": "Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz",
+            },
+            "memory": {"total_mb": rng.choice([2048, 4096, 8192, 16384, 65536]),
+                       "swap_mb": 2048},
+            "disks": [make_disk(rng, i) for i in range(disks)],
+            "network_interfaces": [],
+            "raid": {"detected": False},
+        },
+        "software": {
+            "os": {"family": family, "distribution": distribution,
+                   "distribution_version": version, "distribution_release": release},
+            "kernel": {"name": f"5.14.0-{rng.randint(100, 400)}.el9.x86_64",
+                       "version": "#1 SMP PREEMPT_DYNAMIC"},
+            "python": {"version": "3.9.18", "path": "/usr/bin/python3"},
+            "packages": {"manager": pkg_mgr, "count": rng.randint(*packages), "detailed": False},
+            "services": {"manager": "systemd",
+                         "running": rng.sample(SERVICES, rng.randint(3, len(SERVICES)))},
+            "databases": [{"type": "postgresql", "version": "postgres (PostgreSQL) 15.4"}]
+            if rng.random() < 0.2 else [],
+        },
+        "network": {
+            "hostname": hostname,
+            "fqdn": f"{hostname}.example.com",
+            "domain": "example.com",
+            "default_ipv4": dict(interface_list[0]["ipv4"], gateway="10.0.0.1",
+                                 interface="eth0") if interface_list else {},
+            "default_ipv6": {},
+            "interfaces": interface_list,
+            "dns": {"nameservers": ["10.0.0.53", "10.0.1.53"], "search": ["example.com"]},
+            "routes": ["default via 10.0.0.1 dev eth0 proto static metric 100"],
+            "firewall": {"type": "firewalld", "rules": ["public (active)", "  services: ssh"]},
+        },
+        "security": {
+            "selinux": {"status": "enabled", "mode": "enforcing"},
+            "apparmor": {"status": "disabled"},
+            "updates_available": rng.choice([0, 0, 0, rng.randint(1, 150)]),
+            "users": {"with_shell": rng.randint(2, 30), "with_uid0": 1,
+                      "with_sudo": rng.randint(1, 5)},
+            "certificates": {"count": len(cert_list), "details": cert_list},
+            "backup": {"solutions": ["Bacula"] if rng.random() < 0.5 else [],
+                       "detected": False},
+        },
+        "organizational": {
+            "role": rng.choice(["Serveur web", "Base de données", "Applicatif", "Infrastructure"]),
+            "environment": rng.choice(ENVIRONMENTS),
+            "criticality": rng.choice(CRITICALITIES),
+            "applications": rng.sample(APPLICATIONS, rng.randint(0, 3)),
+            "business_owner": "Direction métier",
+            "technical_owner": "Équipe infrastructure",
+            "sla": rng.choice(["Gold", "Silver", "Bronze"]),
+            "commissioned_date": "2021-06-01",
+            "end_of_life_date": "2027-06-01",
+            "datacenter": rng.choice(DATACENTERS),
+            "rack": f"R{rng.randint(1, 40):02d}",
+            "position": f"U{rng.randint(1, 42):02d}",
+        },
+    }
+
+
+def corrupt_content(rng, content):
+    kind = rng.randrange(3)
+    if kind == 0:
+        # Écriture interrompue
+        return content[:rng.randint(1, max(1, len(content) - 1))]
+    if kind == 1:
+        return ""
+    return "[]"
+
+
+def write_fleet(directory, count, seed=42, corrupt=0.0, null_sections=0.0, **profile):
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    # Tirages séparés : les serveurs générés ne dépendent pas de la part de fichiers
+    # corrompus ou de sections à null
+    corrupt_rng = random.Random(seed + 1)
+    null_rng = random.Random(seed + 2)
+    nulled = 0
+    for index in range(count):
+        host = make_host(index, rng, **profile)
+        if null_sections and null_rng.random() < null_sections:
+            # Chaque section à tour de rôle, pour que toutes soient représentées
+            host[SECTIONS[nulled % len(SECTIONS)]] = None
+            nulled += 1
+        content = json.dumps(host, indent=2, ensure_ascii=False)
+        if corrupt and corrupt_rng.random() < corrupt:
+            content = corrupt_content(corrupt_rng, content)
+        path = os.path.join(directory, f"{host['hostname']}_cmdb_inventory.json")
+        with open(path, 'w') as f:
+            f.write(content)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un parc synthétique de rapports d'inventaire CMDB")
+    parser.add_argument("directory")
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--certificates", type=int, default=40)
+    parser.add_argument("--interfaces", type=int, default=3)
+    parser.add_argument("--disks", type=int, default=2)
+    parser.add_argument("--packages", type=int, nargs=2, default=[400, 2500], metavar=("MIN", "MAX"))
+    parser.add_argument("--corrupt", type=float, default=0.0, help="Part des fichiers corrompus (0 à 1)")
+    parser.add_argument("--null-sections", type=float, default=0.0,
+                        help="Part des serveurs ayant une section à null (0 à 1)")
+    args = parser.parse_args()
+
+    write_fleet(args.directory, args.count, seed=args.seed, corrupt=args.corrupt,
+                null_sections=args.null_sections,
+                certificates=args.certificates, interfaces=args.interfaces,
+                disks=args.disks, packages=tuple(args.packages))
+    print(f"{args.count} rapports générés dans {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+name: cmdb_timing
+type: aggregate
+short_description: Mesure la durée de chaque tâche et de chaque section de collecte CMDB par serveur
+description:
+  - Enregistre, pour chaque serveur, la durée de chaque tâche (du lancement de la tâche à la réception de son résultat) et la cumule par section de collecte (C(hardware), C(software), C(network), C(security), C(organizational)) d'après le fichier de tâches du rôle C(cmdb_inventory).
+  - La collecte groupée du module C(cmdb_host_collector) est comptée dans la section C(host_collector), l'analyse des certificats (C(cmdb_cert_scanner)) dans C(security), la collecte des faits dans C(facts) et les autres tâches dans C(other).
+  - Les collectes lancées en arrière-plan (C(async), C(poll: 0)) ne comptent que pour leur lancement ; l'attente de leur fin (C(async_status)) est comptée dans la section C(async_wait).
+  - Pour une boucle C(setup) sur les sous-ensembles de faits (C(loop) sur C(gather_subset)), la durée de chaque élément est enregistrée par sous-ensemble (clé C(facts)), pour le cache des faits (module C(cmdb_fact_cache)).
+  - Au lancement d'une tâche portant l'étiquette C(cmdb_timing), les durées du serveur sont écrites dans C(<dir>/<inventory_hostname>.json), où la tâche les lit (fichier de diagnostic et récapitulatif du parc, voir C(tasks/main.yml)). Le fichier est supprimé dès le résultat de la tâche reçu.
+requirements:
+  - Activer le plugin (C(callbacks_enabled = cmdb_timing) dans C(ansible.cfg) ou variable d'environnement C(ANSIBLE_CALLBACKS_ENABLED)).
+options:
+  dir:
+    description: Répertoire des fichiers de durées des serveurs sur le contrôleur (doit correspondre à C(cmdb_timing.dir)).
+    type: path
+    default: ~/.cmdb_inventory/timing
+    env:
+      - name: CMDB_TIMING_DIR
+    ini:
+      - section: callback_cmdb_timing
+        key: dir
+  top:
+    description: Nombre de tâches les plus lentes conservées pour chaque serveur.
+    type: int
+    default: 10
+    env:
+      - name: CMDB_TIMING_TOP
+    ini:
+      - section: callback_cmdb_timing
+        key: top
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+import json
+import os
+import re
+import tempfile
+import time
+
+from ansible.module_utils.six import string_types
+from ansible.plugins.callback import CallbackBase
+
+SECTION_PATH = re.compile(r'/tasks/(hardware|software|network|security|organizational)/')
+SECTION_ACTIONS = {
+    'cmdb_host_collector': 'host_collector',
+    'cmdb_cert_scanner': 'security',
+    'async_status': 'async_wait',
+    'setup': 'facts',
+    'gather_facts': 'facts',
+}
+CHECKPOINT_TAG = 'cmdb_timing'
+
+
+def task_section(task):
+    match = SECTION_PATH.search(task.get_path() or '')
+    if match:
+        return match.group(1)
+    return SECTION_ACTIONS.get(task.action.rsplit('.', 1)[-1], 'other')
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'cmdb_timing'
+    CALLBACK_NEEDS_ENABLED = True
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self._started = {}
+        self._items = {}
+        self._hosts = {}
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self._dir = os.path.expanduser(self.get_option('dir'))
+        self._top = self.get_option('top')
+
+    def _host_file(self, host):
+        return os.path.join(self._dir, '%s.json' % host)
+
+    def _flush(self, host):
+        # Écrit avant le démarrage du processus qui exécute la tâche : le fichier est
+        # lisible par la tâche (lookup) dès son évaluation
+        timing = self._hosts.get(host)
+        if timing is None:
+            return
+        slowest = sorted(timing['tasks'].items(), key=lambda item: item[1], reverse=True)[:self._top]
+        content = {
+            'host': host,
+            'total_seconds': round(timing['total'], 3),
+            'sections': dict((name, round(seconds, 3)) for name, seconds in timing['sections'].items()),
+            'slowest_tasks': [{'task': name, 'seconds': round(seconds, 3)} for name, seconds in slowest],
+        }
+        if timing['facts']:
+            content['facts'] = dict((name, round(seconds, 3)) for name, seconds in timing['facts'].items())
+        try:
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=self._dir, prefix='.%s.' % host)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(content, f)
+            os.rename(tmp, self._host_file(host))
+        except (IOError, OSError) as e:
+            self._display.warning("cmdb_timing : durées de %s non écrites : %s" % (host, e))
+
+    def v2_runner_on_start(self, host, task):
+        name = host.get_name()
+        self._started[(name, task._uuid)] = self._items[(name, task._uuid)] = time.time()
+        if CHECKPOINT_TAG in task.tags:
+            self._flush(name)
+
+    def _record(self, result):
+        host = result._host.get_name()
+        task = result._task
+        started = self._started.pop((host, task._uuid), None)
+        self._items.pop((host, task._uuid), None)
+        if CHECKPOINT_TAG in task.tags:
+            try:
+                os.unlink(self._host_file(host))
+            except OSError:
+                pass
+        if started is None:
+            return
+        seconds = time.time() - started
+        timing = self._host_timing(host)
+        section = task_section(task)
+        name = task.get_name()
+        timing['total'] += seconds
+        timing['sections'][section] = timing['sections'].get(section, 0.0) + seconds
+        timing['tasks'][name] = timing['tasks'].get(name, 0.0) + seconds
+
+    def _host_timing(self, host):
+        return self._hosts.setdefault(host, {'total': 0.0, 'sections': {}, 'tasks': {}, 'facts': {}})
+
+    def _record_item(self, result):
+        # Les éléments d'une boucle sont exécutés l'un après l'autre : la durée d'un élément
+        # court de la fin du précédent (ou du lancement de la tâche) à son résultat
+        task = result._task
+        if task.action.rsplit('.', 1)[-1] not in ('setup', 'gather_facts'):
+            return
+        host = result._host.get_name()
+        key = (host, task._uuid)
+        if key not in self._items:
+            return
+        now = time.time()
+        seconds = now - self._items[key]
+        self._items[key] = now
+        loop_var = task.loop_control.loop_var if task.loop_control else 'item'
+        subset = result._result.get(loop_var)
+        if isinstance(subset, string_types):
+            facts = self._host_timing(host)['facts']
+            facts[subset] = facts.get(subset, 0.0) + seconds
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result)
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result)
+
+    def v2_runner_item_on_ok(self, result):
+        self._record_item(result)
+
+    def v2_runner_item_on_failed(self, result):
+        self._record_item(result)
+
+    def v2_runner_item_on_skipped(self, result):
+        self._record_item(result)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+# Auteur : Philippe CANDIDO (@PhilCANDIDO)
+#
+# Filtres de construction des sections du rapport CMDB à partir des faits Ansible.
+#
+# Chaque filtre construit une liste ou une section complète en un seul appel Python,
+# en remplacement des boucles « set_fact: x: "{{ x + [item] }}" » (une tâche, un passage
+# Jinja et une copie de la liste par élément, soit un coût quadratique sur les serveurs
+# comportant des centaines de disques ou d'interfaces veth/bridge).
+#
+#   cmdb_disks          : ansible_devices -> hardware_info.disks
+#   cmdb_interfaces     : ansible_facts + ansible_interfaces -> network_info.interfaces
+#                         (fields='summary') ou hardware_info.network_interfaces (fields='facts')
+#   cmdb_merge_sections : fusion de plusieurs dictionnaires en une passe (équivalent d'une
+#                         chaîne de combine)
+#   cmdb_flatten_csv    : rapport -> CSV « chemin,valeur » (cmdb_output_format: csv)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import re
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Périphériques virtuels exclus de la liste des disques
+DISK_EXCLUDE_PREFIXES = ('loop', 'ram', 'sr')
+
+# Champs d'un disque et valeur par défaut lorsqu'ils sont absents des faits
+DISK_FIELDS = (
+    ('size', 'unknown'),
+    ('sectors', 'unknown'),
+    ('sectorsize', 'unknown'),
+    ('model', 'unknown'),
+    ('vendor', 'unknown'),
+    ('removable', False),
+    ('rotational', True),
+    ('scheduler_mode', 'unknown'),
+    ('partitions', {}),
+)
+
+# Champs d'une interface de network_info.interfaces : (nom dans le rapport, fait, défaut)
+INTERFACE_FIELDS = (
+    ('mac', 'macaddress', 'N/A'),
+    ('ipv4', 'ipv4', {}),
+    ('ipv6', 'ipv6', []),
+    ('active', 'active', False),
+    ('mtu', 'mtu', 'N/A'),
+    ('speed', 'speed', 'N/A'),
+    ('type', 'type', 'N/A'),
+)
+
+FACT_NAME = re.compile(r'[^A-Za-z0-9_]')
+
+
+def _field(values, key, default):
+    # Même règle que le filtre default : seule une clé absente prend la valeur par défaut
+    return values[key] if key in values else default
+
+
+def cmdb_disks(devices, exclude=DISK_EXCLUDE_PREFIXES):
+    if not isinstance(devices, Mapping):
+        return []
+    exclude = tuple(exclude)
+    disks = []
+    for name, values in devices.items():
+        if name.startswith(exclude):
+            continue
+        values = values if isinstance(values, Mapping) else {}
+        disk = {'name': name}
+        for key, default in DISK_FIELDS:
+            disk[key] = _field(values, key, default)
+        disks.append(disk)
+    return disks
+
+
+def _interface_facts(facts, name):
+    # Les faits d'une interface sont nommés d'après l'interface, caractères spéciaux
+    # remplacés par « _ » (br-1a2b -> br_1a2b), avec le préfixe ansible_ dans hostvars
+    fact_name = FACT_NAME.sub('_', name)
+    for key in (name, fact_name, 'ansible_' + name, 'ansible_' + fact_name):
+        if key in facts:
+            return facts[key]
+    return None
+
+
+def cmdb_interfaces(facts, names, fields='summary', exclude=()):
+    if fields not in ('summary', 'facts'):
+        raise ValueError("cmdb_interfaces : fields doit valoir 'summary' ou 'facts'")
+    if not isinstance(facts, Mapping) or not names:
+        return []
+    exclude = frozenset(exclude)
+    interfaces = []
+    for name in names:
+        if name in exclude:
+            continue
+        values = _interface_facts(facts, name)
+        if not isinstance(values, Mapping):
+            continue
+        if fields == 'facts':
+            interfaces.append(values)
+            continue
+        interface = {'name': name}
+        for key, fact, default in INTERFACE_FIELDS:
+            interface[key] = _field(values, fact, default)
+        interfaces.append(interface)
+    return interfaces
+
+
+def _merge(base, update, recursive):
+    for key, value in update.items():
+        if recursive and isinstance(value, Mapping) and isinstance(base.get(key), Mapping):
+            merged = dict(base[key])
+            _merge(merged, value, recursive)
+            base[key] = merged
+        else:
+            base[key] = value
+
+
+def cmdb_merge_sections(base, *updates, **kwargs):
+    recursive = kwargs.pop('recursive', False)
+    if kwargs:
+        raise TypeError("cmdb_merge_sections : option inconnue %s" % ', '.join(kwargs))
+    result = dict(base) if isinstance(base, Mapping) else {}
+    for update in updates:
+        # Les sections absentes (None) sont ignorées
+        if isinstance(update, Mapping):
+            _merge(result, update, recursive)
+    return result
+
+
+def _csv_field(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    elif isinstance(value, Mapping):
+        value = '{}'
+    elif isinstance(value, list):
+        value = '[]'
+    else:
+        value = u'%s' % (value,)
+    if any(char in value for char in ',"\r\n'):
+        return u'"%s"' % value.replace('"', '""')
+    return value
+
+
+def _flatten(value, path, lines):
+    if isinstance(value, Mapping) and value:
+        for key, item in value.items():
+            _flatten(item, path + [u'%s' % (key,)], lines)
+    elif isinstance(value, list) and value:
+        for index, item in enumerate(value):
+            _flatten(item, path + [u'%d' % index], lines)
+    else:
+        lines.append(u'%s,%s' % (_csv_field(u'.'.join(path)), _csv_field(value)))
+
+
+def cmdb_flatten_csv(report):
+    # Une ligne par valeur : chemin complet (clés et indices de liste séparés par des
+    # points) et valeur ; les conteneurs vides sont écrits {} ou []
+    lines = [u'chemin,valeur']
+    _flatten(report, [], lines)
+    return u'\n'.join(lines) + u'\n'
+
+
+class FilterModule(object):
+
+    def filters(self):
+        return {
+            'cmdb_disks': cmdb_disks,
+            'cmdb_interfaces': cmdb_interfaces,
+            'cmdb_merge_sections': cmdb_merge_sections,
+            'cmdb_flatten_csv': cmdb_flatten_csv,
+        }
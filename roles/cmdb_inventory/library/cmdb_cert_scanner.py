@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_cert_scanner
+short_description: Analyse en une seule passe les certificats X.509 d'un serveur
+description:
+  - Parcourt les répertoires de certificats, lit chaque fichier PEM (y compris les fichiers regroupant plusieurs certificats) ou DER et décode les certificats en Python, sans lancer C(openssl) pour chaque fichier.
+  - Les certificats présents dans plusieurs fichiers (liens symboliques de C(/etc/ssl/certs), fichier C(ca-certificates.crt)...) sont dédoublonnés par empreinte SHA-256 ; le premier chemin rencontré (ordre alphabétique) est conservé.
+  - Chaque certificat est décrit par un enregistrement compact (sujet, émetteur, dates ISO 8601, jours restants avant expiration, chemin).
+options:
+  paths:
+    description: Répertoires à parcourir ; les répertoires absents sont ignorés.
+    type: list
+    elements: path
+    default: [/etc/ssl/certs, /etc/pki/tls/certs, /etc/nginx/ssl, /etc/apache2/ssl]
+  patterns:
+    description: Motifs des noms de fichiers à analyser.
+    type: list
+    elements: str
+    default: ['*.crt', '*.pem']
+  recurse:
+    description: Parcourir aussi les sous-répertoires.
+    type: bool
+    default: true
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Analyser les certificats du serveur
+  cmdb_cert_scanner:
+    paths:
+      - /etc/ssl/certs
+      - /etc/pki/tls/certs
+  register: cert_scan
+'''
+
+RETURN = r'''
+certificates:
+  description:
+    - C(count) nombre de certificats distincts, C(files) nombre de fichiers analysés, C(unreadable) nombre de certificats illisibles.
+    - C(details) liste des certificats (C(subject), C(issuer), C(not_before), C(not_after), C(days_to_expiry), C(path), C(fingerprint)).
+  returned: always
+  type: dict
+  sample:
+    count: 1
+    files: 1
+    unreadable: 0
+    details:
+      - subject: "C = FR, O = Exemple, CN = web01.exemple.fr"
+        issuer: "C = FR, O = Exemple, CN = Exemple CA"
+        not_before: "2025-01-15T00:00:00Z"
+        not_after: "2026-01-15T23:59:59Z"
+        days_to_expiry: 120
+        path: /etc/pki/tls/certs/web01.crt
+        fingerprint: 3f0c...
+'''
+
+import binascii
+import fnmatch
+import hashlib
+import os
+import re
+from datetime import datetime
+
+from ansible.module_utils.basic import AnsibleModule
+
+PEM_BLOCK = re.compile(br'-----BEGIN (?:TRUSTED |X509 )?CERTIFICATE-----(.+?)-----END (?:TRUSTED |X509 )?CERTIFICATE-----',
+                       re.DOTALL)
+
+# Les fichiers plus gros ne sont pas des certificats (archives, journaux...)
+MAX_FILE_SIZE = 8 * 1024 * 1024
+
+# Noms courts des attributs de nom distinctif (notation d'openssl x509 -subject)
+ATTRIBUTE_NAMES = {
+    '2.5.4.3': 'CN', '2.5.4.4': 'SN', '2.5.4.5': 'serialNumber', '2.5.4.6': 'C',
+    '2.5.4.7': 'L', '2.5.4.8': 'ST', '2.5.4.9': 'street', '2.5.4.10': 'O',
+    '2.5.4.11': 'OU', '2.5.4.12': 'title', '2.5.4.42': 'GN', '2.5.4.97': 'organizationIdentifier',
+    '1.2.840.113549.1.9.1': 'emailAddress', '0.9.2342.19200300.100.1.25': 'DC',
+    '0.9.2342.19200300.100.1.1': 'UID',
+}
+
+# Types ASN.1 des valeurs d'attributs et leur encodage
+STRING_ENCODINGS = {
+    0x0c: 'utf-8', 0x13: 'ascii', 0x16: 'ascii', 0x14: 'latin-1', 0x1a: 'ascii',
+    0x1e: 'utf-16-be', 0x1c: 'utf-32-be',
+}
+
+UTC_TIME = 0x17
+GENERALIZED_TIME = 0x18
+
+
+class CertificateError(Exception):
+    pass
+
+
+def read_tlv(data, pos):
+    # Retourne (tag, début du contenu, fin du contenu) de l'élément DER en position pos
+    if pos + 2 > len(data):
+        raise CertificateError('élément DER tronqué')
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7f
+        if count == 0 or count > 4 or pos + count > len(data):
+            raise CertificateError('longueur DER invalide')
+        length = 0
+        for byte in data[pos:pos + count]:
+            length = (length << 8) | byte
+        pos += count
+    if pos + length > len(data):
+        raise CertificateError('élément DER tronqué')
+    return tag, pos, pos + length
+
+
+def children(data, start, end):
+    pos = start
+    while pos < end:
+        tag, content, pos = read_tlv(data, pos)
+        yield tag, content, pos
+
+
+def decode_oid(raw):
+    values = []
+    value = 0
+    for byte in raw:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            values.append(value)
+            value = 0
+    if not values:
+        return ''
+    first = min(values[0] // 40, 2)
+    return '.'.join(str(v) for v in [first, values[0] - first * 40] + values[1:])
+
+
+def decode_name(data, start, end):
+    parts = []
+    for set_tag, set_start, set_end in children(data, start, end):
+        for seq_tag, seq_start, seq_end in children(data, set_start, set_end):
+            items = list(children(data, seq_start, seq_end))
+            if len(items) != 2:
+                continue
+            oid = decode_oid(data[items[0][1]:items[0][2]])
+            value_tag, value_start, value_end = items[1]
+            value = bytes(data[value_start:value_end]).decode(
+                STRING_ENCODINGS.get(value_tag, 'latin-1'), 'replace')
+            if ',' in value:
+                value = '"%s"' % value
+            parts.append('%s = %s' % (ATTRIBUTE_NAMES.get(oid, oid), value))
+    return ', '.join(parts)
+
+
+def decode_time(data, tag, start, end):
+    text = bytes(data[start:end]).decode('ascii')
+    if tag == UTC_TIME:
+        # RFC 5280 : années 50 à 99 au XXe siècle
+        year = int(text[:2])
+        text = ('19' if year >= 50 else '20') + text
+    elif tag != GENERALIZED_TIME:
+        raise CertificateError('type de date inconnu')
+    return datetime.strptime(text[:14], '%Y%m%d%H%M%S')
+
+
+def parse_certificate(der):
+    # Certificate ::= SEQUENCE { tbsCertificate, signatureAlgorithm, signature }
+    data = bytearray(der)
+    tag, start, end = read_tlv(data, 0)
+    tbs_tag, tbs_start, tbs_end = read_tlv(data, start)
+    fields = [(t, s, e) for t, s, e in children(data, tbs_start, tbs_end)]
+    if fields and fields[0][0] == 0xa0:
+        # Champ version explicite [0]
+        fields = fields[1:]
+    if tag != 0x30 or tbs_tag != 0x30 or len(fields) < 5:
+        raise CertificateError('structure X.509 invalide')
+    # serialNumber, signature, issuer, validity, subject
+    issuer = decode_name(data, fields[2][1], fields[2][2])
+    validity = list(children(data, fields[3][1], fields[3][2]))
+    subject = decode_name(data, fields[4][1], fields[4][2])
+    if len(validity) != 2:
+        raise CertificateError('période de validité invalide')
+    not_before = decode_time(data, *validity[0])
+    not_after = decode_time(data, *validity[1])
+    return {
+        'subject': subject,
+        'issuer': issuer,
+        'not_before': not_before,
+        'not_after': not_after,
+        # Empreinte du certificat seul (les certificats TRUSTED sont suivis d'attributs)
+        'fingerprint': hashlib.sha256(bytes(data[:end])).hexdigest(),
+    }
+
+
+def certificate_blobs(content):
+    blocks = PEM_BLOCK.findall(content)
+    if blocks:
+        for block in blocks:
+            try:
+                yield binascii.a2b_base64(b''.join(block.split()))
+            except (binascii.Error, ValueError):
+                yield None
+    elif content[:1] == b'\x30':
+        # Certificat DER
+        yield content
+
+
+def find_files(paths, patterns, recurse):
+    found = set()
+    for root in paths:
+        if not os.path.isdir(root):
+            continue
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in filenames:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    found.add(os.path.join(directory, name))
+            if not recurse:
+                break
+    return sorted(found)
+
+
+def iso(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def scan(paths, patterns, recurse, now):
+    details = []
+    seen = set()
+    files = 0
+    unreadable = 0
+    for path in find_files(paths, patterns, recurse):
+        try:
+            if os.path.getsize(path) > MAX_FILE_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            continue
+        files += 1
+        for der in certificate_blobs(content):
+            try:
+                if der is None:
+                    raise CertificateError('encodage base64 invalide')
+                cert = parse_certificate(der)
+            except (CertificateError, ValueError, IndexError):
+                unreadable += 1
+                continue
+            if cert['fingerprint'] in seen:
+                continue
+            seen.add(cert['fingerprint'])
+            details.append({
+                'subject': cert['subject'],
+                'issuer': cert['issuer'],
+                'not_before': iso(cert['not_before']),
+                'not_after': iso(cert['not_after']),
+                'days_to_expiry': (cert['not_after'] - now).days,
+                'path': path,
+                'fingerprint': cert['fingerprint'],
+            })
+    return {
+        'count': len(details),
+        'files': files,
+        'unreadable': unreadable,
+        'details': details,
+    }
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            paths=dict(type='list', elements='path',
+                       default=['/etc/ssl/certs', '/etc/pki/tls/certs', '/etc/nginx/ssl', '/etc/apache2/ssl']),
+            patterns=dict(type='list', elements='str', default=['*.crt', '*.pem']),
+            recurse=dict(type='bool', default=True),
+        ),
+        supports_check_mode=True,
+    )
+
+    certificates = scan(module.params['paths'], module.params['patterns'],
+                        module.params['recurse'], datetime.utcnow())
+    module.exit_json(changed=False, certificates=certificates)
+
+
+if __name__ == '__main__':
+    main()
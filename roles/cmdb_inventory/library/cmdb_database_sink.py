@@ -0,0 +1,518 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_database_sink
+short_description: Chargement des rapports d'inventaire dans la base de données CMDB
+description:
+  - Lit les rapports d'inventaire du repository et les écrit dans une base de données (une ligne ou un document par serveur, clé C(hostname), avec C(inventory_id), C(collection_date) et le rapport complet).
+  - Les empreintes de contenu (sha1 du rapport hors chemins C(hash_ignore)) déjà présentes dans la base sont lues en une requête ; seuls les rapports dont l'empreinte a changé sont écrits, les autres ne reçoivent qu'une mise à jour groupée de C(last_seen).
+  - Les écritures sont groupées par lots de C(batch_size) rapports (upsert en masse) et réparties entre C(workers) écrivains, chacun réutilisant sa connexion pour tous ses lots.
+  - C(sqlite) (bibliothèque standard) sert de base locale de test ou de substitution ; C(postgresql) nécessite C(psycopg2), C(mysql) C(pymysql) et C(mongodb) C(pymongo) sur le serveur qui exécute le module.
+options:
+  path:
+    description: Répertoire des rapports d'inventaire.
+    type: path
+    required: true
+  patterns:
+    description: Motifs (glob) des rapports à lire.
+    type: list
+    elements: str
+    default: ['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst']
+  type:
+    description: Type de base de données.
+    type: str
+    choices: [sqlite, postgresql, mysql, mongodb]
+    default: sqlite
+  host:
+    description: Serveur de base de données.
+    type: str
+    default: localhost
+  port:
+    description: Port du serveur (port par défaut du type de base s'il est omis).
+    type: int
+  name:
+    description: Nom de la base ; chemin du fichier avec C(type=sqlite).
+    type: str
+    required: true
+  user:
+    description: Utilisateur de connexion.
+    type: str
+  password:
+    description: Mot de passe de connexion.
+    type: str
+  collection:
+    description: Table ou collection des serveurs (créée si nécessaire).
+    type: str
+    default: servers
+  batch_size:
+    description: Nombre de rapports écrits par requête d'upsert.
+    type: int
+    default: 500
+  workers:
+    description: Nombre d'écrivains parallèles, chacun avec sa connexion (toujours 1 avec C(sqlite)).
+    type: int
+    default: 4
+  hash_ignore:
+    description: Chemins (séparés par des points, C(*) pour tout élément) exclus de l'empreinte car modifiés à chaque collecte.
+    type: list
+    elements: str
+    default: ['inventory_id', 'collection_date', 'collection', 'security.updates_check', 'security.certificates.details.*.days_to_expiry']
+  prune:
+    description: Supprimer de la base les serveurs dont le rapport n'existe plus dans le repository.
+    type: bool
+    default: false
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Charger les rapports dans PostgreSQL
+  cmdb_database_sink:
+    path: /opt/cmdb/inventory/reports
+    type: postgresql
+    host: db.example.com
+    name: cmdb
+    user: cmdb_user
+    password: "{{ vault_cmdb_db_password }}"
+    collection: servers
+    batch_size: 1000
+    workers: 4
+  delegate_to: "{{ cmdb_inventory_repository_host }}"
+  run_once: true
+
+- name: Charger les rapports dans une base SQLite locale
+  cmdb_database_sink:
+    path: /opt/cmdb/inventory/reports
+    type: sqlite
+    name: /opt/cmdb/inventory/database/cmdb.sqlite
+'''
+
+RETURN = r'''
+upserted:
+  description: Nombre de rapports écrits (nouveaux ou modifiés).
+  returned: always
+  type: int
+unchanged:
+  description: Nombre de rapports dont l'empreinte n'a pas changé.
+  returned: always
+  type: int
+removed:
+  description: Serveurs supprimés de la base (C(prune)).
+  returned: always
+  type: list
+batches:
+  description: Nombre de lots écrits.
+  returned: always
+  type: int
+seconds:
+  description: Durée du chargement.
+  returned: always
+  type: float
+errors:
+  description: Rapports ignorés car illisibles, avec le message d'erreur.
+  returned: always
+  type: list
+'''
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import HASH_IGNORE, read_report, strip_paths
+
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    psycopg2 = None
+
+try:
+    import pymysql
+except ImportError:
+    pymysql = None
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Colonnes des tables SQL, dans l'ordre des lignes écrites
+COLUMNS = ('hostname', 'inventory_id', 'collection_date', 'content_hash', 'last_seen', 'document')
+
+
+def content_hash(report, ignore):
+    stripped = json.loads(json.dumps(report))
+    for parts in ignore:
+        strip_paths(stripped, parts)
+    return hashlib.sha1(json.dumps(stripped, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SqliteBackend(object):
+    """Base locale : un seul écrivain (verrou d'écriture SQLite)."""
+
+    parallel = False
+
+    def __init__(self, params):
+        self.path = params['name']
+        self.table = params['collection']
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o755)
+        return sqlite3.connect(self.path, timeout=60)
+
+    def setup(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS %s (hostname TEXT PRIMARY KEY, inventory_id TEXT, "
+                     "collection_date TEXT, content_hash TEXT, last_seen TEXT, document TEXT)" % self.table)
+        conn.commit()
+
+    def hashes(self, conn):
+        return dict(conn.execute("SELECT hostname, content_hash FROM %s" % self.table))
+
+    def upsert(self, conn, rows):
+        conn.executemany("INSERT OR REPLACE INTO %s VALUES (?, ?, ?, ?, ?, ?)" % self.table, rows)
+        conn.commit()
+
+    def touch(self, conn, hostnames, now):
+        conn.executemany("UPDATE %s SET last_seen = ? WHERE hostname = ?" % self.table,
+                         [(now, hostname) for hostname in hostnames])
+        conn.commit()
+
+    def delete(self, conn, hostnames):
+        conn.executemany("DELETE FROM %s WHERE hostname = ?" % self.table, [(hostname,) for hostname in hostnames])
+        conn.commit()
+
+    def close(self, conn):
+        conn.close()
+
+
+class PostgresqlBackend(SqliteBackend):
+
+    parallel = True
+
+    def __init__(self, params):
+        self.params = params
+        self.table = params['collection']
+
+    def connect(self):
+        return psycopg2.connect(host=self.params['host'], port=self.params['port'] or 5432,
+                                dbname=self.params['name'], user=self.params['user'],
+                                password=self.params['password'])
+
+    def setup(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("CREATE TABLE IF NOT EXISTS %s (hostname TEXT PRIMARY KEY, inventory_id TEXT, "
+                        "collection_date TEXT, content_hash TEXT, last_seen TEXT, document JSONB)" % self.table)
+        conn.commit()
+
+    def hashes(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT hostname, content_hash FROM %s" % self.table)
+            return dict(cur.fetchall())
+
+    def upsert(self, conn, rows):
+        # Une seule requête INSERT ... VALUES (...), (...) par lot
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur, "INSERT INTO %s (%s) VALUES %%s ON CONFLICT (hostname) DO UPDATE SET %s"
+                % (self.table, ', '.join(COLUMNS),
+                   ', '.join('%s = EXCLUDED.%s' % (column, column) for column in COLUMNS[1:])),
+                rows, page_size=len(rows))
+        conn.commit()
+
+    def touch(self, conn, hostnames, now):
+        with conn.cursor() as cur:
+            cur.execute("UPDATE %s SET last_seen = %%s WHERE hostname = ANY(%%s)" % self.table,
+                        (now, list(hostnames)))
+        conn.commit()
+
+    def delete(self, conn, hostnames):
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM %s WHERE hostname = ANY(%%s)" % self.table, (list(hostnames),))
+        conn.commit()
+
+
+class MysqlBackend(SqliteBackend):
+
+    parallel = True
+
+    def __init__(self, params):
+        self.params = params
+        self.table = params['collection']
+
+    def connect(self):
+        return pymysql.connect(host=self.params['host'], port=self.params['port'] or 3306,
+                               database=self.params['name'], user=self.params['user'],
+                               password=self.params['password'] or '', charset='utf8mb4')
+
+    def setup(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("CREATE TABLE IF NOT EXISTS %s (hostname VARCHAR(255) PRIMARY KEY, "
+                        "inventory_id VARCHAR(255), collection_date VARCHAR(64), content_hash CHAR(40), "
+                        "last_seen VARCHAR(64), document LONGTEXT) CHARACTER SET utf8mb4" % self.table)
+        conn.commit()
+
+    def hashes(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT hostname, content_hash FROM %s" % self.table)
+            return dict(cur.fetchall())
+
+    def upsert(self, conn, rows):
+        # pymysql regroupe executemany d'un INSERT ... VALUES en une requête multi-lignes
+        with conn.cursor() as cur:
+            cur.executemany("INSERT INTO %s (%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s"
+                            % (self.table, ', '.join(COLUMNS), ', '.join(['%s'] * len(COLUMNS)),
+                               ', '.join('%s = VALUES(%s)' % (column, column) for column in COLUMNS[1:])),
+                            rows)
+        conn.commit()
+
+    def touch(self, conn, hostnames, now):
+        hostnames = list(hostnames)
+        with conn.cursor() as cur:
+            cur.execute("UPDATE %s SET last_seen = %%s WHERE hostname IN (%s)"
+                        % (self.table, ', '.join(['%s'] * len(hostnames))), [now] + hostnames)
+        conn.commit()
+
+    def delete(self, conn, hostnames):
+        hostnames = list(hostnames)
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM %s WHERE hostname IN (%s)"
+                        % (self.table, ', '.join(['%s'] * len(hostnames))), hostnames)
+        conn.commit()
+
+
+class MongodbBackend(object):
+    """Client unique (pool de connexions de pymongo, partagé par les écrivains)."""
+
+    parallel = True
+
+    def __init__(self, params):
+        kwargs = {}
+        if params['user']:
+            kwargs.update(username=params['user'], password=params['password'], authSource=params['name'])
+        self.client = pymongo.MongoClient(params['host'], params['port'] or 27017, **kwargs)
+        self.collection = self.client[params['name']][params['collection']]
+
+    def connect(self):
+        return self.collection
+
+    def setup(self, conn):
+        pass
+
+    def hashes(self, conn):
+        return dict((doc['_id'], doc.get('content_hash')) for doc in conn.find({}, {'content_hash': 1}))
+
+    def upsert(self, conn, rows):
+        conn.bulk_write([pymongo.ReplaceOne({'_id': row[0]}, dict(zip(COLUMNS[1:-1], row[1:-1]),
+                                                                   document=json.loads(row[-1])), upsert=True)
+                         for row in rows], ordered=False)
+
+    def touch(self, conn, hostnames, now):
+        conn.update_many({'_id': {'$in': list(hostnames)}}, {'$set': {'last_seen': now}})
+
+    def delete(self, conn, hostnames):
+        conn.delete_many({'_id': {'$in': list(hostnames)}})
+
+    def close(self, conn):
+        pass
+
+
+BACKENDS = {
+    'sqlite': (SqliteBackend, None, None),
+    'postgresql': (PostgresqlBackend, lambda: psycopg2, 'psycopg2'),
+    'mysql': (MysqlBackend, lambda: pymysql, 'pymysql'),
+    'mongodb': (MongodbBackend, lambda: pymongo, 'pymongo'),
+}
+
+
+class WriterPool(object):
+    """Écrivains parallèles alimentés par une file bornée (mémoire limitée à quelques lots)."""
+
+    def __init__(self, backend, workers):
+        self.backend = backend
+        self.queue = queue.Queue(maxsize=workers * 2)
+        self.errors = []
+        self.batches = 0
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run) for _ in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def run(self):
+        conn = None
+        try:
+            conn = self.backend.connect()
+            while True:
+                rows = self.queue.get()
+                if rows is None:
+                    break
+                try:
+                    self.backend.upsert(conn, rows)
+                    with self.lock:
+                        self.batches += 1
+                except Exception as e:
+                    with self.lock:
+                        self.errors.append("%s (lot de %d rapports à partir de %s)" % (e, len(rows), rows[0][0]))
+        except Exception as e:
+            with self.lock:
+                self.errors.append(str(e))
+            # Vider la file pour ne pas bloquer le lecteur
+            while self.queue.get() is not None:
+                pass
+        finally:
+            if conn is not None:
+                self.backend.close(conn)
+
+    def submit(self, rows):
+        self.queue.put(rows)
+
+    def join(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def load(module, backend):
+    params = module.params
+    path = params['path']
+    if not os.path.isdir(path):
+        module.fail_json(msg="Le répertoire des rapports %s n'existe pas" % path)
+    files = sorted(name for name in os.listdir(path)
+                   if any(fnmatch.fnmatch(name, pattern) for pattern in params['patterns']))
+    ignore = [pattern.split('.') for pattern in params['hash_ignore']]
+    now = time.strftime(ISO_FORMAT, time.gmtime())
+    batch_size = max(1, params['batch_size'])
+    workers = max(1, params['workers']) if backend.parallel else 1
+
+    conn = backend.connect()
+    try:
+        backend.setup(conn)
+        known = backend.hashes(conn)
+
+        errors = []
+        unchanged = []
+        seen = set()
+        batch = []
+        upserted = 0
+        pool = WriterPool(backend, workers) if workers > 1 and not module.check_mode else None
+        batches = 0
+        for name in files:
+            try:
+                report = read_report(os.path.join(path, name))
+                if not isinstance(report, dict):
+                    raise ValueError("document d'inventaire invalide")
+            except (IOError, OSError, ValueError) as e:
+                errors.append({'file': name, 'msg': str(e)})
+                continue
+            hostname = report.get('hostname') or name.split('_cmdb_inventory')[0]
+            seen.add(hostname)
+            digest = content_hash(report, ignore)
+            if known.get(hostname) == digest:
+                unchanged.append(hostname)
+                continue
+            batch.append((hostname, report.get('inventory_id'), report.get('collection_date'), digest, now,
+                          json.dumps(report, separators=(',', ':'), ensure_ascii=False)))
+            upserted += 1
+            if len(batch) >= batch_size:
+                if pool is not None:
+                    pool.submit(batch)
+                elif not module.check_mode:
+                    backend.upsert(conn, batch)
+                    batches += 1
+                batch = []
+        if batch and not module.check_mode:
+            if pool is not None:
+                pool.submit(batch)
+            else:
+                backend.upsert(conn, batch)
+                batches += 1
+        if pool is not None:
+            pool.join()
+            batches = pool.batches
+            if pool.errors:
+                module.fail_json(msg="Échec de l'écriture dans la base %s : %s" % (params['name'], '; '.join(pool.errors)),
+                                 upserted=upserted, errors=errors)
+
+        removed = []
+        if not module.check_mode:
+            for hostnames in batched(unchanged, batch_size):
+                backend.touch(conn, hostnames, now)
+            if params['prune']:
+                removed = sorted(hostname for hostname in known if hostname not in seen)
+                for hostnames in batched(removed, batch_size):
+                    backend.delete(conn, hostnames)
+    finally:
+        backend.close(conn)
+    return upserted, len(unchanged), removed, batches, errors
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            path=dict(type='path', required=True),
+            patterns=dict(type='list', elements='str',
+                          default=['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz',
+                                   '*_cmdb_inventory.json.zst']),
+            type=dict(type='str', choices=['sqlite', 'postgresql', 'mysql', 'mongodb'], default='sqlite'),
+            host=dict(type='str', default='localhost'),
+            port=dict(type='int'),
+            name=dict(type='str', required=True),
+            user=dict(type='str'),
+            password=dict(type='str', no_log=True),
+            collection=dict(type='str', default='servers'),
+            batch_size=dict(type='int', default=500),
+            workers=dict(type='int', default=4),
+            hash_ignore=dict(type='list', elements='str', default=list(HASH_IGNORE)),
+            prune=dict(type='bool', default=False),
+        ),
+        supports_check_mode=True,
+    )
+
+    backend_class, driver, library = BACKENDS[module.params['type']]
+    if driver is not None and driver() is None:
+        module.fail_json(msg="Le module Python %s est nécessaire pour une base %s" % (library, module.params['type']))
+    if not IDENTIFIER.match(module.params['collection']):
+        module.fail_json(msg="Nom de table ou de collection invalide : %s" % module.params['collection'])
+
+    start = time.time()
+    try:
+        upserted, unchanged, removed, batches, errors = load(module, backend_class(module.params))
+    except Exception as e:
+        module.fail_json(msg="Base de données %s (%s) inutilisable : %s" % (module.params['name'], module.params['type'], e))
+
+    for error in errors:
+        module.warn("Rapport ignoré %s : %s" % (error['file'], error['msg']))
+    module.exit_json(changed=bool(upserted or removed), upserted=upserted, unchanged=unchanged,
+                     removed=removed, batches=batches, seconds=round(time.time() - start, 3), errors=errors)
+
+
+if __name__ == '__main__':
+    main()
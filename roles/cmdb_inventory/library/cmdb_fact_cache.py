@@ -0,0 +1,241 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_fact_cache
+short_description: Cache persistant des faits Ansible par sous-ensemble, avec durée de validité
+description:
+  - Conserve sur le contrôleur, dans un fichier JSON par serveur (C(<dir>/<host>.json)), les faits Ansible de chaque sous-ensemble collecté (C(gather_subset) du module C(setup)) avec leur date de collecte et la durée de leur collecte.
+  - Avec C(state=get), retourne dans C(ansible_facts) les faits des sous-ensembles demandés encore valides (plus récents que leur durée de validité C(ttl)) et la liste des sous-ensembles à collecter (C(stale)).
+  - Avec C(state=put), enregistre les faits des sous-ensembles qui viennent d'être collectés.
+  - Le cache d'un serveur est ignoré si son identité (C(ansible_machine_id) par exemple) a changé depuis l'enregistrement.
+  - À exécuter sur le contrôleur (C(delegate_to: localhost)).
+options:
+  dir:
+    description: Répertoire du cache sur le contrôleur (créé si nécessaire).
+    type: path
+    required: true
+  host:
+    description: Serveur concerné (C(inventory_hostname)).
+    type: str
+    required: true
+  state:
+    description: Lire (C(get)) ou enregistrer (C(put)) les faits du serveur.
+    type: str
+    choices: [get, put]
+    default: get
+  subsets:
+    description: Sous-ensembles demandés (C(state=get)).
+    type: list
+    elements: str
+    default: []
+  ttl:
+    description: Durée de validité en secondes de chaque sous-ensemble ; un sous-ensemble absent ou à 0 est toujours collecté et n'est pas enregistré.
+    type: dict
+    default: {}
+  refresh:
+    description: Ignorer le cache et collecter tous les sous-ensembles demandés (C(state=get)).
+    type: bool
+    default: false
+  identity:
+    description: Identité du serveur ; un cache enregistré sous une autre identité est ignoré puis remplacé.
+    type: str
+  facts:
+    description: Faits collectés par sous-ensemble (C(state=put)), par exemple les C(ansible_facts) de chaque élément de la boucle C(setup).
+    type: dict
+    default: {}
+  seconds:
+    description: Durée de collecte de chaque sous-ensemble (C(state=put)), mesurée par le plugin de callback C(cmdb_timing) ; à défaut, la durée précédente est conservée.
+    type: dict
+    default: {}
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Lire les faits valides du cache
+  cmdb_fact_cache:
+    dir: ~/.cmdb_inventory/facts
+    host: "{{ inventory_hostname }}"
+    subsets: [hardware, virtual, network]
+    ttl:
+      hardware: 604800
+      virtual: 604800
+    identity: "{{ ansible_machine_id | default('') }}"
+  delegate_to: localhost
+  register: fact_cache
+
+- name: Enregistrer les faits collectés
+  cmdb_fact_cache:
+    dir: ~/.cmdb_inventory/facts
+    host: "{{ inventory_hostname }}"
+    state: put
+    ttl:
+      hardware: 604800
+      virtual: 604800
+    identity: "{{ ansible_machine_id | default('') }}"
+    facts: "{{ facts_result.results | selectattr('ansible_facts', 'defined') | items2dict(key_name='item', value_name='ansible_facts') }}"
+  delegate_to: localhost
+'''
+
+RETURN = r'''
+ansible_facts:
+  description: Faits des sous-ensembles servis par le cache (C(state=get)).
+  returned: success
+  type: dict
+cached:
+  description: Sous-ensembles servis par le cache.
+  returned: state=get
+  type: list
+stale:
+  description: Sous-ensembles à collecter (absents, expirés, sans durée de validité ou C(refresh)).
+  returned: state=get
+  type: list
+saved_seconds:
+  description: Somme des durées de collecte enregistrées des sous-ensembles servis par le cache.
+  returned: state=get
+  type: float
+stored:
+  description: Sous-ensembles enregistrés (C(state=put)).
+  returned: state=put
+  type: list
+'''
+
+import json
+import os
+import re
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import write_atomic
+
+# Clés propres au module setup, sans rapport avec le serveur
+SETUP_KEYS = ('gather_subset', 'module_setup', 'discovered_interpreter_python')
+
+
+def host_file(directory, host):
+    return os.path.join(directory, '%s.json' % re.sub(r'[^A-Za-z0-9._-]', '_', host))
+
+
+def load(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            content = json.load(f)
+    except ValueError:
+        # Fichier corrompu : les faits seront collectés
+        return {}
+    return content if isinstance(content, dict) else {}
+
+
+def ttl_of(ttl, subset):
+    try:
+        return max(0, int(ttl.get(subset) or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def lookup(cache, subsets, ttl, refresh, identity, now):
+    """Répartit les sous-ensembles entre cache valide et collecte, retourne (faits, servis, à collecter, durée économisée)."""
+    entries = cache.get('subsets') or {}
+    if refresh or (identity and cache.get('identity') not in (None, identity)):
+        entries = {}
+    facts = {}
+    cached = []
+    stale = []
+    saved = 0.0
+    for subset in subsets:
+        entry = entries.get(subset)
+        limit = ttl_of(ttl, subset)
+        gathered = number(entry.get('gathered')) if entry else None
+        if not limit or gathered is None or now - gathered >= limit:
+            stale.append(subset)
+            continue
+        facts.update(entry.get('facts') or {})
+        cached.append(subset)
+        saved += number(entry.get('seconds')) or 0.0
+    return facts, cached, stale, round(saved, 3)
+
+
+def store(cache, facts, seconds, ttl, identity, now):
+    """Enregistre les sous-ensembles collectés dotés d'une durée de validité, retourne leur liste."""
+    entries = cache.get('subsets') or {}
+    if identity and cache.get('identity') not in (None, identity):
+        entries = {}
+    stored = []
+    for subset, subset_facts in sorted(facts.items()):
+        if not ttl_of(ttl, subset) or not isinstance(subset_facts, dict):
+            continue
+        previous = entries.get(subset) or {}
+        duration = number(seconds.get(subset))
+        entries[subset] = {
+            'gathered': int(now),
+            'seconds': duration if duration is not None else previous.get('seconds'),
+            'facts': dict((key, value) for key, value in subset_facts.items() if key not in SETUP_KEYS),
+        }
+        stored.append(subset)
+    # Les sous-ensembles dont la durée de validité a été retirée ne sont plus servis
+    for subset in list(entries):
+        if not ttl_of(ttl, subset):
+            del entries[subset]
+    cache['subsets'] = entries
+    if identity:
+        cache['identity'] = identity
+    return stored
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            dir=dict(type='path', required=True),
+            host=dict(type='str', required=True),
+            state=dict(type='str', default='get', choices=['get', 'put']),
+            subsets=dict(type='list', elements='str', default=[]),
+            ttl=dict(type='dict', default={}),
+            refresh=dict(type='bool', default=False),
+            identity=dict(type='str'),
+            facts=dict(type='dict', default={}),
+            seconds=dict(type='dict', default={}),
+        ),
+        supports_check_mode=True,
+    )
+
+    directory = module.params['dir']
+    path = host_file(directory, module.params['host'])
+    identity = module.params['identity'] or None
+    ttl = module.params['ttl']
+    now = time.time()
+    cache = load(path)
+
+    if module.params['state'] == 'get':
+        facts, cached, stale, saved = lookup(cache, module.params['subsets'], ttl,
+                                             module.params['refresh'], identity, now)
+        module.exit_json(changed=False, ansible_facts=facts, cached=cached, stale=stale,
+                         saved_seconds=saved)
+
+    stored = store(cache, module.params['facts'], module.params['seconds'], ttl, identity, now)
+    if stored and not module.check_mode:
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            write_atomic(path, json.dumps(cache, sort_keys=True), 0o600)
+        except (IOError, OSError) as e:
+            module.fail_json(msg="Impossible d'enregistrer le cache des faits %s : %s" % (path, e))
+    module.exit_json(changed=bool(stored), stored=stored)
+
+
+if __name__ == '__main__':
+    main()
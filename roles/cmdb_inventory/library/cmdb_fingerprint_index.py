@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_fingerprint_index
+short_description: Index des empreintes système utilisé par l'inventaire incrémental
+description:
+  - Maintient une table SQLite indexée par nom d'hôte contenant l'empreinte système (noyau, mémoire, CPU, disques, interfaces, adresse IPv4 par défaut...) du dernier rapport déposé dans le repository, ainsi que les dates du dernier inventaire et du dernier inventaire complet.
+  - Avec C(state=query), retourne en un seul appel les enregistrements des hôtes demandés ; la tâche d'inventaire incrémental n'a plus à relire l'ancien rapport complet de chaque hôte.
+  - Avec C(state=present), enregistre (upsert) les empreintes des hôtes dont le rapport vient d'être déposé.
+  - À exécuter sur le contrôleur (C(delegate_to: localhost), C(run_once: true)).
+options:
+  path:
+    description: Chemin de la base SQLite de l'index (créée si nécessaire).
+    type: path
+    required: true
+  state:
+    description: C(query) pour lire les enregistrements, C(present) pour les mettre à jour.
+    type: str
+    choices: [query, present]
+    default: query
+  hosts:
+    description: Noms des hôtes à lire (C(state=query)).
+    type: list
+    elements: str
+    default: []
+  records:
+    description:
+      - Enregistrements à mettre à jour (C(state=present)).
+      - Chaque enregistrement contient C(hostname), C(fingerprint) (dictionnaire) et C(full) (vrai si l'inventaire était complet).
+    type: list
+    elements: dict
+    default: []
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Lire les empreintes des hôtes de la play
+  cmdb_fingerprint_index:
+    path: ~/.cmdb_inventory/fingerprint_index.sqlite
+    hosts: "{{ ansible_play_hosts }}"
+  register: fingerprint_index
+  delegate_to: localhost
+  run_once: true
+
+- name: Enregistrer les empreintes des rapports déposés
+  cmdb_fingerprint_index:
+    path: ~/.cmdb_inventory/fingerprint_index.sqlite
+    state: present
+    records:
+      - hostname: web01
+        fingerprint: {kernel: 5.14.0-362.el9.x86_64, memory_mb: 7680}
+        full: true
+  delegate_to: localhost
+  run_once: true
+'''
+
+RETURN = r'''
+records:
+  description:
+    - Enregistrements indexés par nom d'hôte (C(state=query)) ; les hôtes inconnus de l'index sont absents.
+    - Chaque enregistrement contient C(fingerprint), C(last_run), C(last_full_run) et C(days_since_full).
+  returned: always
+  type: dict
+updated:
+  description: Nombre d'enregistrements mis à jour (C(state=present)).
+  returned: always
+  type: int
+'''
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from ansible.module_utils.basic import AnsibleModule
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Nombre maximum de paramètres d'une requête SQLite (limite historique de 999)
+QUERY_BATCH = 500
+
+
+def open_index(path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    db = sqlite3.connect(path, timeout=30)
+    db.execute("CREATE TABLE IF NOT EXISTS fingerprints ("
+               "hostname TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+               "last_run TEXT NOT NULL, last_full_run TEXT)")
+    return db
+
+
+def query(db, hosts, now):
+    records = {}
+    for start in range(0, len(hosts), QUERY_BATCH):
+        batch = hosts[start:start + QUERY_BATCH]
+        rows = db.execute(
+            "SELECT hostname, fingerprint, last_run, last_full_run FROM fingerprints "
+            "WHERE hostname IN (%s)" % ', '.join('?' * len(batch)), batch)
+        for hostname, fingerprint, last_run, last_full_run in rows:
+            days_since_full = None
+            if last_full_run:
+                days_since_full = (now - datetime.strptime(last_full_run, DATE_FORMAT)).days
+            records[hostname] = {
+                'fingerprint': json.loads(fingerprint),
+                'last_run': last_run,
+                'last_full_run': last_full_run,
+                'days_since_full': days_since_full,
+            }
+    return records
+
+
+def update(db, records, now):
+    timestamp = now.strftime(DATE_FORMAT)
+    with db:
+        # La date du dernier inventaire complet n'est remplacée que par un inventaire complet
+        db.executemany(
+            "INSERT INTO fingerprints (hostname, fingerprint, last_run, last_full_run) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(hostname) DO UPDATE SET fingerprint = excluded.fingerprint, "
+            "last_run = excluded.last_run, "
+            "last_full_run = COALESCE(excluded.last_full_run, fingerprints.last_full_run)",
+            [(record['hostname'], json.dumps(record.get('fingerprint') or {}, sort_keys=True),
+              timestamp, timestamp if record.get('full') else None)
+             for record in records])
+    return len(records)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            path=dict(type='path', required=True),
+            state=dict(type='str', choices=['query', 'present'], default='query'),
+            hosts=dict(type='list', elements='str', default=[]),
+            records=dict(type='list', elements='dict', default=[]),
+        ),
+        supports_check_mode=True,
+    )
+
+    state = module.params['state']
+    records = module.params['records']
+    for record in records:
+        if not record.get('hostname'):
+            module.fail_json(msg="Enregistrement sans hostname : %s" % record)
+
+    now = datetime.now()
+    if state == 'present' and (module.check_mode or not records):
+        module.exit_json(changed=bool(records), records={}, updated=0)
+    if state == 'query' and not os.path.exists(module.params['path']):
+        # Premier passage : aucun hôte n'est connu, tous seront inventoriés complètement
+        module.exit_json(changed=False, records={}, updated=0)
+
+    try:
+        db = open_index(module.params['path'])
+        try:
+            if state == 'query':
+                module.exit_json(changed=False, records=query(db, module.params['hosts'], now),
+                                 updated=0)
+            updated = update(db, records, now)
+        finally:
+            db.close()
+    except (OSError, sqlite3.Error) as e:
+        module.fail_json(msg="Index des empreintes %s inutilisable : %s" % (module.params['path'], e))
+
+    module.exit_json(changed=True, records={}, updated=updated)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_fleet_snapshot
+short_description: Consolide les rapports d'inventaire CMDB en un instantané columnaire du parc
+description:
+  - Lit tous les rapports d'inventaire JSON d'un répertoire du repository et écrit un unique fichier columnaire compressé.
+  - Les listes imbriquées (disques, interfaces réseau, certificats) sont normalisées dans des tables filles reliées à la table C(hosts) par le numéro de ligne du serveur.
+  - Chaque colonne est un bloc compressé indépendant ; un index placé en fin de fichier donne la position de chaque colonne, ce qui permet de lire le fichier par C(mmap) et de ne décompresser que les colonnes utiles.
+  - Le fichier est écrit sous un nom temporaire puis renommé, les lecteurs ne voient jamais un instantané partiel.
+  - Le script C(generate_excel.py) du rôle C(cmdb_report) sait lire ce format directement.
+options:
+  path:
+    description: Répertoire contenant les rapports d'inventaire.
+    type: path
+    required: true
+  dest:
+    description: Chemin du fichier instantané à produire.
+    type: path
+    required: true
+  patterns:
+    description: Motifs (glob) des fichiers à lire.
+    type: list
+    elements: str
+    default: ['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst']
+  compression_level:
+    description: Niveau de compression zlib des colonnes (1 à 9).
+    type: int
+    default: 6
+  force:
+    description: Reconstruire l'instantané même si aucun rapport n'est plus récent que lui.
+    type: bool
+    default: false
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Construire l'instantané du parc
+  cmdb_fleet_snapshot:
+    path: /opt/cmdb/inventory/reports
+    dest: /opt/cmdb/inventory/snapshot/fleet.cmdbsnap
+  run_once: true
+'''
+
+RETURN = r'''
+hosts:
+  description: Nombre de serveurs dans l'instantané.
+  returned: always
+  type: int
+tables:
+  description: Nombre de lignes de chaque table (hosts, disks, interfaces, certificates).
+  returned: always
+  type: dict
+size:
+  description: Taille du fichier produit en octets.
+  returned: always
+  type: int
+errors:
+  description: Fichiers ignorés car illisibles ou corrompus, avec le message d'erreur.
+  returned: always
+  type: list
+'''
+
+import fnmatch
+import gc
+import json
+import os
+import struct
+import time
+import zlib
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import read_report_content
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Format du fichier (little-endian) :
+#   MAGIC | bloc colonne 1 | ... | bloc colonne N | index | longueur de l'index (<Q) | MAGIC
+# Chaque bloc est un tableau JSON compressé par zlib (une valeur par ligne).
+# L'index (JSON compressé) décrit les tables : nombre de lignes et, pour chaque
+# colonne, son chemin dans le document (liste de clés), sa position, sa taille et
+# les plages de lignes [début, fin[ où la clé est absente (à distinguer de null).
+MAGIC = b'CMDBSNP1'
+FORMAT_VERSION = 1
+
+# Listes imbriquées normalisées en tables filles : nom de table -> chemin dans le document
+# Dans la table hosts, la colonne correspondante vaut [] et les éléments sont dans la
+# table fille, reliés au serveur par la colonne _host (numéro de ligne dans hosts)
+CHILD_TABLES = {
+    'disks': ('hardware', 'disks'),
+    'interfaces': ('network', 'interfaces'),
+    'certificates': ('security', 'certificates', 'details'),
+}
+
+# Profondeur maximale des colonnes de la table hosts : au-delà, la valeur est stockée
+# telle quelle. Évite une colonne par clé variable (partitions, paquets, etc.).
+# Les tables filles ont une colonne par clé de premier niveau de l'élément.
+HOST_DEPTH = 3
+
+
+def load_json(path):
+    content = read_report_content(path)
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content.decode('utf-8'))
+
+
+def dump_json(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def flatten(value, prefix, leaves, depth, children=None):
+    # Les dictionnaires non vides sont parcourus, tout le reste est une feuille
+    if isinstance(value, dict) and value and len(prefix) < depth:
+        for key, item in value.items():
+            path = prefix + (key,)
+            if children is not None and path in children and isinstance(item, list):
+                children[path] = item
+                leaves[path] = []
+            else:
+                flatten(item, path, leaves, depth, children)
+    else:
+        leaves[prefix] = value
+
+
+class Table(object):
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = {}
+        self.missing = {}
+
+    def skip(self, path, row):
+        ranges = self.missing.setdefault(path, [])
+        if ranges and ranges[-1][1] == row:
+            ranges[-1][1] = row + 1
+        else:
+            ranges.append([row, row + 1])
+
+    def append(self, leaves):
+        for path, value in leaves.items():
+            column = self.columns.get(path)
+            if column is None:
+                # Colonne apparue en cours de route : absente des lignes précédentes
+                column = self.columns[path] = [None] * self.rows
+                if self.rows:
+                    self.missing[path] = [[0, self.rows]]
+            column.append(value)
+        self.rows += 1
+        if len(leaves) < len(self.columns):
+            for path, column in self.columns.items():
+                if len(column) < self.rows:
+                    column.append(None)
+                    self.skip(path, self.rows - 1)
+
+
+def build_tables(files, errors):
+    hosts = Table()
+    child_tables = dict((name, Table()) for name in CHILD_TABLES)
+    child_names = dict((path, name) for name, path in CHILD_TABLES.items())
+
+    for report in files:
+        try:
+            doc = load_json(report)
+        except Exception as e:
+            errors.append({'file': os.path.basename(report), 'msg': str(e)})
+            continue
+        if not isinstance(doc, dict) or not doc:
+            errors.append({'file': os.path.basename(report), 'msg': 'document JSON inattendu'})
+            continue
+
+        leaves = {}
+        children = dict((path, None) for path in child_names)
+        flatten(doc, (), leaves, HOST_DEPTH, children)
+        host_row = hosts.rows
+        hosts.append(leaves)
+        for path, items in children.items():
+            for item in items or []:
+                row = {('_host',): host_row}
+                if isinstance(item, dict):
+                    # Une colonne par clé de premier niveau de l'élément
+                    row.update(((key,), value) for key, value in item.items())
+                else:
+                    row[('_value',)] = item
+                child_tables[child_names[path]].append(row)
+
+    tables = {'hosts': hosts}
+    tables.update(child_tables)
+    return tables
+
+
+def write_snapshot(dest, tables, sources, level):
+    index = {
+        'version': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'sources': sources,
+        'child_tables': dict((name, list(path)) for name, path in CHILD_TABLES.items()),
+        'tables': {},
+    }
+    tmp = dest + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        for name, table in tables.items():
+            columns = []
+            for path, values in table.columns.items():
+                block = zlib.compress(dump_json(values), level)
+                columns.append({'path': list(path), 'offset': f.tell(), 'length': len(block),
+                                'missing': table.missing.get(path, [])})
+                f.write(block)
+            index['tables'][name] = {'rows': table.rows, 'columns': columns}
+        footer = zlib.compress(json.dumps(index, ensure_ascii=False).encode('utf-8'), level)
+        f.write(footer)
+        f.write(struct.pack('<Q', len(footer)))
+        f.write(MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, dest)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            path=dict(type='path', required=True),
+            dest=dict(type='path', required=True),
+            patterns=dict(type='list', elements='str',
+                          default=['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz',
+                                   '*_cmdb_inventory.json.zst']),
+            compression_level=dict(type='int', default=6),
+            force=dict(type='bool', default=False),
+        ),
+        supports_check_mode=True,
+    )
+
+    path = module.params['path']
+    dest = module.params['dest']
+    if not os.path.isdir(path):
+        module.fail_json(msg="Le répertoire %s n'existe pas" % path)
+
+    files = sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if any(fnmatch.fnmatch(name, pattern) for pattern in module.params['patterns'])
+        and os.path.isfile(os.path.join(path, name))
+    )
+
+    # Instantané à jour : aucun rapport ajouté, supprimé ou modifié depuis sa construction
+    if os.path.exists(dest) and not module.params['force']:
+        snapshot_mtime = os.path.getmtime(dest)
+        if all(os.path.getmtime(report) <= snapshot_mtime for report in files) and \
+                os.path.getmtime(path) <= snapshot_mtime:
+            module.exit_json(changed=False, hosts=None, tables={}, size=os.path.getsize(dest),
+                             errors=[], msg="Instantané à jour")
+
+    if module.check_mode:
+        module.exit_json(changed=True, hosts=len(files), tables={}, size=0, errors=[])
+
+    errors = []
+    # Documents et colonnes sont acycliques : le ramasse-miettes cyclique est suspendu
+    gc.disable()
+    try:
+        tables = build_tables(files, errors)
+    finally:
+        gc.enable()
+    skipped = set(error['file'] for error in errors)
+    sources = [os.path.basename(report) for report in files
+               if os.path.basename(report) not in skipped]
+
+    dest_dir = os.path.dirname(dest)
+    if dest_dir and not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+    try:
+        write_snapshot(dest, tables, sources, module.params['compression_level'])
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Impossible d'écrire l'instantané %s: %s" % (dest, e))
+
+    for error in errors:
+        module.warn("Fichier ignoré %s: %s" % (error['file'], error['msg']))
+
+    module.exit_json(changed=True, hosts=tables['hosts'].rows,
+                     tables=dict((name, table.rows) for name, table in tables.items()),
+                     size=os.path.getsize(dest), errors=errors)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_history
+short_description: Historique des rapports d'inventaire codé par différences
+description:
+  - Avec C(state=record), enregistre dans une base SQLite chaque nouveau rapport du repository sous forme de différence structurelle avec la version précédente du même serveur (clés ajoutées, modifiées ou supprimées, portions de listes remplacées).
+  - Une version complète (keyframe) est enregistrée tous les C(keyframe_interval) changements, ou lorsque la différence est plus volumineuse que la moitié du rapport ; une reconstruction applique donc au plus C(keyframe_interval) différences.
+  - Un rapport identique au précédent (hors chemins C(ignore)) ne crée pas de version, seule la date de dernière observation est mise à jour. Seuls les rapports modifiés depuis le dernier appel (date et taille) sont lus.
+  - Un serveur dont le rapport disparaît du repository reçoit une version C(gone).
+  - Avec C(state=show), reconstruit un serveur (C(host)) ou tout le parc à une date (C(date)), dans le résultat ou dans des fichiers (C(dest)).
+  - Avec C(state=changes), liste les versions enregistrées depuis une date, avec les chemins modifiés par chacune.
+options:
+  db:
+    description: Base SQLite de l'historique (créée si nécessaire).
+    type: path
+    required: true
+  state:
+    description: C(record) pour enregistrer les rapports, C(show) pour reconstruire, C(changes) pour lister les changements.
+    type: str
+    choices: [record, show, changes]
+    default: record
+  path:
+    description: Répertoire des rapports d'inventaire (C(state=record)).
+    type: path
+  patterns:
+    description: Motifs (glob) des rapports à lire.
+    type: list
+    elements: str
+    default: ['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst']
+  keyframe_interval:
+    description: Nombre maximal de différences entre deux versions complètes d'un serveur.
+    type: int
+    default: 30
+  ignore:
+    description:
+      - Chemins (séparés par des points, C(*) pour tout élément d'une liste ou toute clé) non historisés car modifiés à chaque collecte.
+      - Ils sont retirés des versions enregistrées.
+    type: list
+    elements: str
+    default: ['inventory_id', 'collection_date', 'collection', 'security.updates_check', 'security.certificates.details.*.days_to_expiry']
+  host:
+    description: Serveur à reconstruire ou dont les changements sont listés (C(state=show), C(state=changes)).
+    type: str
+  date:
+    description:
+      - Date ISO 8601 (C(AAAA-MM-JJ) ou C(AAAA-MM-JJTHH:MM:SSZ), UTC).
+      - Avec C(state=show), date de reconstruction (dernière version, par défaut ; une date sans heure désigne la fin de la journée).
+      - Avec C(state=changes), date à partir de laquelle les versions sont listées (obligatoire).
+    type: str
+  dest:
+    description: Répertoire où écrire les rapports reconstruits (C(<hostname>_cmdb_inventory.json)), obligatoire pour reconstruire tout le parc.
+    type: path
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Historiser les rapports déposés
+  cmdb_history:
+    db: /opt/cmdb/inventory/history/history.sqlite
+    path: /opt/cmdb/inventory/reports
+  delegate_to: "{{ cmdb_inventory_repository_host }}"
+  run_once: true
+
+- name: État d'un serveur au 1er mars
+  cmdb_history:
+    db: /opt/cmdb/inventory/history/history.sqlite
+    state: show
+    host: srv-web-01
+    date: "2025-03-01"
+  register: srv_web_01
+
+- name: Parc complet au 1er mars, lisible par le rôle cmdb_report
+  cmdb_history:
+    db: /opt/cmdb/inventory/history/history.sqlite
+    state: show
+    date: "2025-03-01"
+    dest: /tmp/cmdb_fleet_20250301
+
+- name: Changements depuis le 1er mars
+  cmdb_history:
+    db: /opt/cmdb/inventory/history/history.sqlite
+    state: changes
+    date: "2025-03-01"
+  register: fleet_changes
+'''
+
+RETURN = r'''
+recorded:
+  description: Serveurs pour lesquels une version a été enregistrée (C(state=record)).
+  returned: always
+  type: list
+unchanged:
+  description: Nombre de rapports relus identiques à la version précédente (C(state=record)).
+  returned: always
+  type: int
+removed:
+  description: Serveurs dont le rapport a disparu du repository (C(state=record)).
+  returned: always
+  type: list
+stored_bytes:
+  description: Taille compressée des versions enregistrées lors de cet appel (C(state=record)).
+  returned: always
+  type: int
+hosts:
+  description: Rapports reconstruits par nom de serveur (C(state=show) sans C(dest)).
+  returned: always
+  type: dict
+written:
+  description: Nombre de rapports écrits dans C(dest) (C(state=show)).
+  returned: always
+  type: int
+changes:
+  description: Versions enregistrées depuis C(date) par serveur, chacune avec sa date (C(date)), son type (C(key), C(diff), C(gone)) et les chemins modifiés (C(paths)) (C(state=changes)).
+  returned: always
+  type: dict
+errors:
+  description: Rapports ignorés car illisibles, avec le message d'erreur.
+  returned: always
+  type: list
+'''
+
+import copy
+import difflib
+import fnmatch
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import HASH_IGNORE, read_report, strip_paths
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS hosts (hostname TEXT PRIMARY KEY, report TEXT, mtime_ns INTEGER, "
+    "size INTEGER, last_seq INTEGER, last_keyframe INTEGER, first_seen TEXT, last_seen TEXT, "
+    "removed INTEGER DEFAULT 0, head BLOB)",
+    # kind : key (rapport complet), diff (opérations depuis la version précédente), gone
+    "CREATE TABLE IF NOT EXISTS versions (hostname TEXT, seq INTEGER, recorded TEXT, kind TEXT, "
+    "paths TEXT, data BLOB, PRIMARY KEY (hostname, seq))",
+    "CREATE INDEX IF NOT EXISTS versions_recorded ON versions (recorded)",
+)
+
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Nombre maximal de chemins modifiés conservés par version (résumé de C(state=changes))
+MAX_PATHS = 50
+
+
+def pack(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def diff(old, new, path, ops):
+    """Ajoute à ops les opérations transformant old en new.
+
+    ['s', chemin, valeur] remplace ou ajoute une valeur, ['d', chemin] supprime une clé,
+    ['l', chemin, début, fin, éléments] remplace une portion de liste. Les opérations
+    sur une liste sont émises de la fin vers le début : les indices restent valides.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(old):
+            if key not in new:
+                ops.append(['d', path + [key]])
+        for key in sorted(new):
+            if key not in old:
+                ops.append(['s', path + [key], new[key]])
+            elif old[key] != new[key]:
+                diff(old[key], new[key], path + [key], ops)
+    elif isinstance(old, list) and isinstance(new, list):
+        # Portions de même taille comparées élément par élément, les autres remplacées
+        matcher = difflib.SequenceMatcher(
+            None, [json.dumps(item, sort_keys=True) for item in old],
+            [json.dumps(item, sort_keys=True) for item in new], autojunk=False)
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                continue
+            if tag == 'replace' and i2 - i1 == j2 - j1:
+                for offset in range(i2 - i1 - 1, -1, -1):
+                    diff(old[i1 + offset], new[j1 + offset], path + [i1 + offset], ops)
+            else:
+                ops.append(['l', path, i1, i2, new[j1:j2]])
+    elif old != new:
+        ops.append(['s', path, new])
+
+
+def patch(document, ops):
+    for op in ops:
+        path = op[1]
+        if op[0] == 's' and not path:
+            document = copy.deepcopy(op[2])
+            continue
+        parent = document
+        for key in path[:-1] if op[0] != 'l' else path:
+            parent = parent[key]
+        if op[0] == 's':
+            parent[path[-1]] = copy.deepcopy(op[2])
+        elif op[0] == 'd':
+            del parent[path[-1]]
+        else:
+            parent[op[2]:op[3]] = copy.deepcopy(op[4])
+    return document
+
+
+def changed_paths(ops):
+    paths = []
+    for op in ops:
+        dotted = '.'.join(str(key) for key in op[1]) or '.'
+        if dotted not in paths:
+            paths.append(dotted)
+    return paths[:MAX_PATHS]
+
+
+def normalize_date(value, end_of_day=False):
+    if not value:
+        return None
+    value = value.strip().replace(' ', 'T')
+    if len(value) == 10:
+        return value + ('T23:59:59Z' if end_of_day else 'T00:00:00Z')
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value if value.endswith('Z') else value + 'Z'
+
+
+def open_db(path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, 0o755)
+    db = sqlite3.connect(path, timeout=30)
+    for statement in SCHEMA:
+        db.execute(statement)
+    return db
+
+
+def record(module, db):
+    path = module.params['path']
+    if not path or not os.path.isdir(path):
+        module.fail_json(msg="Le répertoire des rapports %s n'existe pas" % path)
+    files = sorted(name for name in os.listdir(path)
+                   if any(fnmatch.fnmatch(name, pattern) for pattern in module.params['patterns']))
+    known = dict((row[0], row[1:]) for row in db.execute(
+        "SELECT hostname, report, mtime_ns, size, last_seq, last_keyframe, removed FROM hosts"))
+    by_report = dict((entry[0], hostname) for hostname, entry in known.items() if not entry[5])
+    ignore = [pattern.split('.') for pattern in module.params['ignore']]
+    interval = max(1, module.params['keyframe_interval'])
+    now = time.strftime(ISO_FORMAT, time.gmtime())
+
+    recorded = []
+    seen = set()
+    errors = []
+    unchanged = 0
+    stored = 0
+    for name in files:
+        report_path = os.path.join(path, name)
+        stat = os.stat(report_path)
+        mtime_ns = int(stat.st_mtime * 1e9) if not hasattr(stat, 'st_mtime_ns') else stat.st_mtime_ns
+        hostname = by_report.get(name)
+        if hostname and known[hostname][1:3] == (mtime_ns, stat.st_size):
+            seen.add(hostname)
+            continue
+        try:
+            report = read_report(report_path)
+            if not isinstance(report, dict):
+                raise ValueError("document d'inventaire invalide")
+        except (IOError, OSError, ValueError) as e:
+            errors.append({'file': name, 'msg': str(e)})
+            if hostname:
+                seen.add(hostname)
+            continue
+        hostname = report.get('hostname') or name.split('_cmdb_inventory')[0]
+        seen.add(hostname)
+        date = normalize_date(report.get('collection_date')) or time.strftime(ISO_FORMAT, time.gmtime(stat.st_mtime))
+        for parts in ignore:
+            strip_paths(report, parts)
+
+        entry = known.get(hostname)
+        if entry is None:
+            db.execute("INSERT INTO hosts VALUES (?, ?, ?, ?, 0, 0, ?, ?, 0, NULL)",
+                       (hostname, name, mtime_ns, stat.st_size, date, date))
+            entry = (name, mtime_ns, stat.st_size, 0, 0, 0)
+        head = db.execute("SELECT head FROM hosts WHERE hostname = ?", (hostname,)).fetchone()[0]
+        previous = unpack(head) if head and not entry[5] else None
+
+        ops = []
+        if previous is not None:
+            diff(previous, report, [], ops)
+            if not ops:
+                unchanged += 1
+                db.execute("UPDATE hosts SET report = ?, mtime_ns = ?, size = ?, last_seen = ? "
+                           "WHERE hostname = ?", (name, mtime_ns, stat.st_size, date, hostname))
+                continue
+
+        full = pack(report)
+        seq = entry[3] + 1
+        data = pack(ops) if ops else None
+        # Version complète : premier rapport, retour après disparition, intervalle atteint
+        # ou différence plus volumineuse que la moitié du rapport
+        if data is None or seq - entry[4] >= interval or len(data) > len(full) // 2:
+            kind, data, keyframe = 'key', full, seq
+        else:
+            kind, keyframe = 'diff', entry[4]
+        db.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?)",
+                   (hostname, seq, date, kind, json.dumps(changed_paths(ops) if ops else ['.']),
+                    sqlite3.Binary(data)))
+        db.execute("UPDATE hosts SET report = ?, mtime_ns = ?, size = ?, last_seq = ?, last_keyframe = ?, "
+                   "last_seen = ?, removed = 0, head = ? WHERE hostname = ?",
+                   (name, mtime_ns, stat.st_size, seq, keyframe, date, sqlite3.Binary(full), hostname))
+        stored += len(data)
+        recorded.append(hostname)
+
+    removed = sorted(hostname for hostname, entry in known.items() if not entry[5] and hostname not in seen)
+    for hostname in removed:
+        seq = known[hostname][3] + 1
+        db.execute("INSERT INTO versions VALUES (?, ?, ?, 'gone', '[]', NULL)", (hostname, seq, now))
+        db.execute("UPDATE hosts SET last_seq = ?, removed = 1, head = NULL WHERE hostname = ?",
+                   (seq, hostname))
+
+    if module.check_mode:
+        db.rollback()
+    else:
+        db.commit()
+    return sorted(recorded), unchanged, removed, stored, errors
+
+
+def reconstruct(db, hostname, date):
+    """Rapport d'un serveur à une date (None s'il n'existait pas ou avait disparu)."""
+    if date:
+        row = db.execute("SELECT MAX(seq) FROM versions WHERE hostname = ? AND recorded <= ?",
+                         (hostname, date)).fetchone()
+    else:
+        row = db.execute("SELECT MAX(seq) FROM versions WHERE hostname = ?", (hostname,)).fetchone()
+    target = row[0]
+    if target is None:
+        return None
+    keyframe = db.execute("SELECT MAX(seq) FROM versions WHERE hostname = ? AND seq <= ? AND kind != 'diff'",
+                          (hostname, target)).fetchone()[0]
+    document = None
+    for kind, data in db.execute("SELECT kind, data FROM versions WHERE hostname = ? AND seq BETWEEN ? AND ? "
+                                 "ORDER BY seq", (hostname, keyframe, target)):
+        if kind == 'gone':
+            document = None
+        elif kind == 'key':
+            document = unpack(data)
+        else:
+            document = patch(document, unpack(data))
+    return document
+
+
+def show(module, db):
+    host = module.params['host']
+    dest = module.params['dest']
+    if not host and not dest:
+        module.fail_json(msg="L'option dest est obligatoire pour reconstruire tout le parc")
+    date = normalize_date(module.params['date'], end_of_day=True)
+    hostnames = [host] if host else [row[0] for row in db.execute("SELECT hostname FROM hosts ORDER BY hostname")]
+    hosts = {}
+    written = 0
+    if dest and not os.path.isdir(dest) and not module.check_mode:
+        os.makedirs(dest, 0o755)
+    for hostname in hostnames:
+        document = reconstruct(db, hostname, date)
+        if document is None:
+            continue
+        if dest:
+            if not module.check_mode:
+                with open(os.path.join(dest, '%s_cmdb_inventory.json' % hostname), 'w') as f:
+                    json.dump(document, f, indent=2, sort_keys=True)
+            written += 1
+        else:
+            hosts[hostname] = document
+    return hosts, written
+
+
+def changes(module, db):
+    since = normalize_date(module.params['date'])
+    if not since:
+        module.fail_json(msg="L'option date est obligatoire avec state=changes")
+    sql = "SELECT hostname, recorded, kind, paths FROM versions WHERE recorded >= ?"
+    params = [since]
+    if module.params['host']:
+        sql += " AND hostname = ?"
+        params.append(module.params['host'])
+    result = {}
+    for hostname, recorded, kind, paths in db.execute(sql + " ORDER BY hostname, seq", params):
+        result.setdefault(hostname, []).append({'date': recorded, 'kind': kind, 'paths': json.loads(paths)})
+    return result
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            db=dict(type='path', required=True),
+            state=dict(type='str', choices=['record', 'show', 'changes'], default='record'),
+            path=dict(type='path'),
+            patterns=dict(type='list', elements='str',
+                          default=['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz',
+                                   '*_cmdb_inventory.json.zst']),
+            keyframe_interval=dict(type='int', default=30),
+            ignore=dict(type='list', elements='str', default=list(HASH_IGNORE)),
+            host=dict(type='str'),
+            date=dict(type='str'),
+            dest=dict(type='path'),
+        ),
+        supports_check_mode=True,
+    )
+
+    state = module.params['state']
+    result = dict(changed=False, recorded=[], unchanged=0, removed=[], stored_bytes=0,
+                  hosts={}, written=0, changes={}, errors=[])
+    if state != 'record' and not os.path.exists(module.params['db']):
+        module.exit_json(**result)
+
+    try:
+        db = open_db(module.params['db'])
+        try:
+            if state == 'record':
+                recorded, unchanged, removed, stored, errors = record(module, db)
+                result.update(changed=bool(recorded or removed), recorded=recorded, unchanged=unchanged,
+                              removed=removed, stored_bytes=stored, errors=errors)
+            elif state == 'show':
+                hosts, written = show(module, db)
+                result.update(changed=bool(written), hosts=hosts, written=written)
+            else:
+                result['changes'] = changes(module, db)
+        finally:
+            db.close()
+    except (IOError, OSError, sqlite3.Error) as e:
+        module.fail_json(msg="Historique des inventaires %s inutilisable : %s" % (module.params['db'], e))
+
+    for error in result['errors']:
+        module.warn("Rapport ignoré %s : %s" % (error['file'], error['msg']))
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
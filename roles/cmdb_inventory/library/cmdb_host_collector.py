@@ -0,0 +1,486 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_host_collector
+short_description: Collecte en une seule exécution les informations logicielles et de sécurité d'un serveur
+description:
+  - Remplace les nombreuses tâches C(shell)/C(command) des collectes C(software) et C(security) (recherche des bases de données et des agents de sauvegarde, comptage des utilisateurs, listes des paquets et des services, mises à jour disponibles).
+  - Une seule exécution distante par serveur au lieu d'un aller-retour SSH et d'un transfert de module par commande.
+  - Retourne des structures de même forme que les clés correspondantes de C(software_info) et C(security_info).
+options:
+  sections:
+    description:
+      - Sections à collecter.
+      - C(updates) ne compte que les mises à jour disponibles, pour exécuter cette interrogation du gestionnaire de paquets (la plus longue) dans un job séparé.
+    type: list
+    elements: str
+    choices: [software, security, updates]
+    default: [software, security]
+  os_family:
+    description: Famille du système (fait C(ansible_os_family)).
+    type: str
+    required: true
+  distribution_major_version:
+    description: Version majeure de la distribution (fait C(ansible_distribution_major_version)).
+    type: str
+    default: '0'
+  pkg_manager:
+    description: Gestionnaire de paquets (fait C(ansible_pkg_mgr)).
+    type: str
+    default: unknown
+  service_manager:
+    description: Gestionnaire de services (fait C(ansible_service_mgr)).
+    type: str
+    default: unknown
+  check_updates:
+    description: Interroger le gestionnaire de paquets pour compter les mises à jour disponibles.
+    type: bool
+    default: true
+  package_details:
+    description:
+      - Retourner la liste détaillée des paquets installés (C(software.packages.installed), couples nom et version) en plus de leur nombre.
+      - La liste est indexée puis retirée des rapports du repository par le module C(cmdb_package_inventory).
+    type: bool
+    default: false
+  update_check:
+    description:
+      - Mode de comptage des mises à jour disponibles.
+      - C(refresh) interroge le gestionnaire de paquets, qui rafraîchit les métadonnées des dépôts si nécessaire (C(dnf), C(yum) et C(zypper)).
+      - C(cache) réutilise les métadonnées déjà présentes sur le serveur (C(-C), C(--no-refresh)) si elles ont moins de C(cache_max_age) secondes, sinon se comporte comme C(refresh).
+      - C(known) compare les paquets installés aux dernières versions disponibles dans le jeu de dépôts du serveur (C(known_updates)), sans interroger les dépôts ; sans liste récente, se comporte comme C(cache) et retourne C(known_updates_record).
+      - C(apt list --upgradable) ne rafraîchit jamais les métadonnées ; sous Debian, C(refresh) et C(cache) sont équivalents.
+    type: str
+    choices: [refresh, cache, known]
+    default: refresh
+  cache_max_age:
+    description: Âge maximal (en secondes) des métadonnées des dépôts réutilisées en mode C(cache) ou C(known).
+    type: int
+    default: 86400
+  known_updates:
+    description:
+      - Paquets disponibles par jeu de dépôts (C(repo_set)) pour la distribution et la version du serveur, chaque entrée contenant C(generated) (horodatage epoch) et C(available) (nom du paquet et dernière version disponible).
+      - Produites par le module C(cmdb_known_updates) à partir des résultats C(known_updates_record).
+    type: dict
+    default: {}
+  known_max_age:
+    description: Âge maximal (en secondes) d'une entrée de C(known_updates) utilisable en mode C(known).
+    type: int
+    default: 86400
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Collecter les informations logicielles et de sécurité
+  cmdb_host_collector:
+    sections: [software, security]
+    os_family: "{{ ansible_os_family }}"
+    distribution_major_version: "{{ ansible_distribution_major_version }}"
+    pkg_manager: "{{ ansible_pkg_mgr }}"
+    service_manager: "{{ ansible_service_mgr }}"
+  register: host_collector
+
+- name: Compter les mises à jour à partir de la liste connue pour le jeu de dépôts
+  cmdb_host_collector:
+    sections: [updates]
+    os_family: "{{ ansible_os_family }}"
+    distribution_major_version: "{{ ansible_distribution_major_version }}"
+    update_check: known
+    known_updates: "{{ lookup('file', '/home/ansible/.cmdb_inventory/known_updates/RedHat_8.json') | from_json }}"
+  register: updates_check
+'''
+
+RETURN = r'''
+software:
+  description:
+    - Clés C(packages), C(services) et C(databases) de C(software_info).
+    - Avec C(package_details), C(packages.detailed) est vrai et C(packages.installed) contient les couples [nom, version] triés.
+  returned: si la section software est demandée
+  type: dict
+security:
+  description:
+    - Clés C(updates_available), C(users) et C(backup) de C(security_info).
+    - Clé C(updates_check) si les mises à jour sont comptées (voir C(updates)).
+  returned: si la section security est demandée
+  type: dict
+updates:
+  description:
+    - Clé C(updates_available) de C(security_info).
+    - Clé C(updates_check) décrivant le comptage (C(mode), C(source) parmi C(refresh), C(cache) et C(known), C(metadata_age) en secondes, C(repo_set)).
+  returned: si la section updates est demandée
+  type: dict
+known_updates_record:
+  description:
+    - Dernière version disponible de chaque paquet du jeu de dépôts du serveur (C(repo_set), C(generated), C(available)), à enregistrer par C(cmdb_known_updates) pour les serveurs de même distribution.
+    - Lue avec C(apt-cache dumpavail) (version candidate), C(dnf repoquery --latest-limit 1) ou C(repoquery) (yum-utils) ; non retournée sous SUSE.
+    - Les versions sont celles des listes des paquets installés (sans epoch pour les paquets RPM).
+  returned: en mode C(known), si aucune liste récente n'a été fournie et que la liste des paquets disponibles a pu être lue
+  type: dict
+'''
+
+import glob
+import hashlib
+import os
+import platform
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+
+# Commandes de liste des paquets par famille de système
+PACKAGE_COMMANDS = {
+    'Debian': ['dpkg-query', '-W', '-f=${Package} ${Version}\n'],
+    'RedHat': ['rpm', '-qa', '--qf', '%{name} %{version}-%{release}\n'],
+    'Suse': ['rpm', '-qa', '--qf', '%{name} %{version}-%{release}\n'],
+}
+
+# Bases de données détectées : (type, exécutable)
+DATABASES = [
+    ('mysql', 'mysqld'),
+    ('postgresql', 'postgres'),
+]
+
+# Agents de sauvegarde détectés : (nom, exécutable)
+BACKUP_AGENTS = [
+    ('BackupPC', 'backuppc'),
+    ('Bacula', 'bacula-fd'),
+    ('Amanda', 'amandad'),
+]
+
+# Configuration des dépôts par famille de système, dont le contenu définit le jeu de dépôts
+REPO_FILES = {
+    'Debian': ['/etc/apt/sources.list', '/etc/apt/sources.list.d/*.list', '/etc/apt/sources.list.d/*.sources'],
+    'RedHat': ['/etc/yum.repos.d/*.repo'],
+    'Suse': ['/etc/zypp/repos.d/*.repo'],
+}
+
+# Métadonnées des dépôts en cache ; la plus ancienne détermine l'âge du cache
+METADATA_CACHE = {
+    'Debian': ['/var/lib/apt/lists/*Release'],
+    'RedHat': ['/var/cache/dnf/*/repodata/repomd.xml', '/var/cache/yum/*/*/*/repomd.xml'],
+    'Suse': ['/var/cache/zypp/raw/*/repodata/repomd.xml'],
+}
+
+# Comparés au nom du shell : /sbin/nologin, /usr/sbin/nologin, /bin/false, /usr/bin/false
+NOLOGIN_SHELLS = ('nologin', 'false')
+SUDO_GROUPS = ('sudo', 'wheel')
+
+
+def run_lines(module, command):
+    executable = module.get_bin_path(command[0])
+    if executable is None:
+        return None
+    rc, out, err = module.run_command([executable] + command[1:])
+    if rc != 0:
+        return None
+    return out.splitlines()
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def collect_packages(module):
+    command = PACKAGE_COMMANDS.get(module.params['os_family'])
+    lines = run_lines(module, command) if command else None
+    if lines is None:
+        return None
+    packages = {
+        'manager': module.params['pkg_manager'],
+        'count': len(lines),
+        'detailed': module.params['package_details'],
+    }
+    if module.params['package_details']:
+        packages['installed'] = sorted(line.split(' ', 1) for line in lines if ' ' in line)
+    return packages
+
+
+def collect_services(module):
+    if module.params['service_manager'] == 'systemd':
+        lines = run_lines(module, ['systemctl', 'list-units', '--type=service', '--state=running',
+                                   '--no-legend', '--plain'])
+        if lines is None:
+            return None
+        running = []
+        for line in lines:
+            fields = line.split()
+            if fields:
+                name = fields[0]
+                running.append(name[:-len('.service')] if name.endswith('.service') else name)
+    else:
+        executable = module.get_bin_path('service')
+        if executable is None:
+            return None
+        rc, out, err = module.run_command([executable, '--status-all'])
+        # Même lecture que « service --status-all 2>&1 | grep '[ + ]' »
+        running = [line.split()[3] for line in (out + err).splitlines()
+                   if '[ + ]' in line and len(line.split()) > 3]
+    return {
+        'manager': module.params['service_manager'],
+        'running': running,
+    }
+
+
+def collect_databases(module):
+    databases = []
+    for db_type, binary in DATABASES:
+        executable = module.get_bin_path(binary)
+        if executable is None:
+            continue
+        rc, out, err = module.run_command([executable, '--version'])
+        if rc == 0:
+            databases.append({'type': db_type, 'version': (out.splitlines() or [''])[0]})
+    return databases
+
+
+def rpm_version(version):
+    # dnf, yum et zypper affichent l'epoch, absente de la liste des paquets installés
+    return version.split(':', 1)[-1]
+
+
+def list_updates(module, cached):
+    """Mises à jour disponibles (nom, version), None si le gestionnaire de paquets échoue."""
+    os_family = module.params['os_family']
+    if os_family == 'Debian':
+        lines = run_lines(module, ['apt', 'list', '--upgradable'])
+        if lines is None:
+            return None
+        updates = []
+        for line in lines:
+            fields = line.split()
+            if len(fields) > 1 and '/' in fields[0]:
+                updates.append((fields[0].split('/', 1)[0], fields[1]))
+        return updates
+    if os_family == 'RedHat':
+        manager = 'dnf' if int(module.params['distribution_major_version'] or 0) >= 8 else 'yum'
+        executable = module.get_bin_path(manager)
+        if executable is None:
+            return None
+        # check-update retourne 100 lorsque des mises à jour sont disponibles
+        rc, out, err = module.run_command([executable, 'check-update', '--quiet'] + (['-C'] if cached else []))
+        if rc not in (0, 100):
+            return None
+        updates = []
+        pending = []
+        for line in out.splitlines():
+            if line.startswith('Obsoleting'):
+                break
+            # Un nom de paquet trop long est affiché seul sur sa ligne
+            fields = pending + line.split()
+            if len(fields) < 3:
+                pending = fields
+                continue
+            pending = []
+            updates.append((fields[0].rsplit('.', 1)[0], rpm_version(fields[1])))
+        return updates
+    if os_family == 'Suse':
+        lines = run_lines(module, ['zypper', '--non-interactive'] + (['--no-refresh'] if cached else [])
+                          + ['list-updates'])
+        if lines is None:
+            return None
+        updates = []
+        for line in lines:
+            columns = [column.strip() for column in line.split('|')]
+            if len(columns) > 4 and columns[0] == 'v':
+                updates.append((columns[2], rpm_version(columns[4])))
+        return updates
+    return None
+
+
+def list_available(module):
+    """Dernière version disponible de chaque paquet des dépôts, None si la liste est indisponible.
+
+    Lue dans les métadonnées déjà présentes sur le serveur (juste après list_updates).
+    """
+    os_family = module.params['os_family']
+    available = {}
+    if os_family == 'Debian':
+        # Version candidate de chaque paquet
+        lines = run_lines(module, ['apt-cache', 'dumpavail'])
+        if lines is None:
+            return None
+        name = None
+        for line in lines:
+            if line.startswith('Package: '):
+                name = line[len('Package: '):].strip()
+            elif line.startswith('Version: ') and name:
+                available.setdefault(name, line[len('Version: '):].strip())
+                name = None
+        return available
+    if os_family == 'RedHat':
+        if int(module.params['distribution_major_version'] or 0) >= 8:
+            command = ['dnf', 'repoquery', '--quiet', '-C', '--available', '--latest-limit', '1']
+        else:
+            # repoquery du paquet yum-utils
+            command = ['repoquery', '--quiet', '-C', '-a']
+        lines = run_lines(module, command + ['--qf', '%{name} %{arch} %{version}-%{release}\n'])
+        if lines is None:
+            return None
+        # Paquets de l'architecture du serveur, dernière version par nom et architecture
+        arches = (platform.machine(), 'noarch')
+        for line in lines:
+            fields = line.split()
+            if len(fields) == 3 and fields[1] in arches:
+                available[fields[0]] = fields[2]
+        return available
+    # zypper ne donne pas la dernière version de chaque paquet sans comparer les versions RPM
+    return None
+
+
+def metadata_age(os_family):
+    paths = [path for pattern in METADATA_CACHE.get(os_family, []) for path in glob.glob(pattern)]
+    try:
+        oldest = min(os.path.getmtime(path) for path in paths) if paths else None
+    except OSError:
+        return None
+    if oldest is None:
+        return None
+    return max(0, int(time.time() - oldest))
+
+
+def repo_set(os_family):
+    # Architecture et configuration des dépôts : les serveurs d'une même image partagent la même clé
+    digest = hashlib.sha1(platform.machine().encode('utf-8'))
+    for pattern in REPO_FILES.get(os_family, []):
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+            except (IOError, OSError):
+                continue
+            digest.update(path.encode('utf-8'))
+            digest.update(content)
+    return digest.hexdigest()[:16]
+
+
+def match_known_updates(module, known):
+    command = PACKAGE_COMMANDS.get(module.params['os_family'])
+    lines = run_lines(module, command) if command else None
+    if lines is None:
+        return None
+    installed = {}
+    for line in lines:
+        name, _, version = line.partition(' ')
+        installed.setdefault(name, set()).add(version)
+    # Paquet installé dont aucune version installée n'est la dernière version disponible
+    return len([name for name, version in known.items()
+                if name in installed and version not in installed[name]])
+
+
+def count_updates(module):
+    """Nombre de mises à jour disponibles, description du comptage et liste à partager."""
+    mode = module.params['update_check']
+    os_family = module.params['os_family']
+    check = {'mode': mode, 'source': None, 'metadata_age': metadata_age(os_family)}
+    if mode == 'known':
+        check['repo_set'] = repo_set(os_family)
+        entry = module.params['known_updates'].get(check['repo_set']) or {}
+        try:
+            age = time.time() - float(entry.get('generated'))
+        except (TypeError, ValueError):
+            age = None
+        if age is not None and age < module.params['known_max_age'] and 'available' in entry:
+            count = match_known_updates(module, entry.get('available') or {})
+            if count is not None:
+                check['source'] = 'known'
+                return count, check, None
+
+    cached = (mode != 'refresh' and check['metadata_age'] is not None
+              and check['metadata_age'] < module.params['cache_max_age'])
+    updates = list_updates(module, cached)
+    if updates is None:
+        return 'unknown', check, None
+    check['source'] = 'cache' if cached or os_family == 'Debian' else 'refresh'
+    record = None
+    available = list_available(module) if mode == 'known' else None
+    if available is not None:
+        # La liste date des métadonnées utilisées
+        age = check['metadata_age'] or 0 if check['source'] == 'cache' else 0
+        record = {'repo_set': check['repo_set'], 'generated': int(time.time()) - age, 'available': available}
+    return len(updates), check, record
+
+
+def collect_users():
+    passwd = [line.split(':') for line in read_lines('/etc/passwd') if line and not line.startswith('#')]
+    group = [line.split(':') for line in read_lines('/etc/group') if line and not line.startswith('#')]
+    sudoers = set()
+    for fields in group:
+        if fields[0] in SUDO_GROUPS and len(fields) > 3:
+            sudoers.update(member for member in fields[3].split(',') if member)
+    return {
+        'with_shell': len([fields for fields in passwd
+                           if len(fields) > 6 and os.path.basename(fields[6]) not in NOLOGIN_SHELLS]),
+        'with_uid0': len([fields for fields in passwd if len(fields) > 2 and fields[2] == '0']),
+        'with_sudo': len(sudoers),
+    }
+
+
+def collect_backup(module):
+    solutions = [name for name, binary in BACKUP_AGENTS if module.get_bin_path(binary) is not None]
+    return {
+        'solutions': solutions,
+        'detected': len(solutions) > 0,
+    }
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            sections=dict(type='list', elements='str', choices=['software', 'security', 'updates'],
+                          default=['software', 'security']),
+            os_family=dict(type='str', required=True),
+            distribution_major_version=dict(type='str', default='0'),
+            pkg_manager=dict(type='str', default='unknown'),
+            service_manager=dict(type='str', default='unknown'),
+            check_updates=dict(type='bool', default=True),
+            package_details=dict(type='bool', default=False),
+            update_check=dict(type='str', choices=['refresh', 'cache', 'known'], default='refresh'),
+            cache_max_age=dict(type='int', default=86400),
+            known_updates=dict(type='dict', default={}),
+            known_max_age=dict(type='int', default=86400),
+        ),
+        supports_check_mode=True,
+    )
+
+    result = dict(changed=False)
+    record = None
+    if 'software' in module.params['sections']:
+        software = {'databases': collect_databases(module)}
+        packages = collect_packages(module)
+        if packages is not None:
+            software['packages'] = packages
+        services = collect_services(module)
+        if services is not None:
+            software['services'] = services
+        result['software'] = software
+
+    if 'security' in module.params['sections']:
+        security = {'backup': collect_backup(module)}
+        if module.params['check_updates']:
+            security['updates_available'], security['updates_check'], record = count_updates(module)
+        else:
+            security['updates_available'] = 'unknown'
+        try:
+            security['users'] = collect_users()
+        except (IOError, OSError):
+            security['users'] = {'available': False, 'note': 'Informations utilisateurs non disponibles'}
+        result['security'] = security
+
+    if 'updates' in module.params['sections']:
+        count, check, record = count_updates(module)
+        result['updates'] = {'updates_available': count, 'updates_check': check}
+
+    if record is not None:
+        result['known_updates_record'] = record
+
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_known_updates
+short_description: Listes des paquets disponibles par distribution, version et jeu de dépôts
+description:
+  - Enregistre sur le contrôleur les listes des paquets disponibles retournées par C(cmdb_host_collector) (C(update_check=known), résultat C(known_updates_record)).
+  - Un fichier JSON par distribution et version majeure (C(<dir>/<distribution>.json)), contenant une entrée par jeu de dépôts (C(repo_set)) avec sa date (C(generated)) et la dernière version disponible de chaque paquet (C(available)).
+  - Plusieurs serveurs d'un même jeu de dépôts lisent les mêmes dépôts : la liste la plus récente est retenue.
+  - Une entrée n'est remplacée que si elle a plus de C(max_age) secondes : la liste est calculée une fois par jeu de dépôts, puis comparée aux paquets installés de chaque serveur de même image, qui n'interroge plus les dépôts.
+  - À exécuter sur le contrôleur (C(delegate_to: localhost), C(run_once: true)).
+options:
+  dir:
+    description: Répertoire des listes sur le contrôleur (créé si nécessaire).
+    type: path
+    required: true
+  records:
+    description: Listes à enregistrer (C(distribution), C(repo_set), C(generated), C(available)).
+    type: list
+    elements: dict
+    default: []
+  max_age:
+    description: Âge (en secondes) au-delà duquel une entrée est remplacée ; les entrées plus anciennes que le double sont supprimées.
+    type: int
+    default: 86400
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Enregistrer les paquets disponibles par jeu de dépôts
+  cmdb_known_updates:
+    dir: ~/.cmdb_inventory/known_updates
+    records: "{{ ansible_play_hosts | map('extract', hostvars) | selectattr('cmdb_known_updates_record', 'defined') | map(attribute='cmdb_known_updates_record') | select | list }}"
+  delegate_to: localhost
+  run_once: true
+'''
+
+RETURN = r'''
+updated:
+  description: Entrées ajoutées ou remplacées (C(<distribution>/<repo_set>)).
+  returned: always
+  type: list
+'''
+
+import json
+import os
+import re
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import write_atomic
+
+
+def distribution_file(directory, distribution):
+    return os.path.join(directory, '%s.json' % re.sub(r'[^A-Za-z0-9._-]', '_', distribution))
+
+
+def load(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            content = json.load(f)
+    except ValueError:
+        # Fichier corrompu : les listes seront recalculées
+        return {}
+    return content if isinstance(content, dict) else {}
+
+
+def age(entry, now):
+    try:
+        return now - float(entry.get('generated'))
+    except (TypeError, ValueError):
+        return None
+
+
+def merge(entries, records, max_age, now):
+    """Met à jour les entrées d'une distribution, retourne les jeux de dépôts modifiés."""
+    latest = {}
+    for record in records:
+        record = dict(record, generated=record.get('generated') or int(now))
+        if age(record, now) is None:
+            continue
+        current = latest.get(record['repo_set'])
+        if current is None or age(record, now) < age(current, now):
+            latest[record['repo_set']] = record
+    updated = []
+    for repo_set, record in sorted(latest.items()):
+        current = entries.get(repo_set)
+        current_age = age(current, now) if current else None
+        # Entrées antérieures sans clé available : listes des seules mises à jour d'un serveur
+        if current_age is not None and current_age < max_age and 'available' in current:
+            continue
+        entries[repo_set] = {
+            'generated': record['generated'],
+            'available': record.get('available') or {},
+        }
+        updated.append(repo_set)
+    for repo_set in list(entries):
+        entry_age = age(entries[repo_set], now)
+        if entry_age is None or entry_age > 2 * max_age or 'available' not in entries[repo_set]:
+            del entries[repo_set]
+            updated.append(repo_set)
+    return updated
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            dir=dict(type='path', required=True),
+            records=dict(type='list', elements='dict', default=[]),
+            max_age=dict(type='int', default=86400),
+        ),
+        supports_check_mode=True,
+    )
+
+    directory = module.params['dir']
+    by_distribution = {}
+    for record in module.params['records']:
+        if not record.get('distribution') or not record.get('repo_set'):
+            module.fail_json(msg="Liste sans distribution ou repo_set : %s" % sorted(record))
+        by_distribution.setdefault(record['distribution'], []).append(record)
+
+    now = time.time()
+    updated = []
+    try:
+        if by_distribution and not os.path.isdir(directory) and not module.check_mode:
+            os.makedirs(directory, 0o700)
+        for distribution, records in sorted(by_distribution.items()):
+            path = distribution_file(directory, distribution)
+            entries = load(path)
+            changed = merge(entries, records, module.params['max_age'], now)
+            if changed and not module.check_mode:
+                write_atomic(path, json.dumps(entries, sort_keys=True))
+            updated.extend('%s/%s' % (distribution, repo_set) for repo_set in changed)
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Impossible d'enregistrer les mises à jour connues dans %s : %s" % (directory, e))
+
+    module.exit_json(changed=bool(updated), updated=updated)
+
+
+if __name__ == '__main__':
+    main()
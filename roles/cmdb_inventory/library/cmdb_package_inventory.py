@@ -0,0 +1,379 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_package_inventory
+short_description: Inventaire des paquets du parc dans un dictionnaire dédoublonné
+description:
+  - Avec C(state=index), lit les rapports d'inventaire du repository dont la clé C(software.packages.installed) contient la liste détaillée des paquets (C(cmdb_host_collector), option C(package_details)).
+  - Chaque couple (nom, version) reçoit un identifiant entier dans un dictionnaire commun au parc (table C(packages) d'une base SQLite).
+  - Pour chaque distribution et version majeure, une liste de référence (C(baselines)) contient les paquets présents sur au moins C(baseline_ratio) des serveurs ; chaque serveur ne conserve que les identifiants ajoutés et retirés par rapport à cette référence (tableaux triés, codés par différences puis compressés).
+  - La liste détaillée est ensuite retirée du rapport (C(strip)) : elle n'est conservée qu'une fois, dans la base.
+  - Avec C(state=query), retourne les serveurs sur lesquels un paquet est installé, éventuellement dans une version antérieure à C(version_lt).
+  - Seuls les rapports nouveaux ou modifiés depuis la dernière indexation sont lus.
+options:
+  db:
+    description: Base SQLite de l'inventaire des paquets (créée si nécessaire).
+    type: path
+    required: true
+  state:
+    description: C(index) pour indexer les rapports, C(query) pour interroger la base.
+    type: str
+    choices: [index, query]
+    default: index
+  path:
+    description: Répertoire des rapports d'inventaire (C(state=index)).
+    type: path
+  patterns:
+    description: Motifs (glob) des rapports à lire.
+    type: list
+    elements: str
+    default: ['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst']
+  baseline_ratio:
+    description: Part minimale des serveurs d'une distribution sur lesquels un paquet doit être installé pour figurer dans la liste de référence.
+    type: float
+    default: 0.5
+  strip:
+    description: Retirer la liste détaillée des rapports indexés (C(software.packages.installed)).
+    type: bool
+    default: true
+  name:
+    description: Nom du paquet recherché (C(state=query)).
+    type: str
+  version_lt:
+    description: Ne retenir que les versions antérieures à cette version (comparaison de type rpm/dpkg, epoch et release compris).
+    type: str
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Indexer les paquets des rapports déposés
+  cmdb_package_inventory:
+    db: /opt/cmdb/inventory/packages/packages.sqlite
+    path: /opt/cmdb/inventory/reports
+  delegate_to: "{{ cmdb_inventory_repository_host }}"
+  run_once: true
+
+- name: Serveurs exécutant une version d'openssl antérieure à 3.0.7
+  cmdb_package_inventory:
+    db: /opt/cmdb/inventory/packages/packages.sqlite
+    state: query
+    name: openssl
+    version_lt: 3.0.7
+  register: openssl_hosts
+'''
+
+RETURN = r'''
+indexed:
+  description: Serveurs indexés lors de cet appel (C(state=index)).
+  returned: always
+  type: list
+removed:
+  description: Serveurs retirés de la base car leur rapport n'existe plus (C(state=index)).
+  returned: always
+  type: list
+packages:
+  description: Nombre de couples (nom, version) du dictionnaire du parc.
+  returned: always
+  type: int
+hosts:
+  description: Serveurs sur lesquels le paquet est installé (C(hostname), C(distribution), C(version)) (C(state=query)).
+  returned: always
+  type: list
+errors:
+  description: Rapports ignorés car illisibles, avec le message d'erreur.
+  returned: always
+  type: list
+'''
+
+import fnmatch
+import os
+import re
+import sqlite3
+import struct
+import zlib
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import HAS_ZSTANDARD, compression_of, read_report, write_report
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS packages (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+    "version TEXT NOT NULL, UNIQUE (name, version))",
+    "CREATE TABLE IF NOT EXISTS baselines (distribution TEXT PRIMARY KEY, hosts INTEGER, ids BLOB)",
+    "CREATE TABLE IF NOT EXISTS hosts (hostname TEXT PRIMARY KEY, distribution TEXT, report TEXT, "
+    "mtime REAL, collection_date TEXT, count INTEGER, added BLOB, removed BLOB)",
+)
+
+SEGMENT = re.compile(r'~|[0-9]+|[A-Za-z]+')
+
+
+def encode_ids(ids):
+    # Identifiants triés, codés par différences (petits entiers) puis compressés
+    ids = sorted(ids)
+    deltas = [current - previous for previous, current in zip([0] + ids[:-1], ids)]
+    return zlib.compress(struct.pack('<%dI' % len(deltas), *deltas))
+
+
+def decode_ids(blob):
+    if not blob:
+        return set()
+    data = zlib.decompress(blob)
+    ids = []
+    total = 0
+    for delta in struct.unpack('<%dI' % (len(data) // 4), data):
+        total += delta
+        ids.append(total)
+    return set(ids)
+
+
+def compare_segments(a, b):
+    # Comparaison rpmvercmp : segments numériques ou alphabétiques, « ~ » avant tout
+    a_parts = SEGMENT.findall(a)
+    b_parts = SEGMENT.findall(b)
+    while a_parts or b_parts:
+        x = a_parts.pop(0) if a_parts else None
+        y = b_parts.pop(0) if b_parts else None
+        if x == '~' or y == '~':
+            if x != y:
+                return -1 if x == '~' else 1
+            continue
+        if x is None or y is None:
+            return -1 if x is None else 1
+        if x.isdigit() and y.isdigit():
+            x, y = int(x), int(y)
+        elif x.isdigit() or y.isdigit():
+            # Un segment numérique est plus récent qu'un segment alphabétique
+            return 1 if x.isdigit() else -1
+        if x != y:
+            return -1 if x < y else 1
+    return 0
+
+
+def split_version(version):
+    epoch, sep, rest = version.partition(':')
+    if not sep or not epoch.isdigit():
+        epoch, rest = '0', version
+    upstream, sep, release = rest.rpartition('-')
+    if not sep:
+        upstream, release = rest, ''
+    return int(epoch), upstream, release
+
+
+def compare_versions(a, b):
+    a_epoch, a_upstream, a_release = split_version(a)
+    b_epoch, b_upstream, b_release = split_version(b)
+    if a_epoch != b_epoch:
+        return -1 if a_epoch < b_epoch else 1
+    return compare_segments(a_upstream, b_upstream) or compare_segments(a_release, b_release)
+
+
+def distribution_key(report):
+    os_info = (report.get('software') or {}).get('os') or {}
+    version = str(os_info.get('distribution_version') or '').split('.')[0]
+    return ('%s %s' % (os_info.get('distribution') or 'unknown', version)).strip()
+
+
+def open_db(path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, 0o755)
+    db = sqlite3.connect(path, timeout=30)
+    for statement in SCHEMA:
+        db.execute(statement)
+    return db
+
+
+def host_sets(db, distributions):
+    """Ensembles complets d'identifiants des serveurs des distributions demandées."""
+    baselines = dict((distribution, decode_ids(ids)) for distribution, ids
+                     in db.execute("SELECT distribution, ids FROM baselines"))
+    sets = {}
+    for hostname, distribution, added, removed in db.execute(
+            "SELECT hostname, distribution, added, removed FROM hosts"):
+        if distribution in distributions:
+            base = baselines.get(distribution, set())
+            sets[hostname] = (distribution, (base - decode_ids(removed)) | decode_ids(added))
+    return sets
+
+
+def index(module, db):
+    path = module.params['path']
+    if not path or not os.path.isdir(path):
+        module.fail_json(msg="Le répertoire des rapports %s n'existe pas" % path)
+    files = sorted(name for name in os.listdir(path)
+                   if any(fnmatch.fnmatch(name, pattern) for pattern in module.params['patterns']))
+    known = dict((report, (hostname, mtime, distribution)) for hostname, report, mtime, distribution
+                 in db.execute("SELECT hostname, report, mtime, distribution FROM hosts"))
+    dictionary = dict(((name, version), package_id) for package_id, name, version
+                      in db.execute("SELECT id, name, version FROM packages"))
+
+    errors = []
+    parsed = {}
+    for name in files:
+        report_path = os.path.join(path, name)
+        entry = known.get(name)
+        if entry and entry[1] == os.path.getmtime(report_path):
+            continue
+        try:
+            report = read_report(report_path)
+        except (IOError, OSError, ValueError) as e:
+            errors.append({'file': name, 'msg': str(e)})
+            continue
+        packages = (report.get('software') or {}).get('packages')
+        if not isinstance(packages, dict) or not isinstance(packages.get('installed'), list):
+            continue
+        parsed[name] = report
+
+    new_sets = {}
+    affected = set()
+    for name, report in parsed.items():
+        ids = set()
+        for item in report['software']['packages']['installed']:
+            key = (item[0], item[1])
+            package_id = dictionary.get(key)
+            if package_id is None:
+                package_id = db.execute("INSERT INTO packages (name, version) VALUES (?, ?)", key).lastrowid
+                dictionary[key] = package_id
+            ids.add(package_id)
+        distribution = distribution_key(report)
+        new_sets[report.get('hostname') or name] = (distribution, ids, name, report.get('collection_date'))
+        affected.add(distribution)
+        if name in known and known[name][2] != distribution:
+            affected.add(known[name][2])
+
+    # Serveurs dont le rapport a disparu du repository (sauf rapport déposé sous un autre format)
+    gone = [entry for report, entry in known.items() if report not in files]
+    removed = [entry[0] for entry in gone if entry[0] not in new_sets]
+    affected.update(entry[2] for entry in gone)
+
+    if module.check_mode:
+        db.rollback()
+        return sorted(new_sets), sorted(removed), len(dictionary), errors
+
+    # Listes de référence recalculées pour les distributions concernées
+    sets = host_sets(db, affected)
+    for hostname in removed:
+        sets.pop(hostname, None)
+    db.executemany("DELETE FROM hosts WHERE hostname = ?", [(hostname,) for hostname in removed])
+    for hostname, (distribution, ids, name, collected) in new_sets.items():
+        sets[hostname] = (distribution, ids)
+    for distribution in affected:
+        members = [ids for host_distribution, ids in sets.values() if host_distribution == distribution]
+        if not members:
+            db.execute("DELETE FROM baselines WHERE distribution = ?", (distribution,))
+            continue
+        counts = {}
+        for ids in members:
+            for package_id in ids:
+                counts[package_id] = counts.get(package_id, 0) + 1
+        threshold = module.params['baseline_ratio'] * len(members)
+        baseline = set(package_id for package_id, count in counts.items() if count >= threshold)
+        db.execute("INSERT OR REPLACE INTO baselines VALUES (?, ?, ?)",
+                   (distribution, len(members), encode_ids(baseline)))
+        for hostname, (host_distribution, ids) in sets.items():
+            if host_distribution != distribution:
+                continue
+            added, removed_ids = encode_ids(ids - baseline), encode_ids(baseline - ids)
+            if hostname in new_sets:
+                _, _, name, collected = new_sets[hostname]
+                db.execute("INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (hostname, distribution, name, os.path.getmtime(os.path.join(path, name)),
+                            collected, len(ids), added, removed_ids))
+            else:
+                db.execute("UPDATE hosts SET added = ?, removed = ? WHERE hostname = ?",
+                           (added, removed_ids, hostname))
+    db.commit()
+
+    # La liste détaillée n'est conservée que dans la base
+    if module.params['strip']:
+        for hostname, (distribution, ids, name, collected) in new_sets.items():
+            report_path = os.path.join(path, name)
+            if compression_of(name) == 'zstd' and not HAS_ZSTANDARD:
+                module.warn("Rapport %s non réduit : module Python zstandard absent" % name)
+                continue
+            report = parsed[name]
+            del report['software']['packages']['installed']
+            report['software']['packages']['indexed'] = True
+            try:
+                write_report(report_path, report)
+            except (IOError, OSError) as e:
+                module.warn("Rapport %s non réduit : %s" % (name, e))
+                continue
+            db.execute("UPDATE hosts SET mtime = ? WHERE hostname = ?",
+                       (os.path.getmtime(report_path), hostname))
+        db.commit()
+    return sorted(new_sets), sorted(removed), len(dictionary), errors
+
+
+def query(module, db):
+    name = module.params['name']
+    if not name:
+        module.fail_json(msg="L'option name est obligatoire avec state=query")
+    version_lt = module.params['version_lt']
+    versions = dict((package_id, version) for package_id, version
+                    in db.execute("SELECT id, version FROM packages WHERE name = ?", (name,))
+                    if not version_lt or compare_versions(version, version_lt) < 0)
+    if not versions:
+        return []
+    wanted = set(versions)
+    baselines = dict((distribution, decode_ids(ids) & wanted) for distribution, ids
+                     in db.execute("SELECT distribution, ids FROM baselines"))
+    hosts = []
+    for hostname, distribution, added, removed in db.execute(
+            "SELECT hostname, distribution, added, removed FROM hosts ORDER BY hostname"):
+        installed = (baselines.get(distribution, set()) - decode_ids(removed)) | (decode_ids(added) & wanted)
+        for package_id in sorted(installed):
+            hosts.append({'hostname': hostname, 'distribution': distribution,
+                          'version': versions[package_id]})
+    return hosts
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            db=dict(type='path', required=True),
+            state=dict(type='str', choices=['index', 'query'], default='index'),
+            path=dict(type='path'),
+            patterns=dict(type='list', elements='str',
+                          default=['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz',
+                                   '*_cmdb_inventory.json.zst']),
+            baseline_ratio=dict(type='float', default=0.5),
+            strip=dict(type='bool', default=True),
+            name=dict(type='str'),
+            version_lt=dict(type='str'),
+        ),
+        supports_check_mode=True,
+    )
+
+    state = module.params['state']
+    if state == 'query' and not os.path.exists(module.params['db']):
+        module.exit_json(changed=False, hosts=[], indexed=[], removed=[], packages=0, errors=[])
+
+    try:
+        db = open_db(module.params['db'])
+        try:
+            if state == 'query':
+                hosts = query(module, db)
+                count = db.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+                module.exit_json(changed=False, hosts=hosts, indexed=[], removed=[],
+                                 packages=count, errors=[])
+            indexed, removed, count, errors = index(module, db)
+        finally:
+            db.close()
+    except (IOError, OSError, sqlite3.Error) as e:
+        module.fail_json(msg="Inventaire des paquets %s inutilisable : %s" % (module.params['db'], e))
+
+    for error in errors:
+        module.warn("Rapport ignoré %s : %s" % (error['file'], error['msg']))
+    module.exit_json(changed=bool(indexed or removed), indexed=indexed, removed=removed,
+                     packages=count, hosts=[], errors=errors)
+
+
+if __name__ == '__main__':
+    main()
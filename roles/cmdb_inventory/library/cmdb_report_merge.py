@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_report_merge
+short_description: Complète un rapport d'inventaire CMDB avec les sections non collectées
+description:
+  - Reprend du dernier rapport du serveur les sections qui n'ont pas été collectées lors de cette exécution (empreinte inchangée, voir C(cmdb_section_probes)).
+  - Enregistre ensuite le rapport complet et les empreintes de ses sections dans le répertoire d'état, pour la prochaine exécution.
+  - L'empreinte d'une section marquée partielle (C(collection_status: partial), collecte interrompue par le délai C(async_timeout)) n'est pas enregistrée : la section est collectée de nouveau à la prochaine exécution.
+  - Le rapport précédent reste sur le serveur : il n'est jamais transféré vers le contrôleur.
+  - Seul le format JSON est pris en charge.
+options:
+  src:
+    description: Rapport JSON produit par le template C(cmdb_inventory_report.j2), réécrit sur place.
+    type: path
+    required: true
+  state_dir:
+    description: Répertoire d'état persistant du serveur (dernier rapport et empreintes).
+    type: path
+    required: true
+  sections:
+    description: Sections activées (C(cmdb_collect)).
+    type: list
+    elements: str
+    default: [hardware, software, network, security, organizational]
+  collected:
+    description: Sections collectées lors de cette exécution ; les autres sections activées sont reprises du rapport précédent.
+    type: list
+    elements: str
+    required: true
+  probes:
+    description: Empreintes des sections retournées par C(cmdb_section_probes).
+    type: dict
+    default: {}
+  compression:
+    description:
+      - Compression du rapport enregistré dans le répertoire d'état (C(last_report.json), C(.gz) ou C(.zst)).
+      - Le rapport précédent est relu quel que soit son format.
+    type: str
+    choices: [none, gzip, zstd]
+    default: none
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Compléter le rapport avec les sections inchangées
+  cmdb_report_merge:
+    src: /tmp/cmdb_inventory/web01_cmdb_inventory.json
+    state_dir: /var/lib/cmdb_inventory
+    collected: "{{ cmdb_sections_to_collect }}"
+    probes: "{{ section_probes.probes }}"
+'''
+
+RETURN = r'''
+carried_sections:
+  description: Sections reprises du rapport précédent.
+  returned: always
+  type: list
+missing_sections:
+  description: Sections non collectées et absentes du rapport précédent (laissées vides).
+  returned: always
+  type: list
+partial_sections:
+  description: Sections collectées de façon incomplète lors de cette exécution.
+  returned: always
+  type: list
+'''
+
+import json
+import os
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import (EXTENSIONS, HAS_ZSTANDARD, read_report, write_atomic,
+                                               write_report)
+
+STATE_FILE = 'probes.json'
+REPORT_FILE = 'last_report.json'
+
+
+def write_json(path, data):
+    # Les droits du fichier remplacé sont conservés
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    write_atomic(path, json.dumps(data, indent=2), mode)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            src=dict(type='path', required=True),
+            state_dir=dict(type='path', required=True),
+            sections=dict(type='list', elements='str',
+                          default=['hardware', 'software', 'network', 'security', 'organizational']),
+            collected=dict(type='list', elements='str', required=True),
+            probes=dict(type='dict', default={}),
+            compression=dict(type='str', choices=['none', 'gzip', 'zstd'], default='none'),
+        ),
+        supports_check_mode=True,
+    )
+
+    src = module.params['src']
+    state_dir = module.params['state_dir']
+    sections = module.params['sections']
+    collected = module.params['collected']
+
+    try:
+        report = read_report(src)
+    except (IOError, OSError, ValueError) as e:
+        module.fail_json(msg="Rapport %s illisible : %s" % (src, e))
+
+    compression = module.params['compression']
+    if compression == 'zstd' and not HAS_ZSTANDARD:
+        module.warn("Module Python zstandard absent du serveur, compression gzip utilisée")
+        compression = 'gzip'
+
+    previous = {}
+    report_paths = [os.path.join(state_dir, REPORT_FILE + ext) for ext in sorted(EXTENSIONS.values())]
+    for previous_path in report_paths:
+        if not os.path.exists(previous_path):
+            continue
+        try:
+            previous = read_report(previous_path)
+        except (IOError, OSError, ValueError) as e:
+            module.warn("Rapport précédent %s illisible, ignoré : %s" % (previous_path, e))
+        break
+
+    carried = []
+    missing = []
+    for section in sections:
+        if section in collected:
+            continue
+        if previous.get(section) is not None:
+            report[section] = previous[section]
+            carried.append(section)
+        else:
+            missing.append(section)
+
+    partial = [section for section in sections if section in collected
+               and isinstance(report.get(section), dict)
+               and report[section].get('collection_status') == 'partial']
+
+    report['collection'] = {
+        'collected_sections': [section for section in sections if section in collected],
+        'carried_sections': carried,
+        'carried_from': previous.get('collection_date') if carried else None,
+        'partial_sections': partial,
+    }
+
+    if module.check_mode:
+        module.exit_json(changed=True, carried_sections=carried, missing_sections=missing,
+                         partial_sections=partial)
+
+    try:
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir, 0o700)
+        write_json(src, report)
+        last_report = os.path.join(state_dir, REPORT_FILE + EXTENSIONS[compression])
+        write_report(last_report, report, compression)
+        for path in report_paths:
+            if path != last_report and os.path.exists(path):
+                os.unlink(path)
+        # Seules les sections complètes du rapport enregistré peuvent être reprises
+        probes = dict((section, value) for section, value in module.params['probes'].items()
+                      if report.get(section) is not None and section not in partial)
+        write_json(os.path.join(state_dir, STATE_FILE), probes)
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Impossible d'enregistrer le rapport : %s" % e)
+
+    module.exit_json(changed=True, carried_sections=carried, missing_sections=missing,
+                     partial_sections=partial)
+
+
+if __name__ == '__main__':
+    main()
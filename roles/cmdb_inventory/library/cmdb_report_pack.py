@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_report_pack
+short_description: Compacte et compresse le rapport d'inventaire CMDB sur le serveur
+description:
+  - Réécrit le rapport JSON produit par le template C(cmdb_inventory_report.j2) avant son transfert vers le contrôleur.
+  - En mode compact, réduit les parties volumineuses aux champs utilisés par les rapports (partitions des disques, faits complets des interfaces de C(hardware.network_interfaces), résultats bruts de tâches C(register)) et supprime l'indentation.
+  - Compresse ensuite le rapport (gzip ou zstd) ; le fichier source est remplacé par C(<src>.gz) ou C(<src>.zst).
+  - Le rôle C(cmdb_report) et les modules du repository lisent indifféremment les rapports compressés ou non.
+options:
+  src:
+    description: Rapport JSON à réécrire.
+    type: path
+    required: true
+  compact:
+    description: Réduire le rapport aux champs utilisés par les rapports.
+    type: bool
+    default: true
+  compression:
+    description:
+      - Compression du rapport.
+      - C(zstd) nécessite le module Python C(zstandard) sur le serveur ; à défaut, gzip est utilisé.
+    type: str
+    choices: [none, gzip, zstd]
+    default: gzip
+  level:
+    description: Niveau de compression (0 = niveau par défaut de l'algorithme).
+    type: int
+    default: 0
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Compacter et compresser le rapport
+  cmdb_report_pack:
+    src: /tmp/cmdb_inventory/web01_cmdb_inventory.json
+    compression: gzip
+  register: report_pack
+'''
+
+RETURN = r'''
+dest:
+  description: Chemin du rapport écrit.
+  returned: always
+  type: str
+compression:
+  description: Compression effectivement utilisée.
+  returned: always
+  type: str
+raw_size:
+  description: Taille du rapport d'origine en octets.
+  returned: always
+  type: int
+size:
+  description: Taille du rapport écrit en octets.
+  returned: always
+  type: int
+'''
+
+import json
+import os
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import EXTENSIONS, HAS_ZSTANDARD, compress, write_atomic
+
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+# Faits conservés pour chaque interface de hardware.network_interfaces (ansible_<interface>)
+INTERFACE_KEYS = ('device', 'macaddress', 'mtu', 'active', 'type', 'speed', 'module',
+                  'ipv4', 'ipv4_secondaries', 'ipv6')
+
+# Champs conservés d'un résultat brut de tâche (register)
+REGISTER_KEYS = ('rc', 'stdout', 'item')
+
+
+def is_register_result(value):
+    return isinstance(value, dict) and 'rc' in value and ('cmd' in value or 'invocation' in value)
+
+
+def strip_registers(value):
+    if is_register_result(value):
+        result = dict((key, value[key]) for key in REGISTER_KEYS if key in value)
+        if isinstance(result.get('item'), dict) and 'path' in result['item']:
+            result['item'] = {'path': result['item']['path']}
+        return result
+    if isinstance(value, dict):
+        return dict((key, strip_registers(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [strip_registers(item) for item in value]
+    return value
+
+
+def compact_report(report):
+    hardware = report.get('hardware')
+    if isinstance(hardware, dict):
+        for disk in hardware.get('disks') or []:
+            partitions = disk.get('partitions')
+            if isinstance(partitions, dict):
+                # Seule la taille des partitions est conservée
+                disk['partitions'] = dict((name, (info or {}).get('size'))
+                                          for name, info in partitions.items())
+        interfaces = hardware.get('network_interfaces')
+        if isinstance(interfaces, list):
+            hardware['network_interfaces'] = [
+                dict((key, interface[key]) for key in INTERFACE_KEYS if key in interface)
+                for interface in interfaces if isinstance(interface, dict)]
+    return strip_registers(report)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            src=dict(type='path', required=True),
+            compact=dict(type='bool', default=True),
+            compression=dict(type='str', choices=['none', 'gzip', 'zstd'], default='gzip'),
+            level=dict(type='int', default=0),
+        ),
+        supports_check_mode=True,
+    )
+
+    src = module.params['src']
+    compression = module.params['compression']
+    if compression == 'zstd' and not HAS_ZSTANDARD:
+        module.warn("Module Python zstandard absent du serveur, compression gzip utilisée")
+        compression = 'gzip'
+    level = module.params['level'] or DEFAULT_LEVELS.get(compression, 0)
+    dest = src + EXTENSIONS[compression]
+
+    try:
+        with open(src, 'rb') as f:
+            raw = f.read()
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Rapport %s illisible : %s" % (src, e))
+
+    content = raw
+    if module.params['compact']:
+        try:
+            report = json.loads(raw.decode('utf-8'))
+        except ValueError as e:
+            module.fail_json(msg="Rapport %s invalide : %s" % (src, e))
+        content = json.dumps(compact_report(report), separators=(',', ':'),
+                             ensure_ascii=False).encode('utf-8')
+    content = compress(content, compression, level)
+
+    if module.check_mode:
+        module.exit_json(changed=True, dest=dest, compression=compression,
+                         raw_size=len(raw), size=len(content))
+
+    try:
+        write_atomic(dest, content)
+        if dest != src:
+            os.unlink(src)
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Impossible d'écrire le rapport %s : %s" % (dest, e))
+
+    module.exit_json(changed=True, dest=dest, compression=compression,
+                     raw_size=len(raw), size=len(content))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_repository_ingest
+short_description: Dépose en une seule opération les rapports d'une exécution dans le repository CMDB
+description:
+  - Extrait l'archive des rapports d'une exécution (préparée sur le contrôleur à partir du répertoire de transit) dans un répertoire d'arrivée du repository, puis renomme chaque fichier vers C(reports/) ou C(diagnostics/).
+  - Le répertoire d'arrivée est sur le même système de fichiers que le repository : chaque renommage est atomique, un lecteur ne voit jamais de rapport partiellement écrit.
+  - Journalise les serveurs déposés dans C(inventaire_success.log) en une seule écriture.
+  - Remplace la chaîne find/stat/test d'écriture/copy/cp exécutée auparavant pour chaque serveur.
+options:
+  src:
+    description: Archive tar compressée (gzip) sur le serveur repository, contenant les sous-répertoires C(reports/) et C(diagnostics/).
+    type: path
+    required: true
+  dest:
+    description: Répertoire du repository.
+    type: path
+    required: true
+  run_id:
+    description: Identifiant de l'exécution, utilisé pour nommer le répertoire d'arrivée.
+    type: str
+    required: true
+  log:
+    description: Ajouter une ligne par serveur déposé au fichier C(inventaire_success.log) du repository.
+    type: bool
+    default: true
+  remove_src:
+    description: Supprimer l'archive après le dépôt.
+    type: bool
+    default: true
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Déposer les rapports de l'exécution dans le repository
+  cmdb_repository_ingest:
+    src: /tmp/cmdb_batch_20250101120000.tar.gz
+    dest: /opt/cmdb/inventory
+    run_id: "20250101120000"
+  register: repository_ingest
+  delegate_to: "{{ cmdb_inventory_repository_host }}"
+  run_once: true
+'''
+
+RETURN = r'''
+reports:
+  description: Noms des rapports d'inventaire déposés dans C(reports/).
+  returned: always
+  type: list
+diagnostics:
+  description: Noms des fichiers de diagnostic déposés dans C(diagnostics/).
+  returned: always
+  type: list
+hosts:
+  description: Noms des serveurs (C(managed_node_name)) dont le rapport d'inventaire a été déposé.
+  returned: always
+  type: list
+'''
+
+import os
+import shutil
+import tarfile
+from datetime import datetime
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import COMPRESSED_EXTENSIONS
+
+SUBDIRS = ('reports', 'diagnostics')
+INCOMING_DIR = '.incoming'
+REPORT_SUFFIX = '_cmdb_inventory.'
+
+
+def report_variants(name):
+    stem = name
+    for ext in COMPRESSED_EXTENSIONS:
+        if stem.endswith(ext):
+            stem = stem[:-len(ext)]
+    return [stem] + [stem + ext for ext in COMPRESSED_EXTENSIONS]
+
+
+def safe_members(archive):
+    # Seuls les fichiers réguliers de reports/ et diagnostics/ sont extraits
+    for member in archive.getmembers():
+        if not member.isfile():
+            continue
+        parts = os.path.normpath(member.name).split(os.sep)
+        if parts[0] == '.':
+            parts = parts[1:]
+        if len(parts) != 2 or parts[0] not in SUBDIRS or parts[1].startswith('.'):
+            continue
+        member.name = os.path.join(*parts)
+        yield member
+
+
+def ingest(src, dest, run_id):
+    incoming = os.path.join(dest, INCOMING_DIR, run_id)
+    landed = dict((subdir, []) for subdir in SUBDIRS)
+    for subdir in SUBDIRS:
+        target = os.path.join(dest, subdir)
+        if not os.path.isdir(target):
+            os.makedirs(target, 0o755)
+    if os.path.isdir(incoming):
+        shutil.rmtree(incoming)
+    os.makedirs(incoming, 0o700)
+    try:
+        archive = tarfile.open(src, 'r:gz')
+        try:
+            members = list(safe_members(archive))
+            if hasattr(tarfile, 'data_filter'):
+                archive.extractall(incoming, members, filter='data')
+            else:
+                archive.extractall(incoming, members)
+        finally:
+            archive.close()
+        for member in members:
+            subdir, name = member.name.split(os.sep)
+            path = os.path.join(incoming, subdir, name)
+            os.chmod(path, 0o644)
+            os.rename(path, os.path.join(dest, subdir, name))
+            landed[subdir].append(name)
+            # Un seul rapport par serveur : les versions dans un autre format sont retirées
+            for variant in report_variants(name):
+                if variant != name and os.path.exists(os.path.join(dest, subdir, variant)):
+                    os.unlink(os.path.join(dest, subdir, variant))
+    finally:
+        shutil.rmtree(incoming, ignore_errors=True)
+    return landed
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            src=dict(type='path', required=True),
+            dest=dict(type='path', required=True),
+            run_id=dict(type='str', required=True),
+            log=dict(type='bool', default=True),
+            remove_src=dict(type='bool', default=True),
+        ),
+        supports_check_mode=True,
+    )
+
+    src = module.params['src']
+    dest = module.params['dest']
+    if not os.path.isfile(src):
+        module.fail_json(msg="Archive %s introuvable" % src)
+    if module.check_mode:
+        module.exit_json(changed=True, reports=[], diagnostics=[], hosts=[])
+
+    try:
+        landed = ingest(src, dest, module.params['run_id'])
+    except (IOError, OSError, tarfile.TarError) as e:
+        module.fail_json(msg="Dépôt de l'archive %s dans %s impossible : %s" % (src, dest, e))
+
+    reports = sorted(landed['reports'])
+    hosts = [name.rsplit(REPORT_SUFFIX, 1)[0] for name in reports if REPORT_SUFFIX in name]
+    if module.params['log'] and hosts:
+        timestamp = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        try:
+            with open(os.path.join(dest, 'inventaire_success.log'), 'a') as f:
+                f.write(''.join('%s - %s\n' % (host, timestamp) for host in hosts))
+        except (IOError, OSError) as e:
+            module.warn("Journal inventaire_success.log non mis à jour : %s" % e)
+    if module.params['remove_src']:
+        os.unlink(src)
+
+    module.exit_json(changed=bool(reports or landed['diagnostics']), reports=reports,
+                     diagnostics=sorted(landed['diagnostics']), hosts=hosts)
+
+
+if __name__ == '__main__':
+    main()
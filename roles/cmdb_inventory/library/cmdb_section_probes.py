@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_section_probes
+short_description: Sondes de changement par section de l'inventaire CMDB
+description:
+  - Calcule pour chaque section du rapport (hardware, software, network, security, organizational) une empreinte peu coûteuse de ce qui l'alimente (date de modification de la base des paquets, liste de /etc/ssl/certs, date de /etc/passwd, adresses et routes réseau...).
+  - Compare ces empreintes à celles du dernier rapport enregistré dans le répertoire d'état du serveur et retourne les sections à collecter à nouveau.
+  - Les autres sections sont reprises du rapport précédent par le module C(cmdb_report_merge).
+  - Le module ne modifie rien ; les empreintes sont enregistrées par C(cmdb_report_merge) une fois le rapport produit.
+options:
+  state_dir:
+    description: Répertoire d'état persistant du serveur (dernier rapport et empreintes).
+    type: path
+    required: true
+  sections:
+    description: Sections activées (C(cmdb_collect)).
+    type: list
+    elements: str
+    default: [hardware, software, network, security, organizational]
+  extra:
+    description:
+      - Valeurs calculées par le contrôleur à intégrer à l'empreinte d'une section (par exemple le hachage des variables d'inventaire C(server_*) pour la section organizational).
+    type: dict
+    default: {}
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Sonder les sections modifiées depuis le dernier rapport
+  cmdb_section_probes:
+    state_dir: /var/lib/cmdb_inventory
+    extra:
+      organizational: "{{ hostvars[inventory_hostname] | dict2items | selectattr('key', 'match', '^server_') | items2dict | to_json | hash('sha1') }}"
+  register: section_probes
+'''
+
+RETURN = r'''
+probes:
+  description: Empreinte actuelle de chaque section activée.
+  returned: always
+  type: dict
+changed_sections:
+  description: Sections dont l'empreinte a changé, ou absentes du rapport précédent.
+  returned: always
+  type: list
+unchanged_sections:
+  description: Sections pouvant être reprises du rapport précédent.
+  returned: always
+  type: list
+'''
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import EXTENSIONS
+
+# Sources de chaque sonde :
+#   stat    : date de modification et taille de fichiers ou répertoires (motifs glob)
+#   listing : noms, dates et tailles du contenu d'un répertoire
+#   content : contenu de petits fichiers
+#   command : sortie d'une commande
+SECTION_PROBES = {
+    'hardware': {
+        'content': ['/sys/class/dmi/id/product_name', '/sys/class/dmi/id/sys_vendor',
+                    '/sys/block/*/size', '/proc/mdstat'],
+        'command': [['nproc', '--all'], ['grep', 'MemTotal', '/proc/meminfo']],
+    },
+    'software': {
+        # Bases des gestionnaires de paquets (rpm, dpkg, zypper, pacman)
+        'stat': ['/var/lib/rpm/*', '/var/lib/dpkg/status', '/var/lib/pacman/local',
+                 '/etc/os-release', '/etc/systemd/system/multi-user.target.wants'],
+        'command': [['uname', '-r']],
+    },
+    'network': {
+        'content': ['/etc/resolv.conf', '/etc/hostname'],
+        'stat': ['/etc/sysconfig/iptables', '/etc/iptables/rules.v4', '/etc/firewalld/zones/*',
+                 '/etc/ufw/user.rules'],
+        'command': [['ip', '-o', 'addr', 'show'], ['ip', 'route', 'show']],
+    },
+    'security': {
+        'stat': ['/etc/passwd', '/etc/group', '/etc/shadow', '/etc/sudoers', '/etc/sudoers.d',
+                 '/etc/selinux/config', '/var/lib/rpm/*', '/var/lib/dpkg/status',
+                 # Métadonnées des dépôts : les mises à jour disponibles en dépendent
+                 '/var/cache/dnf', '/var/cache/yum', '/var/lib/apt/lists',
+                 '/var/cache/zypp/raw'],
+        'listing': ['/etc/ssl/certs', '/etc/pki/tls/certs'],
+    },
+    'organizational': {
+        'content': ['/etc/org_metadata.json', '/etc/server_purpose', '/etc/server_owner',
+                    '/etc/server_environment'],
+    },
+}
+
+LIFETIME = re.compile(r'(valid|preferred)_lft \S+')
+
+STATE_FILE = 'probes.json'
+REPORT_FILE = 'last_report.json'
+
+
+def stat_digest(digest, path):
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return
+    digest.update(('%s %r %d\n' % (path, st.st_mtime, st.st_size)).encode('utf-8'))
+
+
+def probe_section(module, spec, digest):
+    for pattern in spec.get('stat', []):
+        for path in sorted(glob.glob(pattern)):
+            stat_digest(digest, path)
+    for directory in spec.get('listing', []):
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for name in names:
+            stat_digest(digest, os.path.join(directory, name))
+    for pattern in spec.get('content', []):
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, 'rb') as f:
+                    digest.update(path.encode('utf-8') + b'\n' + f.read())
+            except (IOError, OSError):
+                continue
+    for command in spec.get('command', []):
+        executable = module.get_bin_path(command[0])
+        if executable is None:
+            continue
+        rc, out, err = module.run_command([executable] + command[1:])
+        digest.update(('%s %d\n' % (' '.join(command), rc)).encode('utf-8'))
+        # Les durées de vie des adresses DHCP décroissent à chaque seconde
+        digest.update(LIFETIME.sub('', out).encode('utf-8'))
+
+
+def load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state_dir=dict(type='path', required=True),
+            sections=dict(type='list', elements='str',
+                          default=['hardware', 'software', 'network', 'security', 'organizational']),
+            extra=dict(type='dict', default={}),
+        ),
+        supports_check_mode=True,
+    )
+
+    state_dir = module.params['state_dir']
+    probes = {}
+    for section in module.params['sections']:
+        if section not in SECTION_PROBES:
+            module.fail_json(msg="Section inconnue : %s" % section)
+        digest = hashlib.sha1()
+        probe_section(module, SECTION_PROBES[section], digest)
+        if section in module.params['extra']:
+            digest.update(('extra %s\n' % module.params['extra'][section]).encode('utf-8'))
+        probes[section] = digest.hexdigest()
+
+    # cmdb_report_merge n'enregistre l'empreinte que des sections présentes dans le rapport
+    # (rapport enregistré éventuellement compressé)
+    previous_probes = {}
+    if any(os.path.exists(os.path.join(state_dir, REPORT_FILE + ext)) for ext in EXTENSIONS.values()):
+        previous_probes = load_json(os.path.join(state_dir, STATE_FILE)) or {}
+
+    changed = []
+    unchanged = []
+    for section, value in sorted(probes.items()):
+        if previous_probes.get(section) == value:
+            unchanged.append(section)
+        else:
+            changed.append(section)
+
+    module.exit_json(changed=False, probes=probes, changed_sections=changed,
+                     unchanged_sections=unchanged)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_timing_rollup
+short_description: Récapitulatif à l'échelle du parc des durées de collecte CMDB
+description:
+  - Consolide les durées de collecte mesurées sur chaque serveur par le plugin de callback C(cmdb_timing) (fait C(cmdb_collection_timing)).
+  - Calcule, pour chaque section de collecte et pour la durée totale, les percentiles p50, p95 et p99 (rang le plus proche), la moyenne et le maximum, et liste les serveurs et les tâches les plus lents.
+  - Totalise la durée de collecte des faits évitée grâce au cache des faits (clé C(facts_cache) de chaque serveur, module C(cmdb_fact_cache)) et calcule les mêmes indicateurs pour la collecte de chaque sous-ensemble de faits (clé C(facts)).
+  - Écrit le récapitulatif au format JSON dans C(dest) (remplacement atomique) et, si C(run_id) est fourni, une copie horodatée à côté pour comparer les exécutions.
+  - À exécuter une seule fois (C(run_once: true)) sur le serveur repository.
+options:
+  records:
+    description: Durées de chaque serveur (C(host), C(total_seconds), C(sections), C(slowest_tasks), C(facts), C(facts_cache)).
+    type: list
+    elements: dict
+    required: true
+  dest:
+    description: Fichier JSON du récapitulatif.
+    type: path
+    required: true
+  run_id:
+    description: Identifiant de l'exécution, ajouté au récapitulatif et au nom de sa copie horodatée.
+    type: str
+  top:
+    description: Nombre de serveurs et de tâches les plus lents retenus.
+    type: int
+    default: 20
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Construire le récapitulatif des durées de collecte
+  cmdb_timing_rollup:
+    records: "{{ ansible_play_hosts | map('extract', hostvars) | selectattr('cmdb_collection_timing', 'defined') | map(attribute='cmdb_collection_timing') | list }}"
+    dest: /opt/cmdb/inventory/timing/fleet_timing.json
+    run_id: "20250101120000"
+  delegate_to: "{{ cmdb_inventory_repository_host }}"
+  run_once: true
+'''
+
+RETURN = r'''
+hosts:
+  description: Nombre de serveurs pris en compte.
+  returned: always
+  type: int
+total:
+  description: Percentiles (C(p50), C(p95), C(p99)), moyenne et maximum de la durée totale de collecte par serveur, en secondes.
+  returned: always
+  type: dict
+sections:
+  description: Mêmes indicateurs pour chaque section, avec le nombre de serveurs ayant collecté la section.
+  returned: always
+  type: dict
+facts:
+  description: Mêmes indicateurs pour la collecte de chaque sous-ensemble de faits, avec le nombre de serveurs l'ayant collecté.
+  returned: always
+  type: dict
+facts_cache:
+  description: Faits repris du cache (C(hosts) servis, C(saved_seconds) de collecte évitées au total, C(subsets) nombre de serveurs servis par sous-ensemble).
+  returned: always
+  type: dict
+slowest_hosts:
+  description: Serveurs les plus lents (C(host), C(total_seconds), C(slowest_section)).
+  returned: always
+  type: list
+slowest_tasks:
+  description:
+    - Tâches les plus lentes, classées par durée cumulée sur le parc (C(task), C(hosts), C(total_seconds), C(max_seconds), C(max_host)).
+    - Calculées à partir des tâches les plus lentes de chaque serveur (option C(top) du plugin de callback).
+  returned: always
+  type: list
+dest:
+  description: Chemin du récapitulatif écrit.
+  returned: always
+  type: str
+'''
+
+import json
+import math
+import os
+from datetime import datetime
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import write_atomic
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    # Méthode du rang le plus proche, sur des valeurs triées
+    index = int(math.ceil(rank / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+def distribution(values):
+    values = sorted(values)
+    if not values:
+        return {'hosts': 0}
+    result = {'hosts': len(values)}
+    for rank in PERCENTILES:
+        result['p%d' % rank] = round(percentile(values, rank), 3)
+    result['mean'] = round(sum(values) / len(values), 3)
+    result['max'] = round(values[-1], 3)
+    return result
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def rollup(records, top):
+    totals = []
+    sections = {}
+    tasks = {}
+    hosts = []
+    facts = {}
+    facts_cache = {'hosts': 0, 'saved_seconds': 0.0, 'subsets': {}}
+    for record in records:
+        host = record.get('host')
+        if not host:
+            continue
+        total = number(record.get('total_seconds'))
+        record_sections = record.get('sections') or {}
+        totals.append(total)
+        for name, seconds in record_sections.items():
+            sections.setdefault(name, []).append(number(seconds))
+        slowest_section = max(record_sections, key=lambda name: number(record_sections[name])) \
+            if record_sections else None
+        hosts.append({'host': host, 'total_seconds': round(total, 3), 'slowest_section': slowest_section})
+        for name, seconds in (record.get('facts') or {}).items():
+            facts.setdefault(name, []).append(number(seconds))
+        cache = record.get('facts_cache') or {}
+        if cache.get('cached'):
+            facts_cache['hosts'] += 1
+            facts_cache['saved_seconds'] += number(cache.get('saved_seconds'))
+            for name in cache['cached']:
+                facts_cache['subsets'][name] = facts_cache['subsets'].get(name, 0) + 1
+        for task in record.get('slowest_tasks') or []:
+            seconds = number(task.get('seconds'))
+            entry = tasks.setdefault(task.get('task'), {'task': task.get('task'), 'hosts': 0,
+                                                        'total_seconds': 0.0, 'max_seconds': 0.0,
+                                                        'max_host': None})
+            entry['hosts'] += 1
+            entry['total_seconds'] += seconds
+            if seconds >= entry['max_seconds']:
+                entry['max_seconds'] = seconds
+                entry['max_host'] = host
+
+    slowest_tasks = sorted(tasks.values(), key=lambda entry: entry['total_seconds'], reverse=True)[:top]
+    for entry in slowest_tasks:
+        entry['total_seconds'] = round(entry['total_seconds'], 3)
+        entry['max_seconds'] = round(entry['max_seconds'], 3)
+    facts_cache['saved_seconds'] = round(facts_cache['saved_seconds'], 3)
+    return {
+        'hosts': len(totals),
+        'total': distribution(totals),
+        'sections': dict((name, distribution(values)) for name, values in sections.items()),
+        'facts': dict((name, distribution(values)) for name, values in facts.items()),
+        'facts_cache': facts_cache,
+        'slowest_hosts': sorted(hosts, key=lambda entry: entry['total_seconds'], reverse=True)[:top],
+        'slowest_tasks': slowest_tasks,
+    }
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            records=dict(type='list', elements='dict', required=True),
+            dest=dict(type='path', required=True),
+            run_id=dict(type='str'),
+            top=dict(type='int', default=20),
+        ),
+        supports_check_mode=True,
+    )
+
+    dest = module.params['dest']
+    run_id = module.params['run_id']
+    result = rollup(module.params['records'], module.params['top'])
+    document = dict(result, run_id=run_id, generated=datetime.now().strftime('%Y-%m-%dT%H:%M:%S'))
+
+    if not module.check_mode:
+        content = json.dumps(document, indent=2, sort_keys=True)
+        try:
+            directory = os.path.dirname(dest)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, 0o755)
+            write_atomic(dest, content)
+            if run_id:
+                stem, ext = os.path.splitext(dest)
+                write_atomic('%s_%s%s' % (stem, run_id, ext), content)
+        except (IOError, OSError) as e:
+            module.fail_json(msg="Impossible d'écrire le récapitulatif %s : %s" % (dest, e))
+
+    module.exit_json(changed=not module.check_mode, dest=dest, **result)
+
+
+if __name__ == '__main__':
+    main()
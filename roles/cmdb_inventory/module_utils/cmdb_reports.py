@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+#
+# Fonctions communes aux modules CMDB manipulant les rapports d'inventaire :
+# lecture et écriture des rapports compressés par cmdb_report_pack, écriture
+# atomique et chemins ignorés dans la comparaison de deux rapports.
+#
+# Auteur : Philippe CANDIDO (@PhilCANDIDO)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import gzip
+import io
+import json
+import os
+import tempfile
+
+try:
+    import zstandard
+    HAS_ZSTANDARD = True
+except ImportError:
+    zstandard = None
+    HAS_ZSTANDARD = False
+
+# Extension du rapport selon sa compression : <hostname>_cmdb_inventory.json[.gz|.zst]
+EXTENSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSED_EXTENSIONS = tuple(ext for name, ext in sorted(EXTENSIONS.items()) if ext)
+
+# Chemins sans rapport avec l'état du serveur, ignorés pour décider si un rapport a changé
+HASH_IGNORE = ['inventory_id', 'collection_date', 'collection', 'security.updates_check',
+               'security.certificates.details.*.days_to_expiry']
+
+
+def compression_of(path):
+    for name, ext in EXTENSIONS.items():
+        if ext and path.endswith(ext):
+            return name
+    return 'none'
+
+
+def compress(content, compression, level=None):
+    if compression == 'gzip':
+        # mtime fixe : un rapport identique donne un fichier identique
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=level or 9, mtime=0) as f:
+            f.write(content)
+        return buf.getvalue()
+    if compression == 'zstd':
+        if not HAS_ZSTANDARD:
+            raise IOError("module Python zstandard absent, compression zstd impossible")
+        if level:
+            return zstandard.ZstdCompressor(level=level).compress(content)
+        return zstandard.ZstdCompressor().compress(content)
+    return content
+
+
+def read_report_content(path):
+    # Contenu JSON (octets) d'un rapport, décompressé selon son extension
+    with open(path, 'rb') as f:
+        content = f.read()
+    compression = compression_of(path)
+    if compression == 'gzip':
+        content = gzip.GzipFile(fileobj=io.BytesIO(content)).read()
+    elif compression == 'zstd':
+        if not HAS_ZSTANDARD:
+            raise IOError("module Python zstandard absent, rapport compressé en zstd illisible")
+        content = zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    return content
+
+
+def read_report(path):
+    return json.loads(read_report_content(path).decode('utf-8'))
+
+
+def write_atomic(path, content, mode=0o644):
+    # Fichier temporaire dans le même répertoire puis renommage
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.cmdb_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp, mode)
+        os.rename(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_report(path, report, compression=None, level=None):
+    # Compression déduite de l'extension du fichier si elle n'est pas précisée
+    content = json.dumps(report, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    write_atomic(path, compress(content, compression or compression_of(path), level))
+
+
+def strip_paths(node, parts):
+    # Retire un chemin ignoré ; « * » désigne chaque élément d'une liste ou chaque clé
+    if not parts:
+        return
+    key, rest = parts[0], parts[1:]
+    if isinstance(node, dict):
+        keys = list(node) if key == '*' else [key] if key in node else []
+        for name in keys:
+            if rest:
+                strip_paths(node[name], rest)
+            else:
+                del node[name]
+    elif isinstance(node, list) and key == '*':
+        for item in node:
+            strip_paths(item, rest)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# Requêtes indexées sur le repository d'inventaire CMDB
+#
+# Maintient un index SQLite des rapports <hostname>_cmdb_inventory.json[.gz|.zst] du
+# repository (nom d'hôte, environnement, criticité, distribution et version, noyau,
+# virtualisation, datacenter, adresses IP, dates d'expiration des certificats), mis à
+# jour à chaque appel pour les seuls rapports nouveaux, modifiés ou supprimés, puis
+# répond aux filtres sans relire les rapports.
+#
+# Usage: cmdb_query.py [--repository /opt/cmdb/inventory] [--env Production] [--kernel '5.14.0-362*']
+#                      [--datacenter DC-PARIS-01] [--ip 10.1.0.0/16] [--cert-expires-within 30]
+#                      [--format table|csv|json] [--count] [--refresh-only] [--no-refresh]
+import argparse
+import csv
+import fnmatch
+import gzip
+import ipaddress
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+# Décodeur JSON rapide optionnel
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Décompresseur zstd optionnel (rapports produits avec cmdb_report_packing.compression: zstd)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_REPOSITORY = '/opt/cmdb/inventory'
+REPORT_PATTERNS = ('*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst')
+
+# Version du schéma de l'index : à incrémenter à chaque modification des tables ou de
+# l'extraction (index_host), l'index est alors reconstruit
+INDEX_SCHEMA = 1
+
+# Nombre minimal de fichiers par processus lors de la mise à jour de l'index
+MIN_FILES_PER_WORKER = 50
+
+ISO_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Colonnes de la table hosts filtrables par une option de la ligne de commande :
+# (option, colonne, libellé affiché)
+HOST_FILTERS = (
+    ('hostname', 'hostname', 'Hostname'),
+    ('env', 'environment', 'Environnement'),
+    ('criticality', 'criticality', 'Criticité'),
+    ('distribution', 'distribution', 'Distribution'),
+    ('version', 'distribution_version', 'Version'),
+    ('kernel', 'kernel', 'Noyau'),
+    ('virtualization', 'virtualization', 'Virtualisation'),
+    ('datacenter', 'datacenter', 'Datacenter'),
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS hosts (filename TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+    "hostname TEXT, environment TEXT, criticality TEXT, distribution TEXT, "
+    "distribution_version TEXT, kernel TEXT, virtualization TEXT, datacenter TEXT, "
+    "ip TEXT, collection_date TEXT)",
+    # Adresses de toutes les interfaces ; value est l'adresse IPv4 sous forme d'entier
+    # (recherche d'un réseau par intervalle), NULL pour IPv6
+    "CREATE TABLE IF NOT EXISTS addresses (filename TEXT, address TEXT, value INTEGER)",
+    "CREATE TABLE IF NOT EXISTS certificates (filename TEXT, not_after TEXT, subject TEXT, path TEXT)",
+    "CREATE INDEX IF NOT EXISTS hosts_hostname ON hosts (hostname)",
+    "CREATE INDEX IF NOT EXISTS hosts_environment ON hosts (environment)",
+    "CREATE INDEX IF NOT EXISTS hosts_criticality ON hosts (criticality)",
+    "CREATE INDEX IF NOT EXISTS hosts_distribution ON hosts (distribution, distribution_version)",
+    "CREATE INDEX IF NOT EXISTS hosts_kernel ON hosts (kernel)",
+    "CREATE INDEX IF NOT EXISTS hosts_virtualization ON hosts (virtualization)",
+    "CREATE INDEX IF NOT EXISTS hosts_datacenter ON hosts (datacenter)",
+    "CREATE INDEX IF NOT EXISTS addresses_filename ON addresses (filename)",
+    "CREATE INDEX IF NOT EXISTS addresses_address ON addresses (address)",
+    "CREATE INDEX IF NOT EXISTS addresses_value ON addresses (value)",
+    "CREATE INDEX IF NOT EXISTS certificates_filename ON certificates (filename)",
+    "CREATE INDEX IF NOT EXISTS certificates_not_after ON certificates (not_after)",
+)
+
+def read_report(path):
+    # Reports packed on the host by cmdb_report_pack are gzip or zstd compressed
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+    with open(path, 'rb') as f:
+        content = f.read()
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError("module zstandard absent, rapport compressé en zstd illisible")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    return content
+
+def openssl_date_to_iso(value):
+    # Reports collected before cmdb_cert_scanner: "Dec 28 23:59:59 2024 GMT"
+    try:
+        return datetime.strptime(value, '%b %d %H:%M:%S %Y GMT').strftime(ISO_DATE_FORMAT)
+    except ValueError:
+        return value
+
+def host_certificates(sec):
+    rows = []
+    for cert in (sec.get('certificates') or {}).get('details') or []:
+        if cert.get('not_after'):
+            # Compact records produced by the cmdb_cert_scanner module
+            rows.append((cert['not_after'], cert.get('subject', ''), cert.get('path', 'N/A')))
+        elif cert.get('stdout') or cert.get('stdout_lines'):
+            # Raw openssl register results of reports collected by older role versions
+            fields = {}
+            for line in cert.get('stdout_lines') or cert.get('stdout', '').splitlines():
+                key, sep, value = line.partition('=')
+                if sep:
+                    fields[key] = value
+            if fields.get('notAfter'):
+                rows.append((openssl_date_to_iso(fields['notAfter']), fields.get('subject', ''),
+                             (cert.get('item') or {}).get('path', 'N/A')))
+    return rows
+
+def host_addresses(net):
+    addresses = set()
+    if (net.get('default_ipv4') or {}).get('address'):
+        addresses.add(net['default_ipv4']['address'])
+    for iface in net.get('interfaces') or []:
+        ipv4 = iface.get('ipv4') or {}
+        if isinstance(ipv4, dict) and ipv4.get('address'):
+            addresses.add(ipv4['address'])
+        for ipv6 in iface.get('ipv6') or []:
+            if isinstance(ipv6, dict) and ipv6.get('address'):
+                addresses.add(ipv6['address'])
+    rows = []
+    for address in sorted(addresses):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            continue
+        rows.append((str(ip), int(ip) if ip.version == 4 else None))
+    return rows
+
+def index_host(path):
+    # Parse in the worker so only the indexed fields travel back
+    try:
+        server = loads(read_report(path))
+        if not isinstance(server, dict):
+            raise ValueError("document d'inventaire invalide")
+        hw_system = (server.get('hardware') or {}).get('system') or {}
+        sw = server.get('software') or {}
+        os_info = sw.get('os') or {}
+        net = server.get('network') or {}
+        org = server.get('organizational') or {}
+        addresses = host_addresses(net)
+        host = (server.get('hostname', 'N/A'), org.get('environment', 'N/A'),
+                org.get('criticality', 'N/A'), os_info.get('distribution', 'N/A'),
+                os_info.get('distribution_version', 'N/A'), (sw.get('kernel') or {}).get('name', 'N/A'),
+                hw_system.get('virtualization_type', 'N/A'), org.get('datacenter', 'N/A'),
+                (net.get('default_ipv4') or {}).get('address') or (addresses[0][0] if addresses else 'N/A'),
+                server.get('collection_date', 'N/A'))
+        return path, (host, addresses, host_certificates(server.get('security') or {})), None
+    except Exception as e:
+        return path, None, e
+
+def open_index(index_file):
+    os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+    db = sqlite3.connect(index_file, timeout=30)
+    for statement in SCHEMA:
+        db.execute(statement)
+    row = db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+    if row is None or row[0] != str(INDEX_SCHEMA):
+        # Schéma différent : l'index est entièrement reconstruit
+        with db:
+            for table in ('hosts', 'addresses', 'certificates', 'meta'):
+                db.execute(f"DELETE FROM {table}")
+            db.execute("INSERT INTO meta VALUES ('schema', ?)", (str(INDEX_SCHEMA),))
+    return db
+
+def refresh_index(db, reports_dir, workers=0, full_scan=False):
+    """Met à jour l'index pour les rapports nouveaux, modifiés ou supprimés.
+
+    Le repository dépose les rapports par renommage (cmdb_repository_ingest) : tant que
+    la date de modification du répertoire est inchangée, aucun rapport n'est relu.
+    """
+    reports_mtime = str(os.stat(reports_dir).st_mtime_ns)
+    row = db.execute("SELECT value FROM meta WHERE key = 'reports_mtime_ns'").fetchone()
+    if row is not None and row[0] == reports_mtime and not full_scan:
+        return None
+
+    indexed = {filename: (mtime_ns, size) for filename, mtime_ns, size
+               in db.execute("SELECT filename, mtime_ns, size FROM hosts")}
+    stats = {}
+    for entry in os.scandir(reports_dir):
+        if entry.is_file() and any(fnmatch.fnmatch(entry.name, pattern) for pattern in REPORT_PATTERNS):
+            stat = entry.stat()
+            stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    to_parse = [os.path.join(reports_dir, name) for name, stat in stats.items() if indexed.get(name) != stat]
+    removed = [name for name in indexed if name not in stats]
+
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    workers = max(1, min(workers, len(to_parse) // MIN_FILES_PER_WORKER))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(index_host, to_parse,
+                                        chunksize=max(1, len(to_parse) // (workers * 8))))
+    else:
+        results = [index_host(path) for path in to_parse]
+
+    errors = 0
+    with db:
+        for name in removed + [os.path.basename(path) for path in to_parse]:
+            for table in ('hosts', 'addresses', 'certificates'):
+                db.execute(f"DELETE FROM {table} WHERE filename = ?", (name,))
+        for path, values, error in results:
+            name = os.path.basename(path)
+            if error is not None:
+                # Fichier illisible : signalé, puis relu à sa prochaine modification
+                print(f"AVERTISSEMENT: {name} ignoré: {error}", file=sys.stderr)
+                errors += 1
+                continue
+            host, addresses, certificates = values
+            db.execute("INSERT INTO hosts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (name,) + stats[name] + host)
+            db.executemany("INSERT INTO addresses VALUES (?, ?, ?)",
+                           ((name,) + address for address in addresses))
+            db.executemany("INSERT INTO certificates VALUES (?, ?, ?, ?)",
+                           ((name,) + certificate for certificate in certificates))
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('reports_mtime_ns', ?)", (reports_mtime,))
+    return len(to_parse) - errors, len(removed), errors
+
+def match_clause(column, value):
+    # Motifs shell (*, ?, [...]) : GLOB, qui utilise l'index tant que le motif a un préfixe fixe
+    if any(char in value for char in '*?['):
+        return f"h.{column} GLOB ?", value
+    return f"h.{column} = ?", value
+
+def ip_clause(value):
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise SystemExit(f"ERREUR: Adresse ou réseau IP invalide: {value}")
+    if network.num_addresses == 1:
+        return "a.address = ?", [str(network.network_address)]
+    if network.version != 4:
+        raise SystemExit("ERREUR: Seuls les réseaux IPv4 sont acceptés, les adresses IPv6 sont recherchées exactement")
+    return "a.value BETWEEN ? AND ?", [int(network.network_address), int(network.broadcast_address)]
+
+def build_query(args):
+    columns = [f"h.{column}" for _, column, _ in HOST_FILTERS] + ["h.ip"]
+    labels = [label for _, _, label in HOST_FILTERS] + ["Adresse IP"]
+    joins = []
+    where = []
+    params = []
+    for option, column, _ in HOST_FILTERS:
+        value = getattr(args, option)
+        if value is not None:
+            clause, param = match_clause(column, value)
+            where.append(clause)
+            params.append(param)
+    if args.ip:
+        clause, ip_params = ip_clause(args.ip)
+        joins.append("JOIN addresses a ON a.filename = h.filename")
+        where.append(clause)
+        params.extend(ip_params)
+    now = datetime.utcnow()
+    if args.cert_expires_within is not None or args.cert_expired:
+        # Dates ISO 8601 UTC, comparées comme du texte par l'index certificates_not_after
+        joins.append("JOIN certificates c ON c.filename = h.filename")
+        if args.cert_expired:
+            where.append("c.not_after < ?")
+            params.append(now.strftime(ISO_DATE_FORMAT))
+        else:
+            where.append("c.not_after BETWEEN ? AND ?")
+            params.extend([now.strftime(ISO_DATE_FORMAT),
+                           (now + timedelta(days=args.cert_expires_within)).strftime(ISO_DATE_FORMAT)])
+        columns += ["MIN(c.not_after)", "COUNT(DISTINCT c.rowid)"]
+        labels += ["Première expiration", "Certificats"]
+    sql = f"SELECT {', '.join(columns)} FROM hosts h {' '.join(joins)}"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    sql += " GROUP BY h.filename ORDER BY h.hostname"
+    if args.limit:
+        sql += f" LIMIT {int(args.limit)}"
+    return sql, params, labels
+
+def print_rows(labels, rows, output_format):
+    if output_format == 'json':
+        print(json.dumps([dict(zip(labels, row)) for row in rows], ensure_ascii=False, indent=2))
+    elif output_format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(labels)
+        writer.writerows(rows)
+    else:
+        rows = [["" if value is None else str(value) for value in row] for row in rows]
+        widths = [max([len(label)] + [len(row[i]) for row in rows]) for i, label in enumerate(labels)]
+        for row in [labels] + rows:
+            print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Requêtes indexées sur les rapports du repository d'inventaire CMDB. "
+                    "Les filtres se combinent (ET) et acceptent les motifs shell (*, ?, [...]).")
+    parser.add_argument('--repository', default=DEFAULT_REPOSITORY,
+                        help=f"Répertoire du repository (défaut: {DEFAULT_REPOSITORY})")
+    parser.add_argument('--index', help="Fichier de l'index (défaut: <repository>/cache/query_index.sqlite)")
+    for option, _, label in HOST_FILTERS:
+        parser.add_argument(f'--{option}', help=label)
+    parser.add_argument('--ip', help="Adresse IP exacte ou réseau IPv4 (CIDR) d'une interface")
+    parser.add_argument('--cert-expires-within', type=int, metavar='JOURS',
+                        help="Serveurs ayant un certificat expirant dans les N prochains jours")
+    parser.add_argument('--cert-expired', action='store_true', help="Serveurs ayant un certificat expiré")
+    parser.add_argument('--format', choices=['table', 'csv', 'json'], default='table')
+    parser.add_argument('--count', action='store_true', help="Afficher uniquement le nombre de serveurs")
+    parser.add_argument('--limit', type=int, default=0)
+    parser.add_argument('--refresh-only', action='store_true', help="Mettre à jour l'index sans requête")
+    parser.add_argument('--no-refresh', action='store_true', help="Interroger l'index sans le mettre à jour")
+    parser.add_argument('--full-scan', action='store_true',
+                        help="Comparer tous les rapports à l'index, même si le répertoire est inchangé")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Processus de lecture des rapports modifiés (0 = nombre de CPU)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    reports_dir = os.path.join(args.repository, 'reports')
+    index_file = args.index or os.path.join(args.repository, 'cache', 'query_index.sqlite')
+    if not os.path.isdir(reports_dir):
+        print(f"ERREUR: Le répertoire {reports_dir} n'existe pas!", file=sys.stderr)
+        return 1
+
+    db = open_index(index_file)
+    try:
+        if not args.no_refresh:
+            start = time.perf_counter()
+            refreshed = refresh_index(db, reports_dir, args.workers, args.full_scan)
+            if refreshed is not None:
+                updated, removed, errors = refreshed
+                print(f"Index: {updated} rapports indexés, {removed} supprimés, {errors} illisibles "
+                      f"({time.perf_counter() - start:.2f} s)", file=sys.stderr)
+        if args.refresh_only:
+            return 0
+
+        sql, params, labels = build_query(args)
+        rows = db.execute(sql, params).fetchall()
+        if args.count:
+            print(len(rows))
+        else:
+            print_rows(labels, rows, args.format)
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,46 @@
 #!/usr/bin/env python3
+import csv
+import fnmatch
+import gc
+import gzip
+import hashlib
+import itertools
 import json
+import mmap
 import os
+import re
+import sqlite3
+import struct
 import sys
+import unicodedata
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 try:
     import openpyxl
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     from openpyxl.utils import get_column_letter
 except ImportError:
-    print("Le module openpyxl n'est pas installé. Tentative d'installation...")
-    try:
-        import subprocess
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "openpyxl"])
-        import openpyxl
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.utils import get_column_letter
-        print("openpyxl a été installé avec succès!")
-    except Exception as e:
-        print(f"Échec de l'installation de openpyxl: {e}")
-        print("Assurez-vous que le package 'python3-venv' est installé sur votre système.")
-        print("Conseil: Exécutez 'sudo apt install python3-venv python3-full' avant de relancer le playbook.")
-        sys.exit(1)
+    # Les dépendances sont installées par le rôle dans l'environnement Python du rapport
+    # (cmdb_report_runtime) : aucune installation au lancement du script
+    print(f"Le module openpyxl n'est pas installé pour {sys.executable}.")
+    print("Exécutez le script avec l'environnement Python du rapport (<repository>/runtime/venv-*/bin/python) "
+          "ou installez openpyxl.")
+    sys.exit(1)
+
+# Décodeur JSON rapide optionnel
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Décompresseur zstd optionnel (rapports produits avec cmdb_report_packing.compression: zstd)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def load_config():
     config_path = sys.argv[1] if len(sys.argv) > 1 else 'report_config.json'
@@ -31,8 +51,14 @@ def load_config():
         print(f"Erreur lors du chargement de la configuration: {e}")
         sys.exit(1)
 
-def load_data(config):
-    data = []
+# Nombre minimal de fichiers par processus : en dessous, le coût de démarrage
+# du pool dépasse le gain du chargement parallèle
+MIN_FILES_PER_WORKER = 50
+
+# Configuration transmise une seule fois à chaque processus de chargement
+_worker_config = None
+
+def list_json_files(config):
     data_dir = config.get('data_dir', 'json')
     
     # Vérifier si le répertoire existe
@@ -41,36 +67,356 @@ def load_data(config):
         sys.exit(1)
     
     # Vérifier si des fichiers JSON existent dans le répertoire
-    json_files = [f for f in os.listdir(data_dir) if f.endswith('.json')]
+    patterns = config.get('file_pattern', '*.json')
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    json_files = sorted(f for f in os.listdir(data_dir)
+                        if any(fnmatch.fnmatch(f, pattern) for pattern in patterns))
+    if config.get('server_limit', 0) > 0:
+        json_files = json_files[:config['server_limit']]
     if not json_files:
         print(f"ERREUR: Aucun fichier JSON trouvé dans {data_dir}")
         sys.exit(1)
     
-    # Charger les fichiers JSON
-    for filename in json_files:
+    return [os.path.join(data_dir, f) for f in json_files]
+
+def json_decoder(config):
+    # orjson est utilisé s'il est installé, sauf si json_decoder vaut "json"
+    if orjson is not None and config.get('json_decoder', 'auto') != 'json':
+        return 'orjson', orjson.loads
+    return 'json', json.loads
+
+def load_workers(config, file_count):
+    workers = int(config.get('load_workers', 0))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, file_count // MIN_FILES_PER_WORKER))
+
+def init_load_worker(config):
+    global _worker_config
+    _worker_config = dict(config, _sheets=enabled_sheets(config), _decoder=json_decoder(config)[1])
+
+def read_report(path):
+    # Reports packed on the host by cmdb_report_pack are gzip or zstd compressed
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+    with open(path, 'rb') as f:
+        content = f.read()
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError("module zstandard absent, rapport compressé en zstd illisible")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    return content
+
+def load_host_worker(path):
+    # Parse and extract in the worker so only the compact rows travel back
+    try:
+        server = _worker_config['_decoder'](read_report(path))
+        return path, extract_host(server, _worker_config['_sheets'], _worker_config), None
+    except Exception as e:
+        return path, None, e
+
+def load_report(config):
+    return build_report(config, load_records(config))
+
+def load_records(config):
+    # A fleet snapshot, when available, replaces the N per-host files
+    snapshot_file = fresh_snapshot(config)
+    if snapshot_file:
         try:
-            with open(os.path.join(data_dir, filename), 'r') as f:
-                data.append(json.load(f))
-        except Exception as e:
-            print(f"Erreur lors du chargement du fichier {filename}: {e}")
+            return load_snapshot(config, snapshot_file)
+        except (OSError, ValueError, KeyError, zlib.error) as e:
+            print(f"AVERTISSEMENT: Instantané {snapshot_file} illisible, lecture des fichiers JSON: {e}")
+    
+    paths = list_json_files(config)
+    
+    # Only new or modified files are parsed, the others come from the cache
+    cache = open_cache(config)
+    cached = cache_lookup(cache, config) if cache else {}
+    stats = {path: os.stat(path) for path in paths}
+    records = {}
+    to_parse = []
+    for path in paths:
+        entry = cached.get(os.path.basename(path))
+        if entry and entry[0] == stats[path].st_mtime_ns and entry[1] == stats[path].st_size:
+            records[path] = entry[2]
+        else:
+            to_parse.append(path)
+    workers = load_workers(config, len(to_parse))
+    
+    def collect(results):
+        for path, record, error in results:
+            if error is not None:
+                print(f"Erreur lors du chargement du fichier {os.path.basename(path)}: {error}")
+                continue
+            records[path] = record
+    
+    # Charger les fichiers JSON
+    if workers > 1:
+        chunksize = max(1, len(to_parse) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_load_worker,
+                                 initargs=(config,)) as executor:
+            collect(executor.map(load_host_worker, to_parse, chunksize=chunksize))
+    else:
+        init_load_worker(config)
+        collect(map(load_host_worker, to_parse))
+    
+    # Keep the order of the directory listing whatever the record's origin
+    loaded = [records[path] for path in paths if path in records]
     
-    return data
+    if cache:
+        parsed = [path for path in to_parse if path in records]
+        removed = cache_update(cache, parsed, records, stats, cached, paths)
+        cache.close()
+        print(f"Cache: {len(records) - len(parsed)} serveurs réutilisés, {len(parsed)} analysés, "
+              f"{removed} supprimés")
+    
+    print(f"{len(loaded)}/{len(paths)} fichiers JSON chargés "
+          f"({workers} processus, décodeur {json_decoder(config)[0]})")
+    return loaded
+
+# Instantané columnaire du parc produit par le module cmdb_fleet_snapshot du rôle
+# cmdb_inventory (voir ce module pour la description complète du format)
+SNAPSHOT_MAGIC = b'CMDBSNP1'
+SNAPSHOT_VERSION = 1
+
+# Columns of the child tables actually read by extract_host(): the others (fingerprint,
+# days to expiry, Ansible register noise of legacy reports) are never decompressed
+SNAPSHOT_COLUMNS = {
+    'certificates': {'_host', 'subject', 'issuer', 'not_before', 'not_after', 'path',
+                     'stdout', 'stdout_lines', 'item'},
+}
+
+def fresh_snapshot(config):
+    snapshot_file = config.get('snapshot_file')
+    if not snapshot_file or not os.path.exists(snapshot_file):
+        return None
+    # Reports are copied with an atomic rename: any report added, replaced or
+    # removed after the snapshot was built updates the directory mtime
+    data_dir = config.get('data_dir', 'json')
+    if os.path.isdir(data_dir) and os.path.getmtime(snapshot_file) < os.path.getmtime(data_dir):
+        print(f"Instantané {snapshot_file} plus ancien que les rapports, lecture des fichiers JSON")
+        return None
+    return snapshot_file
+
+def read_snapshot(snapshot_file, loads=json.loads):
+    # Returns the index and a function decoding one column of the memory-mapped file
+    with open(snapshot_file, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    trailer = len(SNAPSHOT_MAGIC) + 8
+    if len(data) < len(SNAPSHOT_MAGIC) + trailer or data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC \
+            or data[-len(SNAPSHOT_MAGIC):] != SNAPSHOT_MAGIC:
+        raise ValueError("format d'instantané inconnu")
+    footer_length = struct.unpack('<Q', data[-trailer:-len(SNAPSHOT_MAGIC)])[0]
+    footer_end = len(data) - trailer
+    index = json.loads(zlib.decompress(data[footer_end - footer_length:footer_end]))
+    if index.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"version d'instantané {index.get('version')} non prise en charge")
+    
+    def column(entry):
+        values = loads(zlib.decompress(data[entry['offset']:entry['offset'] + entry['length']]))
+        present = None
+        if entry['missing']:
+            present = [True] * len(values)
+            for start, end in entry['missing']:
+                present[start:end] = [False] * (end - start)
+        return tuple(entry['path']), values, present
+    
+    return index, column
+
+def snapshot_rows(columns, rows):
+    # One dict per row from (key, values, present) columns; absent keys are dropped
+    keys = [key for key, values, present in columns]
+    items = [dict(zip(keys, row)) for row in zip(*(values[:rows] for key, values, present in columns))] \
+        if columns else [{} for _ in range(rows)]
+    for key, values, present in columns:
+        if present is not None:
+            for row, item in enumerate(items):
+                if not present[row]:
+                    del item[key]
+    return items
+
+def snapshot_documents(index, column, limit=0):
+    # Rebuild the per-host documents from the hosts table and its child tables
+    rows = index['tables']['hosts']['rows']
+    if limit > 0:
+        rows = min(rows, limit)
+    
+    # Host columns are grouped by parent path: each nested dict is built in one
+    # pass, then attached to its parent, deepest levels first
+    groups = {(): []}
+    for path, values, present in map(column, index['tables']['hosts']['columns']):
+        groups.setdefault(path[:-1], []).append((path[-1], values, present))
+        for depth in range(1, len(path) - 1):
+            groups.setdefault(path[:depth], [])
+    levels = {parent: snapshot_rows(columns, rows) for parent, columns in groups.items()}
+    for parent in sorted(levels, key=len, reverse=True):
+        if parent:
+            for doc, value in zip(levels[parent[:-1]], levels[parent]):
+                # Sections absent from the original document stay absent
+                if value:
+                    doc[parent[-1]] = value
+    docs = levels[()]
+    
+    for name, child_path in index['child_tables'].items():
+        table = index['tables'][name]
+        if not table['rows']:
+            continue
+        wanted = SNAPSHOT_COLUMNS.get(name)
+        columns = [column(entry) for entry in table['columns']
+                   if wanted is None or entry['path'][0] in wanted]
+        hosts = next(values for path, values, present in columns if path == ('_host',))
+        items = snapshot_rows([(path[0], values, present) for path, values, present in columns
+                               if path != ('_host',)], table['rows'])
+        if any(path == ('_value',) for path, values, present in columns):
+            # Scalar elements of the original list
+            items = [item['_value'] if '_value' in item else item for item in items]
+        for host, item in zip(hosts, items):
+            if host < rows:
+                doc = docs[host]
+                for key in child_path[:-1]:
+                    doc = doc.setdefault(key, {})
+                doc[child_path[-1]].append(item)
+    return docs
+
+def load_snapshot(config, snapshot_file):
+    index, column = read_snapshot(snapshot_file, json_decoder(config)[1])
+    sheets = enabled_sheets(config)
+    
+    # Hundreds of thousands of acyclic containers are created at once: the cyclic
+    # garbage collector would rescan them over and over for nothing
+    gc.disable()
+    try:
+        records = [extract_host(doc, sheets, config)
+                   for doc in snapshot_documents(index, column, config.get('server_limit', 0))]
+    finally:
+        gc.enable()
+    print(f"{len(records)} serveurs chargés depuis l'instantané {snapshot_file} "
+          f"(créé le {index.get('created')})")
+    return records
+
+# Version du format des enregistrements en cache : à incrémenter à chaque
+# modification de l'extraction (extract_host) ou des enregistrements typés
+CACHE_SCHEMA = 3
+
+def cache_signature(config):
+    # Cached rows depend on the enabled sheets and on the date format
+    settings = {'schema': CACHE_SCHEMA, 'sheets': enabled_sheets(config),
+                'date_format': config.get('date_format', '%d/%m/%Y %H:%M:%S')}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def open_cache(config):
+    cache_file = config.get('cache_file')
+    if not cache_file:
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        cache = sqlite3.connect(cache_file, timeout=30)
+        cache.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        cache.execute("CREATE TABLE IF NOT EXISTS hosts (filename TEXT PRIMARY KEY, "
+                      "mtime_ns INTEGER, size INTEGER, record TEXT)")
+        return cache
+    except (OSError, sqlite3.Error) as e:
+        print(f"AVERTISSEMENT: Cache {cache_file} inutilisable, analyse complète: {e}")
+        return None
+
+def cache_lookup(cache, config):
+    signature = cache_signature(config)
+    row = cache.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+    if row is None or row[0] != signature:
+        # Configuration ou format différent : le cache est entièrement reconstruit
+        with cache:
+            cache.execute("DELETE FROM hosts")
+            cache.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+        return {}
+    
+    decode = json_decoder(config)[1]
+    return {filename: (mtime_ns, size, record_from_json(decode(record)))
+            for filename, mtime_ns, size, record
+            in cache.execute("SELECT filename, mtime_ns, size, record FROM hosts")}
+
+def cache_update(cache, parsed, records, stats, cached, paths):
+    current = {os.path.basename(path) for path in paths}
+    removed = [(filename,) for filename in cached if filename not in current]
+    with cache:
+        cache.executemany(
+            "INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?)",
+            ((os.path.basename(path), stats[path].st_mtime_ns, stats[path].st_size,
+              record_to_json(records[path])) for path in parsed))
+        cache.executemany("DELETE FROM hosts WHERE filename = ?", removed)
+    return len(removed)
+
+# Styles partagés : instanciés une seule fois puis réutilisés par toutes les cellules
+HEADER_FONT = Font(bold=True, color='FFFFFF')
+HEADER_FILL = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+THIN_SIDE = Side(style='thin', color='000000')
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+ALERT_FILL = PatternFill(start_color='FFAAAA', end_color='FFAAAA', fill_type='solid')
+TITLE_FONT = Font(bold=True, size=14)
+SECTION_FONT = Font(bold=True)
+
+# Nombre de lignes utilisées pour estimer la largeur des colonnes en mode streaming
+DEFAULT_WIDTH_SAMPLE_ROWS = 1000
+
+def is_streaming(config):
+    return config.get('engine', 'standard') == 'streaming'
+
+def create_workbook(config):
+    # Le mode streaming utilise des feuilles "write-only" : les lignes sont
+    # sérialisées au fil de l'eau au lieu d'être conservées en mémoire
+    if is_streaming(config):
+        return openpyxl.Workbook(write_only=True)
+    
+    wb = openpyxl.Workbook()
+    
+    # Remove default sheet
+    if "Sheet" in wb.sheetnames:
+        del wb["Sheet"]
+    return wb
+
+def styled_cell(ws, value, font=None, fill=None, alignment=None, border=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if alignment is not None:
+        cell.alignment = alignment
+    if border is not None:
+        cell.border = border
+    return cell
+
+def header_cells(ws, headers):
+    return [styled_cell(ws, header, font=HEADER_FONT, fill=HEADER_FILL,
+                        alignment=HEADER_ALIGNMENT, border=THIN_BORDER)
+            for header in headers]
+
+def highlight_cells(ws, row, highlight):
+    if not highlight:
+        return row
+    
+    row = list(row)
+    for idx, predicate in highlight.items():
+        if idx < len(row) and predicate(row[idx]):
+            row[idx] = styled_cell(ws, row[idx], fill=ALERT_FILL)
+    return row
+
+def merge_row(ws, ref):
+    # Les feuilles write-only n'exposent pas merge_cells(), seulement la liste des plages
+    if hasattr(ws, 'merge_cells'):
+        ws.merge_cells(ref)
+    else:
+        ws.merged_cells.add(ref)
 
 def format_header(ws, row=1):
     for col in range(1, ws.max_column + 1):
         cell = ws.cell(row=row, column=col)
-        cell.font = Font(bold=True, color='FFFFFF')
-        cell.fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        # Add borders
-        thin_border = Border(
-            left=Side(style='thin', color='000000'),
-            right=Side(style='thin', color='000000'),
-            top=Side(style='thin', color='000000'),
-            bottom=Side(style='thin', color='000000')
-        )
-        cell.border = thin_border
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = HEADER_ALIGNMENT
+        cell.border = THIN_BORDER
 
 def adjust_column_width(ws):
     for col in range(1, ws.max_column + 1):
@@ -85,563 +431,863 @@ def adjust_column_width(ws):
         adjusted_width = (max_length + 2) * 1.2
         ws.column_dimensions[column].width = min(adjusted_width, 50)
 
-def create_summary_sheet(wb, data, config):
-    if not config.get('sheets', {}).get('summary', True):
-        return
+def set_column_widths(ws, rows):
+    # Equivalent of adjust_column_width() computed from plain row values, as
+    # write-only sheets need their column dimensions before the first row
+    max_lengths = {}
+    for row in rows:
+        for col, value in enumerate(row, 1):
+            length = len(str(value)) if value is not None else 0
+            if length > max_lengths.get(col, 0):
+                max_lengths[col] = length
+    for col, max_length in max_lengths.items():
+        ws.column_dimensions[get_column_letter(col)].width = min((max_length + 2) * 1.2, 50)
+
+# Nombre maximal de lignes d'une feuille Excel, en-tête compris
+XLSX_MAX_ROWS = 1048576
+
+# Formats des exports tabulaires compressés (gzip)
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+def export_format(config):
+    fmt = config.get('export_format', 'none')
+    return fmt if fmt in EXPORT_FORMATS else None
+
+def slugify(title):
+    slug = unicodedata.normalize('NFKD', str(title)).encode('ascii', 'ignore').decode().lower()
+    return re.sub(r'[^a-z0-9]+', '_', slug).strip('_')
+
+def register_export(config, title, fmt, spilled=False):
+    # Exports listed, with a link, at the end of the summary sheet
+    output_file = os.path.abspath(config.get('output_file', 'cmdb_inventory_report.xlsx'))
+    output_dir = os.path.dirname(output_file)
+    export_dir = config.get('export_dir') or os.path.join(
+        output_dir, f"{os.path.splitext(os.path.basename(output_file))[0]}_exports")
+    path = os.path.abspath(os.path.join(export_dir, f"{slugify(title)}.{fmt}.gz"))
+    # Relative link when the exports sit next to the workbook, absolute path otherwise
+    link = os.path.relpath(path, output_dir) if path.startswith(output_dir + os.sep) else path
+    export = {'sheet': title, 'format': fmt, 'path': path, 'link': link, 'rows': 0, 'spilled': spilled}
+    config.setdefault('_exports', []).append(export)
+    return export
+
+def export_rows(export, headers, rows):
+    # Each row is written to the gzip file as it is yielded: exporting a sheet
+    # alongside the workbook keeps a single pass over the rows
+    os.makedirs(os.path.dirname(export['path']), exist_ok=True)
+    with gzip.open(export['path'], 'wt', encoding='utf-8', newline='', compresslevel=6) as f:
+        if export['format'] == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            write = writer.writerow
+        else:
+            def write(row):
+                f.write(json.dumps(dict(zip(headers, row)), ensure_ascii=False, default=str))
+                f.write('\n')
+        for row in rows:
+            write(row)
+            export['rows'] += 1
+            yield row
+
+def split_oversized(rows, limit):
+    # Lists are measured directly, other iterables are buffered up to the limit only
+    if hasattr(rows, '__len__'):
+        return rows, len(rows) > limit
+    rows = iter(rows)
+    head = list(itertools.islice(rows, limit + 1))
+    if len(head) <= limit:
+        return head, False
+    return itertools.chain(head, rows), True
+
+def link_cell(ws, value, target):
+    cell = styled_cell(ws, value)
+    cell.hyperlink = target
+    return cell
+
+def anchor_links(ws):
+    # A link set on a detached cell points at A1: re-anchor it once the cell is placed
+    for row in ws.iter_rows():
+        for cell in row:
+            if cell.hyperlink:
+                cell.hyperlink = cell.hyperlink.target
+
+def write_table(wb, title, headers, rows, config, highlight=None):
+    fmt = export_format(config)
+    if fmt and config.get('export_only', False):
+        # Tables exported to files only, the workbook keeps the summary
+        deque(export_rows(register_export(config, title, fmt), headers, rows), maxlen=0)
+        return None
     
-    ws = wb.create_sheet("Résumé")
+    limit = int(config.get('max_sheet_rows', XLSX_MAX_ROWS - 1))
+    rows, oversized = split_oversized(rows, limit)
+    if oversized:
+        # Too many rows for a sheet: the whole table is spilled to a file
+        export = register_export(config, title, fmt or config.get('spill_format', 'csv'), spilled=True)
+        deque(export_rows(export, headers, rows), maxlen=0)
+        ws = wb.create_sheet(title)
+        ws.append([link_cell(ws, f"{export['rows']} lignes, au-delà de la limite de {limit} lignes "
+                                 f"d'une feuille : onglet exporté dans {export['link']}", export['link'])])
+        if not is_streaming(config):
+            anchor_links(ws)
+        print(f"AVERTISSEMENT: Onglet {title} exporté dans {export['path']} ({export['rows']} lignes)")
+        return ws
+    if fmt:
+        rows = export_rows(register_export(config, title, fmt), headers, rows)
     
-    # Calculate counts by OS, environment and virtualization type
-    os_count = {}
-    env_count = {}
-    virt_count = {}
-    servers_with_updates = 0
-    critical_servers = 0
-    servers_with_expired_certs = 0
-    
-    for server in data:
-        # Count by OS
-        os_name = f"{server['software']['os']['distribution']} {server['software']['os']['distribution_version']}"
-        os_count[os_name] = os_count.get(os_name, 0) + 1
-        
-        # Count by environment
-        env = server['organizational']['environment']
-        env_count[env] = env_count.get(env, 0) + 1
-        
-        # Count by virtualization
-        virt = server['hardware']['system']['virtualization_type']
-        virt_count[virt] = virt_count.get(virt, 0) + 1
-        
-        # Count servers with updates
-        if isinstance(server['security'].get('updates_available'), int) and server['security'].get('updates_available', 0) > 0:
-            servers_with_updates += 1
+    ws = wb.create_sheet(title)
+    
+    if is_streaming(config):
+        # Only a bounded sample of rows is kept in memory to size the columns
+        rows = iter(rows)
+        sample_size = int(config.get('width_sample_rows', DEFAULT_WIDTH_SAMPLE_ROWS))
+        sample = list(itertools.islice(rows, sample_size))
+        set_column_widths(ws, [headers] + sample)
         
-        # Count critical servers
-        if server['organizational'].get('criticality') == 'Critique':
-            critical_servers += 1
+        ws.append(header_cells(ws, headers))
+        for row in itertools.chain(sample, rows):
+            ws.append(highlight_cells(ws, row, highlight))
+        return ws
+    
+    ws.append(headers)
+    format_header(ws)
+    for row in rows:
+        ws.append(highlight_cells(ws, row, highlight))
+    
+    adjust_column_width(ws)
+    return ws
+
+def has_updates(value):
+    return isinstance(value, int) and value > 0
+
+# Certificate dates are ISO 8601 UTC strings, compared as text
+ISO_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+NOW_ISO = datetime.utcnow().strftime(ISO_DATE_FORMAT)
+
+def is_expired(valid_to):
+    return bool(valid_to) and valid_to < NOW_ISO
+
+def openssl_date_to_iso(value):
+    # Reports collected before cmdb_cert_scanner: "Dec 28 23:59:59 2024 GMT"
+    try:
+        return datetime.strptime(value, '%b %d %H:%M:%S %Y GMT').strftime(ISO_DATE_FORMAT)
+    except ValueError:
+        return value
+
+def format_collection_date(col_date, config):
+    if not col_date:
+        return "N/A"
+    try:
+        # Handle different date formats (with or without T/Z)
+        if 'T' in col_date:
+            date_format = '%Y-%m-%dT%H:%M:%SZ' if col_date.endswith('Z') else '%Y-%m-%dT%H:%M:%S'
+            dt = datetime.strptime(col_date, date_format)
+        else:
+            dt = datetime.strptime(col_date, '%Y-%m-%d %H:%M:%S')
+        return dt.strftime(config.get('date_format', '%d/%m/%Y %H:%M:%S'))
+    except:
+        return col_date
+
+def join_or_na(values, default="N/A"):
+    return ", ".join(values) if values else default
+
+# Enregistrements typés produits par l'extraction, un par ligne d'onglet
+ServerRow = namedtuple('ServerRow', [
+    'hostname', 'fqdn', 'distribution', 'version', 'kernel', 'ip', 'environment',
+    'role', 'criticality', 'applications', 'collection_date'])
+HardwareRow = namedtuple('HardwareRow', [
+    'hostname', 'model', 'manufacturer', 'serial', 'architecture', 'virtualization_type',
+    'virtualization_role', 'processors', 'cores', 'threads_per_core', 'memory_mb', 'disks'])
+SoftwareRow = namedtuple('SoftwareRow', [
+    'hostname', 'distribution', 'version', 'release', 'kernel', 'python_version',
+    'packages', 'services', 'databases'])
+NetworkRow = namedtuple('NetworkRow', [
+    'hostname', 'fqdn', 'domain', 'ipv4', 'netmask', 'gateway', 'interfaces',
+    'dns_servers', 'dns_search'])
+SecurityRow = namedtuple('SecurityRow', [
+    'hostname', 'selinux', 'apparmor', 'updates_available', 'users_with_shell',
+    'users_with_uid0', 'users_with_sudo', 'certificates', 'backup_solutions'])
+OrganizationalRow = namedtuple('OrganizationalRow', [
+    'hostname', 'role', 'environment', 'criticality', 'applications', 'business_owner',
+    'technical_owner', 'sla', 'commissioned_date', 'end_of_life_date', 'datacenter',
+    'rack', 'position'])
+CertificateRow = namedtuple('CertificateRow', [
+    'hostname', 'subject', 'issuer', 'valid_from', 'valid_to', 'path'])
+UpdateRow = namedtuple('UpdateRow', [
+    'hostname', 'distribution', 'version', 'updates_available', 'selinux', 'apparmor'])
+
+# Contribution d'un serveur aux statistiques de l'onglet Résumé
+HostSummary = namedtuple('HostSummary', [
+    'os_name', 'environment', 'virtualization', 'needs_updates', 'critical', 'first_cert_expiry',
+    'hostname', 'datacenter'])
+
+# Résultat de l'extraction d'un document d'inventaire : une entrée par onglet
+# (None si l'onglet est désactivé), les certificats étant une liste de lignes
+HostRecord = namedtuple('HostRecord', [
+    'servers', 'hardware', 'software', 'network', 'security', 'organizational',
+    'certificates', 'updates', 'summary'])
+
+ROW_SHEETS = HostRecord._fields[:-1]
+SHEET_NAMES = ('summary',) + ROW_SHEETS
+
+ROW_TYPES = {
+    'servers': ServerRow, 'hardware': HardwareRow, 'software': SoftwareRow,
+    'network': NetworkRow, 'security': SecurityRow, 'organizational': OrganizationalRow,
+    'certificates': CertificateRow, 'updates': UpdateRow, 'summary': HostSummary,
+}
+
+def record_to_json(record):
+    return json.dumps(record, ensure_ascii=False)
+
+def record_from_json(values):
+    # Inverse of record_to_json(): namedtuples are serialized as plain arrays
+    fields = []
+    for name, value in zip(HostRecord._fields, values):
+        if value is None:
+            fields.append(None)
+        elif name == 'certificates':
+            fields.append([CertificateRow(*row) for row in value])
+        else:
+            fields.append(ROW_TYPES[name](*value))
+    return HostRecord(*fields)
+
+def enabled_sheets(config):
+    sheets = config.get('sheets', {})
+    return {name: sheets.get(name, True) for name in SHEET_NAMES}
+
+def parse_certificates(hostname, cert_details):
+    rows = []
+    for cert in cert_details:
+        if cert.get('stdout'):
+            rows.append(parse_legacy_certificate(hostname, cert))
+        elif cert.get('not_after'):
+            # Compact records produced by the cmdb_cert_scanner module
+            rows.append(CertificateRow(hostname, cert.get('subject', ''), cert.get('issuer', ''),
+                                       cert.get('not_before', ''), cert['not_after'],
+                                       cert.get('path', 'N/A')))
+    return rows
+
+def parse_legacy_certificate(hostname, cert):
+    # Raw openssl register results of reports collected by older role versions
+    fields = {}
+    # stdout_lines is dropped from register results by cmdb_report_pack
+    for line in cert.get('stdout_lines') or cert.get('stdout', '').splitlines():
+        key, sep, value = line.partition('=')
+        if sep:
+            fields[key] = value
+    return CertificateRow(hostname, fields.get('subject', ''), fields.get('issuer', ''),
+                          openssl_date_to_iso(fields.get('notBefore', '')),
+                          openssl_date_to_iso(fields.get('notAfter', '')),
+                          (cert.get('item') or {}).get('path', 'N/A'))
+
+def extract_host(server, sheets, config):
+    # Each nested section is looked up once and shared by every sheet row
+    hostname = server.get('hostname', 'N/A')
+    hw = server.get('hardware') or {}
+    system = hw.get('system') or {}
+    sw = server.get('software') or {}
+    os_info = sw.get('os') or {}
+    kernel = (sw.get('kernel') or {}).get('name', 'N/A')
+    net = server.get('network') or {}
+    default_ipv4 = net.get('default_ipv4') or {}
+    sec = server.get('security') or {}
+    org = server.get('organizational') or {}
+    apps = join_or_na(org.get('applications') or [])
+    updates = sec.get('updates_available', 'N/A')
+    selinux = (sec.get('selinux') or {}).get('status', 'N/A')
+    apparmor = (sec.get('apparmor') or {}).get('status', 'N/A')
+    
+    # Certificates are always parsed: the summary needs their expiry dates
+    cert_details = (sec.get('certificates') or {}).get('details') or []
+    if cert_details:
+        certificates = parse_certificates(hostname, cert_details)
+    else:
+        # Add a row for servers with no certificates
+        certificates = [CertificateRow(hostname, "Aucun certificat trouvé", None, None, None, None)]
+    
+    servers = None
+    if sheets['servers']:
+        # Get default IP if available, else try to get the first interface IP
+        ip = default_ipv4.get('address')
+        if not ip:
+            interfaces = net.get('interfaces') or []
+            if interfaces and (interfaces[0].get('ipv4') or {}).get('address'):
+                ip = interfaces[0]['ipv4']['address']
+            else:
+                ip = "N/A"
         
-        # Check for expired certificates
-        for cert in server['security'].get('certificates', {}).get('details', []):
-            if 'stdout' in cert and 'notAfter' in cert['stdout']:
-                expiration_line = [line for line in cert.get('stdout_lines', []) if 'notAfter' in line][0] if 'stdout_lines' in cert else ""
-                if expiration_line and '2024' in expiration_line:  # Simplified check for expired certs in 2024
-                    servers_with_expired_certs += 1
-                    break
+        servers = ServerRow(
+            hostname, net.get('fqdn', 'N/A'),
+            os_info.get('distribution', 'N/A'), os_info.get('distribution_version', 'N/A'),
+            kernel, ip, org.get('environment', 'N/A'), org.get('role', 'N/A'),
+            org.get('criticality', 'N/A'), apps,
+            format_collection_date(server.get('collection_date'), config))
+    
+    hardware = None
+    if sheets['hardware']:
+        processor = hw.get('processor') or {}
+        disk_info = [f"{disk['name']}:{disk['size']}" for disk in hw.get('disks') or []
+                     if 'name' in disk and 'size' in disk]
+        hardware = HardwareRow(
+            hostname, system.get('model', 'N/A'), system.get('manufacturer', 'N/A'),
+            system.get('serial', 'N/A'), system.get('architecture', 'N/A'),
+            system.get('virtualization_type', 'N/A'), system.get('virtualization_role', 'N/A'),
+            processor.get('count', 'N/A'), processor.get('cores', 'N/A'),
+            processor.get('threads_per_core', 'N/A'), (hw.get('memory') or {}).get('total_mb', 'N/A'),
+            join_or_na(disk_info))
+    
+    software = None
+    if sheets['software']:
+        pkgs = sw.get('packages') or {}
+        db_info = [f"{db['type']} {db['version'].split()[0]}" for db in sw.get('databases') or []
+                   if 'type' in db and 'version' in db]
+        software = SoftwareRow(
+            hostname, os_info.get('distribution', 'N/A'), os_info.get('distribution_version', 'N/A'),
+            os_info.get('distribution_release', 'N/A'), kernel,
+            (sw.get('python') or {}).get('version', 'N/A'),
+            pkgs['count'] if isinstance(pkgs, dict) and 'count' in pkgs else "N/A",
+            join_or_na((sw.get('services') or {}).get('running') or []),
+            join_or_na(db_info))
+    
+    network = None
+    if sheets['network']:
+        if_info = [f"{iface['name']}:{(iface.get('ipv4') or {}).get('address', '')}"
+                   for iface in net.get('interfaces') or []
+                   if 'name' in iface and 'mac' in iface]
+        dns = net.get('dns') or {}
+        network = NetworkRow(
+            hostname, net.get('fqdn', 'N/A'), net.get('domain', 'N/A'),
+            default_ipv4.get('address', 'N/A'), default_ipv4.get('netmask', 'N/A'),
+            default_ipv4.get('gateway', 'N/A'), join_or_na(if_info),
+            join_or_na(dns.get('nameservers')), join_or_na(dns.get('search')))
+    
+    security = None
+    if sheets['security']:
+        users = sec.get('users') or {}
+        security = SecurityRow(
+            hostname, selinux, apparmor, updates,
+            users.get('with_shell', 'N/A'), users.get('with_uid0', 'N/A'), users.get('with_sudo', 'N/A'),
+            (sec.get('certificates') or {}).get('count', 0),
+            join_or_na((sec.get('backup') or {}).get('solutions') or [], "Aucune détectée"))
+    
+    organizational = None
+    if sheets['organizational']:
+        organizational = OrganizationalRow(
+            hostname, org.get('role', 'N/A'), org.get('environment', 'N/A'),
+            org.get('criticality', 'N/A'), apps,
+            org.get('business_owner', 'N/A'), org.get('technical_owner', 'N/A'),
+            org.get('sla', 'N/A'), org.get('commissioned_date', 'N/A'),
+            org.get('end_of_life_date', 'N/A'), org.get('datacenter', 'N/A'),
+            org.get('rack', 'N/A'), org.get('position', 'N/A'))
+    
+    updates_row = None
+    if sheets['updates']:
+        updates_row = UpdateRow(
+            hostname, os_info.get('distribution', 'N/A'), os_info.get('distribution_version', 'N/A'),
+            updates, selinux, apparmor)
+    
+    # The summary contribution is always computed, it also feeds the email statistics
+    summary = HostSummary(
+        f"{os_info.get('distribution', 'N/A')} {os_info.get('distribution_version', 'N/A')}",
+        org.get('environment', 'N/A'),
+        system.get('virtualization_type', 'N/A'),
+        has_updates(updates),
+        org.get('criticality') == 'Critique',
+        min((cert.valid_to for cert in certificates if cert.valid_to), default=None),
+        hostname, org.get('datacenter', 'N/A'))
+    
+    return HostRecord(servers, hardware, software, network, security, organizational,
+                      certificates if sheets['certificates'] else None, updates_row, summary)
+
+def new_summary():
+    return {
+        'total': 0,
+        'servers_with_updates': 0,
+        'critical_servers': 0,
+        'servers_with_expired_certs': 0,
+        'os_count': {},
+        'env_count': {},
+        'virt_count': {},
+    }
+
+def add_summary(summary, host):
+    summary['total'] += 1
+    summary['servers_with_updates'] += host.needs_updates
+    summary['critical_servers'] += host.critical
+    # Expiry is evaluated at report time: cached records stay valid from one day to the next
+    summary['servers_with_expired_certs'] += is_expired(host.first_cert_expiry)
+    for key, value in (('os_count', host.os_name), ('env_count', host.environment),
+                       ('virt_count', host.virtualization)):
+        summary[key][value] = summary[key].get(value, 0) + 1
+
+def new_report(config):
+    sheets = enabled_sheets(config)
+    report = {name: [] for name in ROW_SHEETS if sheets[name]}
+    report['summary'] = new_summary()
+    report['hosts'] = 0
+    return report
+
+def add_record(report, record):
+    report['hosts'] += 1
+    for name in ROW_SHEETS:
+        rows = getattr(record, name)
+        if rows is None or name not in report:
+            continue
+        if name == 'certificates':
+            report[name].extend(rows)
+        else:
+            report[name].append(rows)
+    add_summary(report['summary'], record.summary)
+
+def write_stats(report, config):
+    # Statistiques globales au format cmdb_stats, relues par le rôle pour l'email
+    stats_file = config.get('stats_file')
+    if not stats_file:
+        return
+    summary = report['summary']
+    os_count = {}
+    for os_name, count in summary['os_count'].items():
+        distribution = os_name.rsplit(' ', 1)[0]
+        os_count[distribution] = os_count.get(distribution, 0) + count
+    stats = {
+        'total_servers': summary['total'],
+        'os_count': os_count,
+        'env_count': summary['env_count'],
+        'virtualization_count': summary['virt_count'],
+        'updates_needed': summary['servers_with_updates'],
+        'critical_servers': summary['critical_servers'],
+        'expired_certs': summary['servers_with_expired_certs'],
+        'exports': [{'sheet': export['sheet'], 'path': export['path'], 'rows': export['rows']}
+                    for export in config.get('_exports', [])],
+        'shards': [{'name': entry['name'], 'file': entry['file'], 'path': entry['path'], 'hosts': entry['hosts']}
+                   for entry in config.get('_shards', [])],
+    }
+    with open(stats_file, 'w') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+def build_report(config, records):
+    report = new_report(config)
+    for record in records:
+        add_record(report, record)
+    return report
+
+def extract_report(data, config):
+    # Single pass over the host documents: every enabled sheet and the summary
+    # aggregates are fed from the same traversal
+    sheets = enabled_sheets(config)
+    return build_report(config, (extract_host(server, sheets, config) for server in data))
+
+def create_summary_sheet(wb, report, config):
+    if not config.get('sheets', {}).get('summary', True):
+        return
+    
+    summary = report['summary']
+    # Created last, once the exports are known, but placed first
+    ws = wb.create_sheet("Résumé", 0)
+    total = summary['total']
+    
+    # The summary is a handful of rows: build it fully, then append it in
+    # order so the same layout works for both engines
+    rows = []
+    merges = []
+    
+    def section(title):
+        rows.append([styled_cell(ws, title, font=SECTION_FONT)])
+        merges.append(f'A{len(rows)}:C{len(rows)}')
+    
+    def distribution(title, header, counts):
+        section(title)
+        rows.append(header_cells(ws, [header, "Nombre", "Pourcentage"]))
+        for name, count in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+            rows.append([name, count, f"{count / total * 100:.1f}%"])
     
     # Add summary info
-    ws['A1'] = "RÉSUMÉ DE L'INVENTAIRE CMDB"
-    ws['A1'].font = Font(bold=True, size=14)
-    ws.merge_cells('A1:C1')
-    
-    ws['A3'] = "Rapport généré le:"
-    ws['B3'] = datetime.now().strftime(config.get('date_format', '%d/%m/%Y %H:%M:%S'))
-    
-    ws['A4'] = "Nombre total de serveurs:"
-    ws['B4'] = len(data)
-    
-    ws['A5'] = "Serveurs nécessitant des mises à jour:"
-    ws['B5'] = servers_with_updates
-    
-    ws['A6'] = "Serveurs critiques:"
-    ws['B6'] = critical_servers
-    
-    ws['A7'] = "Serveurs avec certificats expirés:"
-    ws['B7'] = servers_with_expired_certs
-    
-    # Distribution par OS
-    row = 10
-    ws['A9'] = "DISTRIBUTION PAR SYSTÈME D'EXPLOITATION"
-    ws['A9'].font = Font(bold=True)
-    ws.merge_cells('A9:C9')
-    
-    ws['A' + str(row)] = "Système d'exploitation"
-    ws['B' + str(row)] = "Nombre"
-    ws['C' + str(row)] = "Pourcentage"
-    format_header(ws, row)
-    
-    row += 1
-    for os, count in sorted(os_count.items(), key=lambda x: x[1], reverse=True):
-        ws['A' + str(row)] = os
-        ws['B' + str(row)] = count
-        ws['C' + str(row)] = f"{count / len(data) * 100:.1f}%"
-        row += 1
-    
-    # Distribution par environnement
-    row += 2
-    ws['A' + str(row)] = "DISTRIBUTION PAR ENVIRONNEMENT"
-    ws['A' + str(row)].font = Font(bold=True)
-    ws.merge_cells(f'A{row}:C{row}')
-    
-    row += 1
-    ws['A' + str(row)] = "Environnement"
-    ws['B' + str(row)] = "Nombre"
-    ws['C' + str(row)] = "Pourcentage"
-    format_header(ws, row)
-    
-    row += 1
-    for env, count in sorted(env_count.items(), key=lambda x: x[1], reverse=True):
-        ws['A' + str(row)] = env
-        ws['B' + str(row)] = count
-        ws['C' + str(row)] = f"{count / len(data) * 100:.1f}%"
-        row += 1
-    
-    # Distribution par type de virtualisation
-    row += 2
-    ws['A' + str(row)] = "DISTRIBUTION PAR TYPE DE VIRTUALISATION"
-    ws['A' + str(row)].font = Font(bold=True)
-    ws.merge_cells(f'A{row}:C{row}')
-    
-    row += 1
-    ws['A' + str(row)] = "Type de virtualisation"
-    ws['B' + str(row)] = "Nombre"
-    ws['C' + str(row)] = "Pourcentage"
-    format_header(ws, row)
-    
-    row += 1
-    for virt, count in sorted(virt_count.items(), key=lambda x: x[1], reverse=True):
-        ws['A' + str(row)] = virt
-        ws['B' + str(row)] = count
-        ws['C' + str(row)] = f"{count / len(data) * 100:.1f}%"
-        row += 1
+    rows.append([styled_cell(ws, "RÉSUMÉ DE L'INVENTAIRE CMDB", font=TITLE_FONT)])
+    merges.append('A1:C1')
+    rows.append([])
+    rows.append(["Rapport généré le:", datetime.now().strftime(config.get('date_format', '%d/%m/%Y %H:%M:%S'))])
+    shard = config.get('_shard')
+    if shard:
+        rows.append(["Périmètre du classeur:", f"{SHARD_LABELS[shard['key']]} {shard['name']}"])
+    rows.append(["Nombre total de serveurs:", total])
+    rows.append(["Serveurs nécessitant des mises à jour:", summary['servers_with_updates']])
+    rows.append(["Serveurs critiques:", summary['critical_servers']])
+    rows.append(["Serveurs avec certificats expirés:", summary['servers_with_expired_certs']])
+    rows.append([])
     
-    adjust_column_width(ws)
+    distribution("DISTRIBUTION PAR SYSTÈME D'EXPLOITATION", "Système d'exploitation", summary['os_count'])
+    rows.extend([[], []])
+    distribution("DISTRIBUTION PAR ENVIRONNEMENT", "Environnement", summary['env_count'])
+    rows.extend([[], []])
+    distribution("DISTRIBUTION PAR TYPE DE VIRTUALISATION", "Type de virtualisation", summary['virt_count'])
+    
+    shards = config.get('_shards', [])
+    if shards:
+        rows.extend([[], []])
+        section(f"CLASSEURS PAR {SHARD_LABELS[shard_mode(config)].upper()}")
+        rows.append(header_cells(ws, ["Classeur", "Serveurs", "Fichier"]))
+        for entry in shards:
+            rows.append([entry['name'], entry['hosts'], link_cell(ws, entry['file'], entry['file'])])
+    
+    exports = config.get('_exports', [])
+    if exports:
+        rows.extend([[], []])
+        section("EXPORTS TABULAIRES")
+        rows.append(header_cells(ws, ["Onglet", "Lignes", "Fichier"]))
+        for export in exports:
+            name = f"{export['sheet']} (hors classeur)" if export['spilled'] else export['sheet']
+            rows.append([name, export['rows'], link_cell(ws, export['link'], export['link'])])
+    
+    if is_streaming(config):
+        set_column_widths(ws, [[getattr(v, 'value', v) for v in row] for row in rows])
+    for row in rows:
+        ws.append(row)
+    for ref in merges:
+        merge_row(ws, ref)
+    if not is_streaming(config):
+        anchor_links(ws)
+        adjust_column_width(ws)
     return ws
 
-def create_servers_sheet(wb, data, config):
+def create_servers_sheet(wb, report, config):
     if not config.get('sheets', {}).get('servers', True):
         return
     
-    ws = wb.create_sheet("Serveurs")
-    
-    # Create header
     headers = [
         "Hostname", "FQDN", "Distribution", "Version", "Kernel", 
         "IP Principale", "Environnement", "Rôle", "Criticité",
         "Applications", "Date de collecte"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    for row, server in enumerate(data, 2):
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = server.get('network', {}).get('fqdn', 'N/A')
-        ws.cell(row=row, column=3).value = server.get('software', {}).get('os', {}).get('distribution', 'N/A')
-        ws.cell(row=row, column=4).value = server.get('software', {}).get('os', {}).get('distribution_version', 'N/A')
-        ws.cell(row=row, column=5).value = server.get('software', {}).get('kernel', {}).get('name', 'N/A')
-        
-        # Get default IP if available
-        if server.get('network', {}).get('default_ipv4', {}).get('address'):
-            ws.cell(row=row, column=6).value = server['network']['default_ipv4']['address']
-        else:
-            # Try to get the first interface IP
-            interfaces = server.get('network', {}).get('interfaces', [])
-            if interfaces and interfaces[0].get('ipv4', {}).get('address'):
-                ws.cell(row=row, column=6).value = interfaces[0]['ipv4']['address']
-            else:
-                ws.cell(row=row, column=6).value = "N/A"
-        
-        ws.cell(row=row, column=7).value = server.get('organizational', {}).get('environment', 'N/A')
-        ws.cell(row=row, column=8).value = server.get('organizational', {}).get('role', 'N/A')
-        ws.cell(row=row, column=9).value = server.get('organizational', {}).get('criticality', 'N/A')
-        
-        # Format applications list
-        apps = server.get('organizational', {}).get('applications', [])
-        ws.cell(row=row, column=10).value = ", ".join(apps) if apps else "N/A"
-        
-        # Format collection date
-        col_date = server.get('collection_date')
-        if col_date:
-            try:
-                # Handle different date formats (with or without T/Z)
-                if 'T' in col_date:
-                    date_format = '%Y-%m-%dT%H:%M:%SZ' if col_date.endswith('Z') else '%Y-%m-%dT%H:%M:%S'
-                    dt = datetime.strptime(col_date, date_format)
-                else:
-                    dt = datetime.strptime(col_date, '%Y-%m-%d %H:%M:%S')
-                ws.cell(row=row, column=11).value = dt.strftime(config.get('date_format', '%d/%m/%Y %H:%M:%S'))
-            except:
-                ws.cell(row=row, column=11).value = col_date
-        else:
-            ws.cell(row=row, column=11).value = "N/A"
-    
-    adjust_column_width(ws)
-    return ws
+    return write_table(wb, "Serveurs", headers, report['servers'], config)
 
-def create_hardware_sheet(wb, data, config):
+def create_hardware_sheet(wb, report, config):
     if not config.get('sheets', {}).get('hardware', True):
         return
     
-    ws = wb.create_sheet("Matériel")
-    
-    # Create header
     headers = [
         "Hostname", "Modèle", "Fabricant", "Numéro de série",
         "Architecture", "Type de virtualisation", "Rôle de virtualisation",
         "Processeurs", "Cœurs", "Threads par cœur", "Mémoire (MB)", "Disques"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    for row, server in enumerate(data, 2):
-        hw = server.get('hardware', {})
-        
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = hw.get('system', {}).get('model', 'N/A')
-        ws.cell(row=row, column=3).value = hw.get('system', {}).get('manufacturer', 'N/A')
-        ws.cell(row=row, column=4).value = hw.get('system', {}).get('serial', 'N/A')
-        ws.cell(row=row, column=5).value = hw.get('system', {}).get('architecture', 'N/A')
-        ws.cell(row=row, column=6).value = hw.get('system', {}).get('virtualization_type', 'N/A')
-        ws.cell(row=row, column=7).value = hw.get('system', {}).get('virtualization_role', 'N/A')
-        ws.cell(row=row, column=8).value = hw.get('processor', {}).get('count', 'N/A')
-        ws.cell(row=row, column=9).value = hw.get('processor', {}).get('cores', 'N/A')
-        ws.cell(row=row, column=10).value = hw.get('processor', {}).get('threads_per_core', 'N/A')
-        ws.cell(row=row, column=11).value = hw.get('memory', {}).get('total_mb', 'N/A')
-        
-        # Format disks info
-        disks = hw.get('disks', [])
-        disk_info = []
-        for disk in disks:
-            if 'name' in disk and 'size' in disk:
-                disk_info.append(f"{disk['name']}:{disk['size']}")
-        ws.cell(row=row, column=12).value = ", ".join(disk_info) if disk_info else "N/A"
-    
-    adjust_column_width(ws)
-    return ws
+    return write_table(wb, "Matériel", headers, report['hardware'], config)
 
-def create_software_sheet(wb, data, config):
+def create_software_sheet(wb, report, config):
     if not config.get('sheets', {}).get('software', True):
         return
     
-    ws = wb.create_sheet("Logiciels")
-    
-    # Create header
     headers = [
         "Hostname", "Distribution", "Version", "Release", 
         "Kernel", "Python Version", "Packages installés", 
         "Services en cours d'exécution", "Bases de données"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    for row, server in enumerate(data, 2):
-        sw = server.get('software', {})
-        
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = sw.get('os', {}).get('distribution', 'N/A')
-        ws.cell(row=row, column=3).value = sw.get('os', {}).get('distribution_version', 'N/A')
-        ws.cell(row=row, column=4).value = sw.get('os', {}).get('distribution_release', 'N/A')
-        ws.cell(row=row, column=5).value = sw.get('kernel', {}).get('name', 'N/A')
-        ws.cell(row=row, column=6).value = sw.get('python', {}).get('version', 'N/A')
-        
-        # Package count
-        pkgs = sw.get('packages', {})
-        if isinstance(pkgs, dict) and 'count' in pkgs:
-            ws.cell(row=row, column=7).value = pkgs['count']
-        else:
-            ws.cell(row=row, column=7).value = "N/A"
-        
-        # Running services
-        services = sw.get('services', {}).get('running', [])
-        ws.cell(row=row, column=8).value = ", ".join(services) if services else "N/A"
-        
-        # Databases
-        dbs = sw.get('databases', [])
-        db_info = []
-        for db in dbs:
-            if 'type' in db and 'version' in db:
-                db_info.append(f"{db['type']} {db['version'].split()[0]}")
-        ws.cell(row=row, column=9).value = ", ".join(db_info) if db_info else "N/A"
-    
-    adjust_column_width(ws)
-    return ws
+    return write_table(wb, "Logiciels", headers, report['software'], config)
 
-def create_network_sheet(wb, data, config):
+def create_network_sheet(wb, report, config):
     if not config.get('sheets', {}).get('network', True):
         return
     
-    ws = wb.create_sheet("Réseau")
-    
-    # Create header
     headers = [
         "Hostname", "FQDN", "Domaine", "IPv4 Principale", "Masque",
         "Passerelle", "Interfaces", "DNS Serveurs", "DNS Search"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    for row, server in enumerate(data, 2):
-        net = server.get('network', {})
-        
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = net.get('fqdn', 'N/A')
-        ws.cell(row=row, column=3).value = net.get('domain', 'N/A')
-        
-        # Default IPv4
-        default_ipv4 = net.get('default_ipv4', {})
-        ws.cell(row=row, column=4).value = default_ipv4.get('address', 'N/A')
-        ws.cell(row=row, column=5).value = default_ipv4.get('netmask', 'N/A')
-        ws.cell(row=row, column=6).value = default_ipv4.get('gateway', 'N/A')
-        
-        # Interfaces
-        interfaces = net.get('interfaces', [])
-        if_info = []
-        for iface in interfaces:
-            if 'name' in iface and 'mac' in iface:
-                if_addr = iface.get('ipv4', {}).get('address', '')
-                if_info.append(f"{iface['name']}:{if_addr}")
-        ws.cell(row=row, column=7).value = ", ".join(if_info) if if_info else "N/A"
-        
-        # DNS Configuration
-        dns = net.get('dns', {})
-        ws.cell(row=row, column=8).value = ", ".join(dns.get('nameservers', [])) if dns.get('nameservers') else "N/A"
-        ws.cell(row=row, column=9).value = ", ".join(dns.get('search', [])) if dns.get('search') else "N/A"
-    
-    adjust_column_width(ws)
-    return ws
+    return write_table(wb, "Réseau", headers, report['network'], config)
 
-def create_security_sheet(wb, data, config):
+def create_security_sheet(wb, report, config):
     if not config.get('sheets', {}).get('security', True):
         return
     
-    ws = wb.create_sheet("Sécurité")
-    
-    # Create header
     headers = [
         "Hostname", "SELinux", "AppArmor", "Mises à jour disponibles",
         "Utilisateurs shell", "Utilisateurs root", "Utilisateurs sudo",
         "Certificats", "Solutions de sauvegarde"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    for row, server in enumerate(data, 2):
-        sec = server.get('security', {})
-        
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = sec.get('selinux', {}).get('status', 'N/A')
-        ws.cell(row=row, column=3).value = sec.get('apparmor', {}).get('status', 'N/A')
-        
-        # Updates available
-        updates = sec.get('updates_available', 'N/A')
-        ws.cell(row=row, column=4).value = updates
-        if isinstance(updates, int) and updates > 0:
-            ws.cell(row=row, column=4).fill = PatternFill(start_color='FFAAAA', end_color='FFAAAA', fill_type='solid')
-        
-        # Users
-        users = sec.get('users', {})
-        ws.cell(row=row, column=5).value = users.get('with_shell', 'N/A')
-        ws.cell(row=row, column=6).value = users.get('with_uid0', 'N/A')
-        ws.cell(row=row, column=7).value = users.get('with_sudo', 'N/A')
-        
-        # Certificates
-        certs = sec.get('certificates', {})
-        ws.cell(row=row, column=8).value = certs.get('count', 0)
-        
-        # Backup solutions
-        backup = sec.get('backup', {})
-        backup_solutions = backup.get('solutions', [])
-        ws.cell(row=row, column=9).value = ", ".join(backup_solutions) if backup_solutions else "Aucune détectée"
-    
-    adjust_column_width(ws)
-    return ws
+    highlight = {SecurityRow._fields.index('updates_available'): has_updates}
+    return write_table(wb, "Sécurité", headers, report['security'], config, highlight=highlight)
 
-def create_organizational_sheet(wb, data, config):
+def create_organizational_sheet(wb, report, config):
     if not config.get('sheets', {}).get('organizational', True):
         return
     
-    ws = wb.create_sheet("Organisation")
-    
-    # Create header
     headers = [
         "Hostname", "Rôle", "Environnement", "Criticité",
         "Applications", "Responsable métier", "Responsable technique",
         "SLA", "Date de mise en service", "Date de fin de vie",
         "Datacenter", "Rack", "Position"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    for row, server in enumerate(data, 2):
-        org = server.get('organizational', {})
-        
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = org.get('role', 'N/A')
-        ws.cell(row=row, column=3).value = org.get('environment', 'N/A')
-        ws.cell(row=row, column=4).value = org.get('criticality', 'N/A')
-        
-        # Format applications list
-        apps = org.get('applications', [])
-        ws.cell(row=row, column=5).value = ", ".join(apps) if apps else "N/A"
-        
-        ws.cell(row=row, column=6).value = org.get('business_owner', 'N/A')
-        ws.cell(row=row, column=7).value = org.get('technical_owner', 'N/A')
-        ws.cell(row=row, column=8).value = org.get('sla', 'N/A')
-        ws.cell(row=row, column=9).value = org.get('commissioned_date', 'N/A')
-        ws.cell(row=row, column=10).value = org.get('end_of_life_date', 'N/A')
-        ws.cell(row=row, column=11).value = org.get('datacenter', 'N/A')
-        ws.cell(row=row, column=12).value = org.get('rack', 'N/A')
-        ws.cell(row=row, column=13).value = org.get('position', 'N/A')
-    
-    adjust_column_width(ws)
-    return ws
+    return write_table(wb, "Organisation", headers, report['organizational'], config)
 
-def create_certificates_sheet(wb, data, config):
+def create_certificates_sheet(wb, report, config):
     if not config.get('sheets', {}).get('certificates', True):
         return
     
-    ws = wb.create_sheet("Certificats")
-    
-    # Create header
     headers = [
         "Hostname", "Sujet", "Émetteur", "Valide depuis", "Valide jusqu'à", "Chemin"
     ]
-    
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
-    
-    # Fill data
-    row = 2
-    for server in data:
-        hostname = server.get('hostname', 'N/A')
-        
-        cert_details = server.get('security', {}).get('certificates', {}).get('details', [])
-        
-        if not cert_details:
-            # Add a row for servers with no certificates
-            ws.cell(row=row, column=1).value = hostname
-            ws.cell(row=row, column=2).value = "Aucun certificat trouvé"
-            row += 1
-            continue
-        
-        for cert in cert_details:
-            if 'stdout' not in cert or not cert['stdout']:
-                continue
-                
-            ws.cell(row=row, column=1).value = hostname
-            
-            # Parse certificate details
-            subject = ""
-            issuer = ""
-            valid_from = ""
-            valid_to = ""
-            path = cert.get('item', {}).get('path', 'N/A') if 'item' in cert else 'N/A'
-            
-            if 'stdout_lines' in cert:
-                for line in cert['stdout_lines']:
-                    if 'subject=' in line:
-                        subject = line.replace('subject=', '')
-                    elif 'issuer=' in line:
-                        issuer = line.replace('issuer=', '')
-                    elif 'notBefore=' in line:
-                        valid_from = line.replace('notBefore=', '')
-                    elif 'notAfter=' in line:
-                        valid_to = line.replace('notAfter=', '')
-            
-            ws.cell(row=row, column=2).value = subject
-            ws.cell(row=row, column=3).value = issuer
-            ws.cell(row=row, column=4).value = valid_from
-            ws.cell(row=row, column=5).value = valid_to
-            ws.cell(row=row, column=6).value = path
-            
-            # Highlight expired or soon-to-expire certificates
-            if valid_to and '2024' in valid_to:
-                ws.cell(row=row, column=5).fill = PatternFill(start_color='FFAAAA', end_color='FFAAAA', fill_type='solid')
-            
-            row += 1
-    
-    adjust_column_width(ws)
-    return ws
+    # Highlight expired or soon-to-expire certificates
+    highlight = {CertificateRow._fields.index('valid_to'): is_expired}
+    return write_table(wb, "Certificats", headers, report['certificates'], config, highlight=highlight)
 
-def create_updates_sheet(wb, data, config):
+def create_updates_sheet(wb, report, config):
     if not config.get('sheets', {}).get('updates', True):
         return
     
-    ws = wb.create_sheet("Mises à jour")
-    
-    # Create header
     headers = [
         "Hostname", "Distribution", "Version", "Mises à jour disponibles", "SELinux", "AppArmor"
     ]
+    highlight = {UpdateRow._fields.index('updates_available'): has_updates}
+    return write_table(wb, "Mises à jour", headers, report['updates'], config, highlight=highlight)
+
+# Inventaire détaillé des paquets produit par le module cmdb_package_inventory du rôle
+# cmdb_inventory : dictionnaire (nom, version) -> identifiant, liste de référence par
+# distribution et, pour chaque serveur, identifiants ajoutés et retirés
+VERSION_SEGMENT = re.compile(r'~|[0-9]+|[A-Za-z]+')
+
+def decode_ids(blob):
+    # Sorted ids, delta-encoded as little-endian uint32 then zlib-compressed
+    if not blob:
+        return set()
+    data = zlib.decompress(blob)
+    return set(itertools.accumulate(struct.unpack(f'<{len(data) // 4}I', data)))
+
+def compare_segments(a, b):
+    # rpmvercmp: numeric or alphabetic segments, "~" sorts before anything
+    a_parts = VERSION_SEGMENT.findall(a)
+    b_parts = VERSION_SEGMENT.findall(b)
+    for x, y in itertools.zip_longest(a_parts, b_parts):
+        if x == '~' or y == '~':
+            if x != y:
+                return -1 if x == '~' else 1
+            continue
+        if x is None or y is None:
+            return -1 if x is None else 1
+        if x.isdigit() and y.isdigit():
+            x, y = int(x), int(y)
+        elif x.isdigit() or y.isdigit():
+            return 1 if x.isdigit() else -1
+        if x != y:
+            return -1 if x < y else 1
+    return 0
+
+def split_version(version):
+    epoch, sep, rest = version.partition(':')
+    if not sep or not epoch.isdigit():
+        epoch, rest = '0', version
+    upstream, sep, release = rest.rpartition('-')
+    if not sep:
+        upstream, release = rest, ''
+    return int(epoch), upstream, release
+
+def compare_versions(a, b):
+    a_epoch, a_upstream, a_release = split_version(a)
+    b_epoch, b_upstream, b_release = split_version(b)
+    if a_epoch != b_epoch:
+        return -1 if a_epoch < b_epoch else 1
+    return compare_segments(a_upstream, b_upstream) or compare_segments(a_release, b_release)
+
+def open_package_db(config):
+    package_db = config.get('package_db')
+    if not package_db or not os.path.exists(package_db):
+        return None
+    try:
+        return sqlite3.connect(f'file:{package_db}?mode=ro', uri=True, timeout=30)
+    except sqlite3.Error as e:
+        print(f"AVERTISSEMENT: Inventaire des paquets {package_db} illisible: {e}")
+        return None
+
+def package_rows(db):
+    # Host count per (name, version): each distribution baseline counts for all its
+    # hosts, corrected by the per-host removed and added ids
+    baselines = {distribution: (hosts, decode_ids(ids))
+                 for distribution, hosts, ids in db.execute("SELECT distribution, hosts, ids FROM baselines")}
+    counts = {}
+    distributions = {}
+    for distribution, (hosts, ids) in baselines.items():
+        for package_id in ids:
+            counts[package_id] = counts.get(package_id, 0) + hosts
+            distributions.setdefault(package_id, set()).add(distribution)
+    for distribution, added, removed in db.execute("SELECT distribution, added, removed FROM hosts"):
+        for package_id in decode_ids(removed):
+            counts[package_id] -= 1
+        for package_id in decode_ids(added):
+            counts[package_id] = counts.get(package_id, 0) + 1
+            distributions.setdefault(package_id, set()).add(distribution)
+    for package_id, name, version in db.execute("SELECT id, name, version FROM packages ORDER BY name, version"):
+        if counts.get(package_id, 0) > 0:
+            yield (name, version, counts[package_id], join_or_na(sorted(distributions[package_id])))
+
+def package_query_rows(db, queries):
+    # Hosts running a watched package below its fixed version
+    baselines = {distribution: decode_ids(ids)
+                 for distribution, ids in db.execute("SELECT distribution, ids FROM baselines")}
+    hosts = [(hostname, distribution, decode_ids(added), decode_ids(removed))
+             for hostname, distribution, added, removed
+             in db.execute("SELECT hostname, distribution, added, removed FROM hosts ORDER BY hostname")]
+    for query in queries:
+        version_lt = query.get('version_lt')
+        versions = {package_id: version for package_id, version
+                    in db.execute("SELECT id, version FROM packages WHERE name = ?", (query['name'],))
+                    if not version_lt or compare_versions(version, version_lt) < 0}
+        wanted = set(versions)
+        for hostname, distribution, added, removed in hosts:
+            installed = ((baselines.get(distribution, set()) & wanted) - removed) | (added & wanted)
+            for package_id in sorted(installed):
+                yield (hostname, distribution, query['name'], versions[package_id], version_lt or 'N/A')
+
+def create_packages_sheet(wb, report, config):
+    if not config.get('sheets', {}).get('packages', True):
+        return
+    db = open_package_db(config)
+    if db is None:
+        return
+    try:
+        headers = ["Paquet", "Version", "Serveurs", "Distributions"]
+        ws = write_table(wb, "Paquets", headers, package_rows(db), config)
+        queries = [query for query in config.get('package_queries', []) if query.get('name')]
+        if queries:
+            headers = ["Hostname", "Distribution", "Paquet", "Version installée", "Version corrigée"]
+            write_table(wb, "Paquets à corriger", headers, package_query_rows(db, queries), config)
+    finally:
+        db.close()
+    return ws
+
+def write_workbook(report, config):
+    # Create Excel workbook
+    wb = create_workbook(config)
     
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col).value = header
-    format_header(ws)
+    # Create sheets based on configuration
+    create_servers_sheet(wb, report, config)
+    create_hardware_sheet(wb, report, config)
+    create_software_sheet(wb, report, config)
+    create_network_sheet(wb, report, config)
+    create_security_sheet(wb, report, config)
+    create_organizational_sheet(wb, report, config)
+    create_certificates_sheet(wb, report, config)
+    create_updates_sheet(wb, report, config)
+    create_packages_sheet(wb, report, config)
+    # The summary lists the exported files: written last, inserted first
+    create_summary_sheet(wb, report, config)
     
-    # Fill data
-    row = 2
-    for server in data:
-        ws.cell(row=row, column=1).value = server.get('hostname', 'N/A')
-        ws.cell(row=row, column=2).value = server.get('software', {}).get('os', {}).get('distribution', 'N/A')
-        ws.cell(row=row, column=3).value = server.get('software', {}).get('os', {}).get('distribution_version', 'N/A')
-        
-        # Updates available
-        updates = server.get('security', {}).get('updates_available', 'N/A')
-        ws.cell(row=row, column=4).value = updates
-        if isinstance(updates, int) and updates > 0:
-            ws.cell(row=row, column=4).fill = PatternFill(start_color='FFAAAA', end_color='FFAAAA', fill_type='solid')
-        
-        # Security features
-        ws.cell(row=row, column=5).value = server.get('security', {}).get('selinux', {}).get('status', 'N/A')
-        ws.cell(row=row, column=6).value = server.get('security', {}).get('apparmor', {}).get('status', 'N/A')
-        
-        row += 1
+    # Save the workbook
+    output_file = config.get('output_file', 'cmdb_inventory_report.xlsx')
+    wb.save(output_file)
+    return output_file
+
+# Rapport découpé en classeurs : un classeur par environnement, par datacenter ou par lot
+# de serveurs (hash du nom), générés en parallèle, et un classeur d'index
+SHARD_LABELS = {'environment': 'Environnement', 'datacenter': 'Datacenter', 'hash': 'Lot'}
+
+def shard_mode(config):
+    mode = config.get('shard_by', 'none')
+    return mode if mode in SHARD_LABELS else None
+
+def shard_name(summary, mode, buckets):
+    if mode == 'hash':
+        # crc32 rather than hash(): stable from one run to the next
+        return f"{zlib.crc32(str(summary.hostname).encode()) % buckets + 1:02d}"
+    value = summary.environment if mode == 'environment' else summary.datacenter
+    return str(value) if value not in (None, '') else 'N/A'
+
+def partition_records(records, config):
+    mode = shard_mode(config)
+    buckets = max(1, int(config.get('shard_buckets', 8)))
+    shards = {}
+    for record in records:
+        shards.setdefault(shard_name(record.summary, mode, buckets), []).append(record)
+    return shards
+
+def shard_workers(config, count):
+    workers = int(config.get('shard_workers', 0))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, count))
+
+def shard_configs(shards, config):
+    # One workbook per shard next to the index: <index>_<shard>.xlsx, exports in a
+    # sub-directory per shard; fleet-wide package sheets stay in the index
+    output_file = config.get('output_file', 'cmdb_inventory_report.xlsx')
+    stem, ext = os.path.splitext(output_file)
+    sheets = dict(config.get('sheets', {}), packages=False)
+    used = set()
+    configs = {}
+    for name in sorted(shards):
+        slug = slugify(name) or 'na'
+        while slug in used:
+            slug += '_'
+        used.add(slug)
+        shard_config = dict(config, output_file=f"{stem}_{slug}{ext}", sheets=sheets,
+                            _shard={'key': shard_mode(config), 'name': name})
+        if config.get('export_dir'):
+            shard_config['export_dir'] = os.path.join(config['export_dir'], slug)
+        configs[name] = shard_config
+    return configs
+
+def write_shard(config, records):
+    # Runs in a worker process: only the shard's rows are held and written
+    report = build_report(config, records)
+    output_file = write_workbook(report, config)
+    return output_file, report['hosts'], config.get('_exports', [])
+
+def write_sharded(records, config):
+    shards = partition_records(records, config)
+    configs = shard_configs(shards, config)
+    workers = shard_workers(config, len(shards))
+    # Largest shards first: the pool finishes with the small ones
+    order = sorted(shards, key=lambda name: len(shards[name]), reverse=True)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(write_shard, configs[name], shards[name]) for name in order}
+            results = {name: future.result() for name, future in futures.items()}
+    else:
+        results = {name: write_shard(configs[name], shards[name]) for name in order}
     
-    adjust_column_width(ws)
-    return ws
+    entries = []
+    for name in sorted(shards):
+        output_file, hosts, exports = results[name]
+        entries.append({'name': name, 'file': os.path.basename(output_file),
+                        'path': os.path.abspath(output_file), 'hosts': hosts})
+        config.setdefault('_exports', []).extend(dict(export, sheet=f"{export['sheet']} ({name})")
+                                                 for export in exports)
+        print(f"Classeur {name}: {output_file} ({hosts} serveurs)")
+    print(f"{len(entries)} classeurs par {SHARD_LABELS[shard_mode(config)].lower()} "
+          f"({workers} processus)")
+    
+    # Index: fleet summary with links to the shards, plus the fleet-wide package sheets
+    config['_shards'] = entries
+    sheets = dict({name: False for name in ROW_SHEETS}, summary=True,
+                  packages=config.get('sheets', {}).get('packages', True))
+    # Shallow copy: the index exports must land in the list shared with config
+    config.setdefault('_exports', [])
+    index_config = dict(config, sheets=sheets)
+    index = new_report(index_config)
+    for record in records:
+        index['hosts'] += 1
+        add_summary(index['summary'], record.summary)
+    wb = create_workbook(index_config)
+    create_packages_sheet(wb, index, index_config)
+    create_summary_sheet(wb, index, index_config)
+    wb.save(index_config.get('output_file', 'cmdb_inventory_report.xlsx'))
+    return index
 
 def main():
     try:
         # Load configuration
         config = load_config()
         
-        # Load data
-        data = load_data(config)
+        # Load data: files are parsed and reduced to sheet rows in parallel
+        records = load_records(config)
         
-        if not data:
+        if not records:
             print("No data found! Please check the data directory.")
             sys.exit(1)
         
-        # Create Excel workbook
-        wb = openpyxl.Workbook()
-        
-        # Remove default sheet
-        if "Sheet" in wb.sheetnames:
-            del wb["Sheet"]
-        
-        # Create sheets based on configuration
-        create_summary_sheet(wb, data, config)
-        create_servers_sheet(wb, data, config)
-        create_hardware_sheet(wb, data, config)
-        create_software_sheet(wb, data, config)
-        create_network_sheet(wb, data, config)
-        create_security_sheet(wb, data, config)
-        create_organizational_sheet(wb, data, config)
-        create_certificates_sheet(wb, data, config)
-        create_updates_sheet(wb, data, config)
-        
-        # Save the workbook
-        output_file = config.get('output_file', 'cmdb_inventory_report.xlsx')
-        wb.save(output_file)
+        if shard_mode(config):
+            report = write_sharded(records, config)
+            output_file = config.get('output_file', 'cmdb_inventory_report.xlsx')
+        else:
+            report = build_report(config, records)
+            output_file = write_workbook(report, config)
         print(f"Report generated successfully: {output_file}")
+        for export in config.get('_exports', []):
+            print(f"Export {export['format']}: {export['sheet']} -> {export['path']} ({export['rows']} lignes)")
+        write_stats(report, config)
         
     except Exception as e:
         print(f"Error generating report: {str(e)}")
@@ -650,4 +1296,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cmdb_reports_aggregate
+short_description: Agrège en un seul appel les rapports d'inventaire CMDB d'un répertoire
+description:
+  - Lit tous les fichiers d'inventaire JSON produits par le rôle C(cmdb_inventory) dans un répertoire du serveur repository.
+  - Calcule les statistiques globales (C(cmdb_stats)) utilisées par le corps de l'email du rapport.
+  - Copie éventuellement les fichiers retenus dans le répertoire de travail du script C(generate_excel.py).
+  - Remplace la boucle C(include_tasks) qui lisait et fusionnait chaque fichier séparément.
+options:
+  path:
+    description: Répertoire contenant les rapports d'inventaire.
+    type: path
+    required: true
+  patterns:
+    description: Motifs (glob) des fichiers à lire.
+    type: list
+    elements: str
+    default: ['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz', '*_cmdb_inventory.json.zst']
+  limit:
+    description: Nombre maximum de fichiers retenus (0 = pas de limite).
+    type: int
+    default: 0
+  dest:
+    description: Répertoire dans lequel copier les fichiers retenus (facultatif).
+    type: path
+  full_documents:
+    description:
+      - Retourner le contenu complet de chaque inventaire dans C(cmdb_data).
+      - Par défaut seule une entrée réduite par serveur est retournée pour limiter le volume transféré au contrôleur.
+    type: bool
+    default: false
+  parse:
+    description:
+      - Lire et analyser les fichiers pour calculer C(cmdb_stats).
+      - Désactivé lorsque C(generate_excel.py) utilise son cache incrémental et calcule lui-même les statistiques ; C(cmdb_data) est alors construit à partir des seuls noms de fichiers.
+    type: bool
+    default: true
+author:
+  - Philippe CANDIDO (@PhilCANDIDO)
+'''
+
+EXAMPLES = r'''
+- name: Agréger les rapports d'inventaire
+  cmdb_reports_aggregate:
+    path: /opt/cmdb/inventory/reports
+    limit: 0
+    dest: /tmp/cmdb_report_1700000000/json
+  register: cmdb_reports
+'''
+
+RETURN = r'''
+cmdb_data:
+  description: Une entrée par inventaire valide (hostname, fichier, date de collecte), ou le document complet si full_documents est vrai.
+  returned: always
+  type: list
+cmdb_stats:
+  description: Statistiques globales (total_servers, os_count, os_version_count, env_count, virtualization_count, updates_needed, critical_servers, expired_certs : nombre de serveurs ayant au moins un certificat expiré).
+  returned: always
+  type: dict
+files:
+  description: Chemins des fichiers retenus.
+  returned: always
+  type: list
+errors:
+  description: Fichiers ignorés car illisibles ou corrompus, avec le message d'erreur.
+  returned: always
+  type: list
+'''
+
+import fnmatch
+import json
+import os
+import shutil
+from datetime import datetime
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.cmdb_reports import read_report_content
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path):
+    content = read_report_content(path)
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content.decode('utf-8'))
+
+
+def list_reports(path, patterns, limit):
+    files = sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+        and os.path.isfile(os.path.join(path, name))
+    )
+    if limit > 0:
+        files = files[:limit]
+    return files
+
+
+def new_stats():
+    return {
+        'total_servers': 0,
+        'os_count': {},
+        'os_version_count': {},
+        'env_count': {},
+        'virtualization_count': {},
+        'updates_needed': 0,
+        'critical_servers': 0,
+        'expired_certs': 0,
+    }
+
+
+def count(counter, key):
+    counter[key] = counter.get(key, 0) + 1
+
+
+ISO_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def cert_expired(cert, now):
+    # Enregistrements du module cmdb_cert_scanner : dates ISO 8601 comparées comme texte
+    if cert.get('not_after'):
+        return cert['not_after'] < now
+    # Rapports antérieurs : résultat brut d'openssl x509 -dates
+    for line in (cert.get('stdout') or '').splitlines():
+        if line.startswith('notAfter='):
+            try:
+                expiry = datetime.strptime(line[len('notAfter='):], '%b %d %H:%M:%S %Y GMT')
+            except ValueError:
+                return False
+            return expiry.strftime(ISO_DATE_FORMAT) < now
+    return False
+
+
+def add_stats(stats, doc, now):
+    # Mêmes règles que l'ancienne tâche process_json.yml
+    software = doc.get('software') or {}
+    organizational = doc.get('organizational') or {}
+    hardware = doc.get('hardware') or {}
+    security = doc.get('security') or {}
+
+    stats['total_servers'] += 1
+    os_info = software.get('os') or {}
+    count(stats['os_count'], os_info.get('distribution', 'N/A'))
+    count(stats['os_version_count'], '%s %s' % (os_info.get('distribution', 'N/A'),
+                                                os_info.get('distribution_version', 'N/A')))
+    count(stats['env_count'], organizational.get('environment', 'N/A'))
+    count(stats['virtualization_count'], (hardware.get('system') or {}).get('virtualization_type', 'N/A'))
+
+    updates = security.get('updates_available')
+    if isinstance(updates, int) and not isinstance(updates, bool) and updates > 0:
+        stats['updates_needed'] += 1
+    if organizational.get('criticality') == 'Critique':
+        stats['critical_servers'] += 1
+
+    details = (security.get('certificates') or {}).get('details') or []
+    # Nombre de serveurs ayant au moins un certificat expiré, comme generate_excel.py
+    stats['expired_certs'] += any(cert_expired(cert, now) for cert in details)
+
+
+def summarize_name(path):
+    # Les rapports sont nommés <hostname>_cmdb_inventory.json[.gz|.zst]
+    name = os.path.basename(path)
+    return {
+        'hostname': name.rsplit('_cmdb_inventory.json', 1)[0],
+        'file': name,
+        'collection_date': None,
+    }
+
+
+def summarize(doc, path):
+    return {
+        'hostname': doc.get('hostname', os.path.basename(path)),
+        'file': os.path.basename(path),
+        'collection_date': doc.get('collection_date'),
+    }
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            path=dict(type='path', required=True),
+            patterns=dict(type='list', elements='str',
+                          default=['*_cmdb_inventory.json', '*_cmdb_inventory.json.gz',
+                                   '*_cmdb_inventory.json.zst']),
+            limit=dict(type='int', default=0),
+            dest=dict(type='path'),
+            full_documents=dict(type='bool', default=False),
+            parse=dict(type='bool', default=True),
+        ),
+        supports_check_mode=True,
+    )
+
+    path = module.params['path']
+    dest = module.params['dest']
+    if not os.path.isdir(path):
+        module.fail_json(msg="Le répertoire %s n'existe pas" % path)
+
+    files = list_reports(path, module.params['patterns'], module.params['limit'])
+    stats = new_stats()
+    now = datetime.utcnow().strftime(ISO_DATE_FORMAT)
+    data = []
+    errors = []
+    for report in files:
+        if not module.params['parse']:
+            data.append(summarize_name(report))
+            continue
+        try:
+            doc = load_json(report)
+        except Exception as e:
+            errors.append({'file': os.path.basename(report), 'msg': str(e)})
+            continue
+        if not isinstance(doc, dict):
+            errors.append({'file': os.path.basename(report), 'msg': 'document JSON inattendu'})
+            continue
+        add_stats(stats, doc, now)
+        data.append(doc if module.params['full_documents'] else summarize(doc, report))
+
+    if not module.params['parse']:
+        stats['total_servers'] = len(data)
+
+    changed = False
+    if dest and files and not module.check_mode:
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+        for report in files:
+            shutil.copyfile(report, os.path.join(dest, os.path.basename(report)))
+        changed = True
+
+    for error in errors:
+        module.warn("Fichier ignoré %s: %s" % (error['file'], error['msg']))
+
+    module.exit_json(changed=changed, cmdb_data=data, cmdb_stats=stats, files=files, errors=errors)
+
+
+if __name__ == '__main__':
+    main()
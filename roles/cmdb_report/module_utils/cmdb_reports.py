@@ -0,0 +1 @@
+../../cmdb_inventory/module_utils/cmdb_reports.py
\ No newline at end of file